@@ -0,0 +1,395 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass
+
+from integrity import IntegrityError, choose_algorithm, new_hasher
+from protocol import FRAME_HEADER
+from tree import PART_PREFIX
+
+# --- CONSTANTS ---
+PORT = 4450
+SIZE = 1024  # Control messages, as in FileClient
+CHUNK_SIZE = 64 * 1024
+FORMAT = "utf-8"
+CONNECT_TIMEOUT = 10  # seconds
+AUTH_PROMPT = "Please authenticate to continue."
+_LOGICAL_NAME = re.compile(r"as '(.+)'\.$")
+
+
+# --- Results ---
+
+@dataclass(frozen=True)
+class UploadResult:
+    filename: str  # Local name that was sent
+    logical_name: str  # Name the server stored it under
+    size: int
+    digest: str = None  # Verified digest (None when verify=False)
+
+
+@dataclass(frozen=True)
+class DownloadResult:
+    filename: str
+    path: str
+    size: int
+    digest: str = None
+
+
+@dataclass(frozen=True)
+class Listing:
+    files: dict  # {name: size}, names relative to the server's data directory
+    folders: list
+
+
+# --- Exceptions ---
+
+class FileClientError(Exception):
+    """Base class for AsyncFileClient errors."""
+
+
+class AuthenticationError(FileClientError):
+    """Login failed, or an operation was attempted before logging in."""
+
+
+class RemoteError(FileClientError):
+    """The server answered an operation with an ERROR message."""
+
+
+class RemoteFileNotFoundError(RemoteError):
+    pass
+
+
+class RemoteFileExistsError(FileClientError):
+    """An upload would overwrite an existing file and overwrite=False."""
+
+
+class TransferIntegrityError(FileClientError, IntegrityError):
+    """The digest of the transferred data did not match."""
+
+
+def _raise_for(message):
+    """Raise the exception matching a server ERROR message."""
+    if message.startswith("ERROR"):
+        text = message.split(":", 1)[1].strip() if ":" in message else message
+        if "not found" in text:
+            raise RemoteFileNotFoundError(text)
+        raise RemoteError(text)
+
+
+class AsyncFileClient:
+    """asyncio client for the file server: one session (connection) per instance.
+
+    Every method is a coroutine and raises FileClientError subclasses instead of
+    returning status strings. Operations on one session run one at a time; open
+    more instances for concurrency (they only cost a socket each, no threads).
+
+        async with AsyncFileClient(host, port) as client:
+            await client.authenticate("user1", password)
+            result = await client.upload("report.pdf")
+            async for chunk in client.iter_download(result.logical_name):
+                ...
+    """
+
+    def __init__(self, ip, port=PORT, timeout=CONNECT_TIMEOUT, ssl_context=None, server_hostname=None):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.server_hostname = server_hostname or ip
+        self.username = None
+        self.session_token = None
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self._prompt_received = False
+        self._last_digest = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # --- Connection and Authentication ---
+
+    @property
+    def is_connected(self):
+        return self._writer is not None
+
+    async def connect(self):
+        if self._writer is not None:
+            return
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.ip, self.port, ssl=self.ssl_context,
+                                    server_hostname=self.server_hostname if self.ssl_context else None),
+            self.timeout)
+        welcome = (await self._reader.read(SIZE)).decode(FORMAT)
+        # The welcome and the auth prompt can arrive in one read
+        self._prompt_received = welcome.endswith(AUTH_PROMPT)
+
+    async def authenticate(self, username, password):
+        """Log in with a password; raises AuthenticationError if it is rejected."""
+        digest = hashlib.sha256(password.encode()).hexdigest()
+        await self._send_credentials(f"{username}@{digest}", username)
+
+    async def resume_session(self, token=None):
+        """Log in again with the session token from a previous login."""
+        token = token or self.session_token
+        if not token:
+            raise AuthenticationError("No session token available.")
+        await self.connect()
+        await self._send_credentials(f"TOKEN@{token}", self.username)
+
+    async def _send_credentials(self, credentials, username):
+        async with self._lock:
+            if self._prompt_received:
+                self._prompt_received = False
+            else:
+                await self._reader.read(SIZE)
+            await self._send(credentials)
+            response = (await self._reader.read(SIZE)).decode(FORMAT)
+        if not response.startswith("AUTH_SUCCESS"):
+            await self._abort()  # The server closes the connection after a failed login
+            raise AuthenticationError(f"Authentication failed for '{username}'.")
+        self.username = username
+        if "@" in response:
+            self.session_token = response.split("@", 1)[1]
+
+    async def close(self):
+        """Log out and close the connection."""
+        if self._writer is None:
+            return
+        try:
+            if self.username and not self._lock.locked():
+                self._writer.write(b"LOGOUT")
+                await self._writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        await self._abort()
+
+    async def _abort(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    # --- Wire helpers ---
+
+    def _check_session(self):
+        if self._writer is None or self.username is None:
+            raise AuthenticationError("Not authenticated.")
+
+    async def _send(self, message):
+        self._writer.write(message.encode(FORMAT) if isinstance(message, str) else message)
+        await self._writer.drain()
+
+    async def _recv_text(self):
+        data = await self._reader.read(SIZE)
+        if not data:
+            raise ConnectionError("Connection closed by the server.")
+        return data.decode(FORMAT)
+
+    async def _send_frame(self, payload):
+        await self._send(FRAME_HEADER.pack(len(payload)) + payload)
+
+    async def _recv_frame(self):
+        (length,) = FRAME_HEADER.unpack(await self._reader.readexactly(FRAME_HEADER.size))
+        return await self._reader.readexactly(length)
+
+    async def _recv_json(self):
+        return json.loads((await self._recv_frame()).decode(FORMAT))
+
+    @staticmethod
+    def _offered_algorithm(ready):
+        return choose_algorithm(ready.split("@", 1)[1].split(",")) if "@" in ready else None
+
+    # --- Operations ---
+
+    async def ping(self):
+        self._check_session()
+        async with self._lock:
+            await self._send("PING")
+            return await self._recv_text() == "PONG"
+
+    async def upload(self, filepath, overwrite=False, verify=True):
+        """Upload a local file. Returns an UploadResult with the name the server assigned."""
+        self._check_session()
+        filesize = os.path.getsize(filepath)
+        filename = os.path.basename(filepath)
+        async with self._lock:
+            try:
+                await self._send("UPLOAD")
+                ready = await self._recv_text()
+                _raise_for(ready)
+                algorithm = self._offered_algorithm(ready) if verify else None
+                await self._send(f"{filename}@{filesize}@{algorithm}" if algorithm else f"{filename}@{filesize}")
+
+                response = await self._recv_text()
+                if response == "EXISTS":
+                    await self._send("yes" if overwrite else "no")
+                    if not overwrite:
+                        raise RemoteFileExistsError(f"'{filename}' already exists on the server.")
+                    response = await self._recv_text()
+                _raise_for(response)
+                if not response.startswith("OK"):
+                    raise RemoteError(f"Unexpected server response during upload: {response}")
+
+                digest = await self._send_file_data(filepath, filesize, algorithm)
+                # An empty unverified upload sends nothing, so the result can arrive with OK
+                message = response[2:] or await self._recv_text()
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                await self._abort()
+                raise
+        if message.startswith("ERROR: Integrity check failed"):
+            raise TransferIntegrityError(message[len("ERROR: "):])
+        _raise_for(message)
+        match = _LOGICAL_NAME.search(message)
+        return UploadResult(filename, match.group(1) if match else None, filesize, digest)
+
+    async def _send_file_data(self, filepath, filesize, algorithm):
+        hasher = new_hasher(algorithm) if algorithm else None
+        loop = asyncio.get_running_loop()
+        with open(filepath, "rb") as f:
+            if hasher is None:
+                # Zero-copy where the transport supports it (plain sockets); asyncio's fallback reads in an executor
+                sent = await loop.sendfile(self._writer.transport, f, 0, filesize) if filesize else 0
+            else:
+                sent = 0
+                while sent < filesize:
+                    chunk = await loop.run_in_executor(None, f.read, min(CHUNK_SIZE, filesize - sent))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    self._writer.write(chunk)
+                    await self._writer.drain()
+                    sent += len(chunk)
+        if sent < filesize:
+            # File shrank while sending. Padding would be stored as data when nothing verifies it, so close
+            # the connection and let the server discard the short upload
+            await self._abort()
+            raise FileClientError(f"'{os.path.basename(filepath)}' changed while uploading.")
+        if hasher is None:
+            return None
+        digest = hasher.hexdigest()
+        await self._send_frame(digest.encode(FORMAT))
+        return digest
+
+    async def download(self, filename, save_dir=None, verify=True):
+        """Download a file into save_dir (default: cwd). Returns a DownloadResult.
+
+        The data goes to a partial file beside the target, which replaces it only once the download is complete
+        (and verified), so a failed download leaves an existing local file alone.
+        """
+        save_path = os.path.join(save_dir or os.getcwd(), filename)
+        directory, name = os.path.split(save_path)
+        part_path = os.path.join(directory, f"{PART_PREFIX}{uuid.uuid4().hex[:12]}_{name}")
+        loop = asyncio.get_running_loop()
+        size = 0
+        try:
+            with open(part_path, "wb") as f:
+                async for chunk in self.iter_download(filename, verify):
+                    await loop.run_in_executor(None, f.write, chunk)
+                    size += len(chunk)
+            os.replace(part_path, save_path)
+        except BaseException:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            raise
+        return DownloadResult(filename, save_path, size, self._last_digest)
+
+    async def iter_download(self, filename, verify=True):
+        """Async iterator over the file's data as it arrives (bytes chunks).
+
+        With verify=True the digest is checked after the last chunk and
+        TransferIntegrityError is raised on a mismatch. Stopping early closes the
+        session, since the rest of the data would still be in flight; wrap the
+        iterator in contextlib.aclosing() so that happens as soon as you stop.
+        """
+        self._check_session()
+        self._last_digest = None
+        async with self._lock:
+            complete = False
+            try:
+                await self._send("DOWNLOAD")
+                ready = await self._recv_text()  # Always wait for READY, or the name joins the command
+                algorithm = self._offered_algorithm(ready) if verify else None
+                await self._send(filename)
+                response = await self._recv_text()
+                _raise_for(response)
+                size = int(response)
+                await self._send(f"READY@{algorithm}" if algorithm else "READY")
+
+                hasher = new_hasher(algorithm) if algorithm else None
+                remaining = size
+                while remaining:
+                    chunk = await self._reader.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError(f"Connection closed after {size - remaining} of {size} bytes")
+                    remaining -= len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    yield chunk
+                if hasher is not None:
+                    expected = (await self._recv_frame()).decode(FORMAT)
+                    complete = True
+                    if expected != hasher.hexdigest():
+                        raise TransferIntegrityError(f"Integrity check failed for '{filename}'.")
+                    self._last_digest = expected
+                complete = True
+            except RemoteError:
+                complete = True  # The server answered; the session is still in sync
+                raise
+            finally:
+                if not complete:
+                    await self._abort()
+
+    async def dir(self):
+        """The server's DIR listing text."""
+        self._check_session()
+        async with self._lock:
+            await self._send("DIR")
+            listing = (await self._recv_frame()).decode(FORMAT)
+        _raise_for(listing)
+        return listing
+
+    async def list_files(self):
+        """Files and folders on the server as a Listing."""
+        self._check_session()
+        async with self._lock:
+            await self._send("LIST")
+            reply = await self._recv_json()
+        if reply.get("error"):
+            raise RemoteError(reply["error"])
+        return Listing(reply["files"], reply["folders"])
+
+    async def delete(self, filename):
+        self._check_session()
+        async with self._lock:
+            await self._send(f"DELETE@{filename}")
+            response = await self._recv_text()
+        _raise_for(response)
+        return response
+
+    async def subfolder(self, action, path):
+        """action is "CREATE" or "DELETE"."""
+        self._check_session()
+        async with self._lock:
+            await self._send(f"SUBFOLDER@{action}@{path}")
+            response = await self._recv_text()
+        _raise_for(response)
+        return response
+
+    async def create_folder(self, path):
+        return await self.subfolder("CREATE", path)
+
+    async def delete_folder(self, path):
+        return await self.subfolder("DELETE", path)
@@ -0,0 +1,234 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+# --- CONSTANTS ---
+PBKDF2_ITERATIONS = 100_000
+SALT_BYTES = 16
+TOKEN_PREFIX = "TOKEN"  # Credentials of the form TOKEN@<session token> resume a session
+DEFAULT_SESSION_TTL = 8 * 60 * 60  # seconds
+DEFAULT_CACHE_TTL = 5 * 60  # seconds
+MAX_SESSIONS = 10_000
+
+
+def hash_secret(secret, salt, iterations=PBKDF2_ITERATIONS):
+    """Salted slow hash of the client-side SHA-256 digest."""
+    return hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), salt, iterations).hex()
+
+
+# --- User Stores ---
+
+class UserStore:
+    """Interface for pluggable user stores. Lookups are by username."""
+
+    _listeners = ()
+
+    def on_change(self, callback):
+        """Call callback(username) after a user is added, has their password replaced or is removed."""
+        self._listeners = [*self._listeners, callback]
+
+    def _changed(self, username):
+        for callback in self._listeners:
+            callback(username)
+
+    def get(self, username):
+        """Return the stored record {'salt', 'hash', 'iterations'} or None."""
+        raise NotImplementedError
+
+    def verify(self, username, client_digest):
+        """Slow-hash the client digest and compare it with the stored hash."""
+        record = self.get(username)
+        if record is None:
+            # Burn the same amount of work so unknown users are not distinguishable by timing
+            hash_secret(client_digest, b"\0" * SALT_BYTES)
+            return False
+        candidate = hash_secret(client_digest, bytes.fromhex(record["salt"]), record["iterations"])
+        return hmac.compare_digest(candidate, record["hash"])
+
+
+class MemoryUserStore(UserStore):
+    """Dict-backed user store (O(1) lookups)."""
+
+    def __init__(self, iterations=PBKDF2_ITERATIONS):
+        self.iterations = iterations
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_digests(cls, users, iterations=PBKDF2_ITERATIONS):
+        """Build a store from {username: sha256_hex} as sent by FileClient."""
+        store = cls(iterations=iterations)
+        for username, digest in users.items():
+            store.add_user(username, digest)
+        return store
+
+    def get(self, username):
+        return self._users.get(username)
+
+    def add_user(self, username, client_digest):
+        """Add or replace a user given the SHA-256 hex digest of their password."""
+        salt = os.urandom(SALT_BYTES)
+        record = {
+            "salt": salt.hex(),
+            "hash": hash_secret(client_digest, salt, self.iterations),
+            "iterations": self.iterations,
+        }
+        with self._lock:
+            self._users[username] = record
+        self._changed(username)
+
+    def remove_user(self, username):
+        with self._lock:
+            removed = self._users.pop(username, None) is not None
+        if removed:
+            self._changed(username)
+        return removed
+
+    def usernames(self):
+        return list(self._users)
+
+
+class JsonUserStore(MemoryUserStore):
+    """User store persisted as a JSON file of salted hashes."""
+
+    def __init__(self, path, iterations=PBKDF2_ITERATIONS):
+        super().__init__(iterations=iterations)
+        self.path = path
+        if os.path.exists(path):
+            with open(path) as f:
+                self._users = json.load(f)
+
+    def add_user(self, username, client_digest):
+        super().add_user(username, client_digest)
+        self.save()
+
+    def remove_user(self, username):
+        removed = super().remove_user(username)
+        if removed:
+            self.save()
+        return removed
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._users, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+# --- Verification and Sessions ---
+
+class Authenticator:
+    """Verifies credentials and caches successful results.
+
+    The slow hash runs on the session's own thread; pbkdf2_hmac releases the
+    GIL, so concurrent logins hash in parallel on every core. Repeat logins
+    within cache_ttl are answered from the cache with a constant-time
+    comparison. Cached results are dropped when the store changes the user.
+    """
+
+    def __init__(self, store, cache_ttl=DEFAULT_CACHE_TTL):
+        self.store = store
+        self.cache_ttl = cache_ttl
+        store.on_change(self.invalidate)
+        self._cache_key = os.urandom(32)
+        self._cache = {}  # username -> (keyed digest, expires_at)
+        self._lock = threading.Lock()
+
+    def _keyed(self, client_digest):
+        return hmac.new(self._cache_key, client_digest.encode("utf-8"), hashlib.sha256).digest()
+
+    def verify(self, username, client_digest):
+        """Return True if the credentials are valid."""
+        keyed = self._keyed(client_digest)
+        with self._lock:
+            cached = self._cache.get(username)
+        if cached and cached[1] > time.monotonic() and hmac.compare_digest(cached[0], keyed):
+            return True
+
+        valid = self.store.verify(username, client_digest)
+        if valid:
+            with self._lock:
+                self._cache[username] = (keyed, time.monotonic() + self.cache_ttl)
+        return valid
+
+    def invalidate(self, username=None):
+        """Drop cached results for one user (e.g. after a password change) or everyone."""
+        with self._lock:
+            if username is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(username, None)
+
+
+class SessionManager:
+    """Issues opaque resumable session tokens after a successful login."""
+
+    def __init__(self, ttl=DEFAULT_SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}  # token -> (username, expires_at)
+        self._lock = threading.Lock()
+
+    def issue(self, username):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                self._purge(now)
+                if len(self._sessions) >= self.max_sessions:
+                    # Evict the session closest to expiry
+                    oldest = min(self._sessions, key=lambda t: self._sessions[t][1])
+                    del self._sessions[oldest]
+            self._sessions[token] = (username, now + self.ttl)
+        return token
+
+    def resume(self, token):
+        """Return the username for a valid token (refreshing its expiry) or None."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            username, expires_at = session
+            if expires_at <= now:
+                del self._sessions[token]
+                return None
+            self._sessions[token] = (username, now + self.ttl)
+            return username
+
+    def export(self):
+        """Live sessions as {token: [username, seconds left]}, for handing over to another process."""
+        now = time.monotonic()
+        with self._lock:
+            return {token: [username, expires_at - now] for token, (username, expires_at) in self._sessions.items()
+                    if expires_at > now}
+
+    def import_sessions(self, sessions):
+        """Add sessions from export(). Returns how many were added."""
+        now = time.monotonic()
+        with self._lock:
+            for token, (username, seconds_left) in sessions.items():
+                self._sessions[token] = (username, now + min(seconds_left, self.ttl))
+        return len(sessions)
+
+    def revoke(self, token):
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def revoke_user(self, username):
+        """Revoke every session of a user. Returns how many were revoked."""
+        with self._lock:
+            tokens = [token for token, (owner, _) in self._sessions.items() if owner == username]
+            for token in tokens:
+                del self._sessions[token]
+        return len(tokens)
+
+    def _purge(self, now):
+        expired = [token for token, (_, expires_at) in self._sessions.items() if expires_at <= now]
+        for token in expired:
+            del self._sessions[token]
@@ -0,0 +1,553 @@
+"""Loopback benchmark suite for the file transfer protocol.
+
+Starts a FileServer on an ephemeral local port, drives it with N concurrent
+FileClients and writes the results as JSON so runs can be compared between
+commits.
+
+    python benchmark.py --clients 4 --profile default --output bench.json
+    python benchmark.py --compare baseline.json bench.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import tls
+from client import FileClient
+from server import FileServer
+from durability import DEFAULT_FSYNC_POLICY, FSYNC_POLICIES
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # Optional, only used for the current RSS reading
+    psutil = None
+
+# --- CONSTANTS ---
+BENCH_IP = "127.0.0.1"
+DEFAULT_USERNAME = "admin"
+DEFAULT_PASSWORD = "password123"
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+
+# File size distributions (bytes) used by the upload/download scenarios
+SIZE_PROFILES = {
+    "quick": [1 * KB, 64 * KB, 1 * MB],
+    "default": [1 * KB, 64 * KB, 1 * MB, 16 * MB],
+    "full": [1 * KB, 64 * KB, 1 * MB, 16 * MB, 256 * MB, 2 * GB],
+}
+
+ALL_SCENARIOS = ["upload", "download", "batch", "dir", "churn", "storm"]
+BATCH_FILES = 500  # Small files per BATCH_UPLOAD/BATCH_DOWNLOAD in the batch scenario
+UPLOAD_NAME_RE = re.compile(r"uploaded successfully as '([^']+)'")
+
+
+# --- HELPER FUNCTIONS ---
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100.0) - 1))
+    return ordered[rank]
+
+
+def format_size(nbytes):
+    """Human readable size label used in scenario names (e.g. 64KB)."""
+    for unit, factor in (("GB", GB), ("MB", MB), ("KB", KB)):
+        if nbytes >= factor and nbytes % factor == 0:
+            return f"{nbytes // factor}{unit}"
+    return f"{nbytes}B"
+
+
+def make_file(path, nbytes):
+    """Write a file of nbytes using a repeated random block."""
+    block = os.urandom(min(nbytes, MB)) if nbytes else b""
+    with open(path, "wb") as f:
+        remaining = nbytes
+        while remaining > 0:
+            chunk = block[:remaining]
+            f.write(chunk)
+            remaining -= len(chunk)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return peak / (MB if sys.platform == "darwin" else KB)
+
+
+def current_rss_mb():
+    """Current resident set size in MB when psutil is installed."""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / MB
+
+
+def git_revision():
+    """Commit hash of the working tree, if this is a git checkout."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+class LoopbackServer:
+    """Context manager running a FileServer on an ephemeral port with its own data directory."""
+
+    def __init__(self, workdir, name, **server_kwargs):
+        self.data_path = os.path.join(workdir, f"server_{name}")
+        if os.path.exists(self.data_path):
+            shutil.rmtree(self.data_path)
+        os.makedirs(self.data_path)
+        self.server_kwargs = server_kwargs
+        self.server = None
+
+    def __enter__(self):
+        self.server = FileServer(ip=BENCH_IP, port=0, data_path=self.data_path,
+                                 log_callback=lambda message: None, stats_file=None, **self.server_kwargs)
+        if not self.server.start():
+            raise RuntimeError("Benchmark server failed to start")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.stop()
+        shutil.rmtree(self.data_path, ignore_errors=True)
+
+
+class ScenarioResult:
+    """Collects latencies and byte counts from all worker threads of one scenario."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.bytes = 0
+        self.errors = 0
+        self.error_samples = []
+        # Active window from the first operation start to the last operation end, so
+        # connection setup and login are not counted against transfer throughput
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, latency, nbytes=0):
+        end = time.perf_counter()
+        start = end - latency
+        with self.lock:
+            self.latencies.append(latency)
+            self.bytes += nbytes
+            if self.first_start is None or start < self.first_start:
+                self.first_start = start
+            if self.last_end is None or end > self.last_end:
+                self.last_end = end
+
+    def fail(self, message):
+        with self.lock:
+            self.errors += 1
+            if len(self.error_samples) < 5:
+                self.error_samples.append(message)
+
+    def summary(self, wall_s, cpu_s):
+        ops = len(self.latencies)
+        active_s = (self.last_end - self.first_start) if ops else 0.0
+        return {
+            "ops": ops,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+            "bytes": self.bytes,
+            "wall_s": round(wall_s, 4),
+            "cpu_s": round(cpu_s, 4),
+            "ops_per_s": round(ops / wall_s, 2) if wall_s > 0 else 0.0,
+            "active_s": round(active_s, 4),
+            "throughput_mb_s": round(self.bytes / MB / active_s, 3) if active_s > 0 else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(self.latencies, 50) * 1000, 3),
+                "p99": round(percentile(self.latencies, 99) * 1000, 3),
+                "max": round(max(self.latencies) * 1000, 3) if self.latencies else 0.0,
+            },
+            "peak_rss_mb": peak_rss_mb(),
+            "rss_mb": current_rss_mb(),
+        }
+
+
+class Benchmark:
+    """Runs the benchmark scenarios against loopback servers."""
+
+    def __init__(self, clients=4, profile="default", iterations=3, tree_files=2000, tree_dirs=20,
+                 storm_connections=50, username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD,
+                 workdir=None, server_kwargs=None, client_kwargs=None):
+        self.clients = clients
+        self.sizes = SIZE_PROFILES[profile]
+        self.profile = profile
+        self.iterations = iterations
+        self.tree_files = tree_files
+        self.tree_dirs = tree_dirs
+        self.storm_connections = storm_connections
+        self.username = username
+        self.password = password
+        self.workdir = workdir or tempfile.mkdtemp(prefix="ft_bench_")
+        self.server_kwargs = server_kwargs or {}
+        self.client_kwargs = client_kwargs or {}
+        self.source_dir = os.path.join(self.workdir, "source")
+        self.source_files = {}
+
+    # --- Setup ---
+
+    def _prepare_sources(self):
+        """Create one local source file per size in the distribution."""
+        os.makedirs(self.source_dir, exist_ok=True)
+        for size in self.sizes:
+            path = os.path.join(self.source_dir, f"bench_{format_size(size)}.bin")
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                make_file(path, size)
+            self.source_files[size] = path
+
+    def _open_client(self, server):
+        """Connect and authenticate a quiet FileClient against the loopback server."""
+        client = FileClient(BENCH_IP, server.server.port, log_callback=lambda message: None, stats_file=None,
+                            **self.client_kwargs)
+        if not client.connect():
+            raise ConnectionError("connect failed")
+        if client.authenticate(self.username, self.password) != "AUTH_SUCCESS":
+            client.disconnect()
+            raise ConnectionError("authentication failed")
+        return client
+
+    def _run_workers(self, name, worker):
+        """Run worker(client_index, result) on every client thread and summarise."""
+        result = ScenarioResult(name)
+        threads = [threading.Thread(target=self._guard, args=(worker, i, result), name=f"Bench-{name}-{i}")
+                   for i in range(self.clients)]
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        return result.summary(wall, cpu)
+
+    @staticmethod
+    def _guard(worker, index, result):
+        try:
+            worker(index, result)
+        except Exception as e:
+            result.fail(f"{type(e).__name__}: {e}")
+
+    # --- Scenarios ---
+
+    def scenario_upload(self):
+        results = {}
+        for size in self.sizes:
+            with LoopbackServer(self.workdir, "upload", **self.server_kwargs) as server:
+                def worker(index, result):
+                    client = self._open_client(server)
+                    try:
+                        for _ in range(self.iterations):
+                            start = time.perf_counter()
+                            response = client.send_file(self.source_files[size], overwrite="yes")
+                            if response.startswith("SUCCESS"):
+                                result.record(time.perf_counter() - start, size)
+                            else:
+                                result.fail(response)
+                    finally:
+                        client.disconnect()
+
+                results[f"upload_{format_size(size)}"] = self._run_workers(f"upload_{format_size(size)}", worker)
+        return results
+
+    def scenario_download(self):
+        results = {}
+        for size in self.sizes:
+            with LoopbackServer(self.workdir, "download", **self.server_kwargs) as server:
+                # Each client downloads its own copy so files_in_use never rejects a request
+                for i in range(self.clients):
+                    shutil.copyfile(self.source_files[size],
+                                    os.path.join(server.data_path, f"bench_c{i}_{format_size(size)}.bin"))
+
+                def worker(index, result):
+                    save_dir = os.path.join(self.workdir, f"download_c{index}")
+                    os.makedirs(save_dir, exist_ok=True)
+                    client = self._open_client(server)
+                    try:
+                        for _ in range(self.iterations):
+                            start = time.perf_counter()
+                            response = client.receive_file(f"bench_c{index}_{format_size(size)}.bin",
+                                                           save_dir=save_dir)
+                            if response.startswith("SUCCESS"):
+                                result.record(time.perf_counter() - start, size)
+                            else:
+                                result.fail(response)
+                    finally:
+                        client.disconnect()
+                        shutil.rmtree(save_dir, ignore_errors=True)
+
+                results[f"download_{format_size(size)}"] = self._run_workers(f"download_{format_size(size)}", worker)
+        return results
+
+    def scenario_dir(self):
+        with LoopbackServer(self.workdir, "dir", **self.server_kwargs) as server:
+            for d in range(self.tree_dirs):
+                os.makedirs(os.path.join(server.data_path, f"folder{d:03d}"))
+            for n in range(self.tree_files):
+                folder = os.path.join(server.data_path, f"folder{n % self.tree_dirs:03d}")
+                with open(os.path.join(folder, f"TS{n:05d}.txt"), "wb") as f:
+                    f.write(b"x" * (n % 512))
+
+            def worker(index, result):
+                client = self._open_client(server)
+                try:
+                    for _ in range(self.iterations):
+                        start = time.perf_counter()
+                        listing = client.handle_dir()
+                        if listing.startswith("ERROR"):
+                            result.fail(listing)
+                        else:
+                            result.record(time.perf_counter() - start, len(listing.encode()))
+                finally:
+                    client.disconnect()
+
+            return {"dir_tree": self._run_workers("dir_tree", worker)}
+
+    def scenario_churn(self):
+        small = self.source_files[self.sizes[0]]
+        with LoopbackServer(self.workdir, "churn", **self.server_kwargs) as server:
+            def worker(index, result):
+                client = self._open_client(server)
+                try:
+                    for i in range(self.iterations * 5):
+                        folder = f"churn_c{index}_{i}"
+                        for action in ("CREATE", "DELETE"):
+                            start = time.perf_counter()
+                            response = client.handle_subfolder(action, folder)
+                            if response.startswith("ERROR"):
+                                result.fail(response)
+                            else:
+                                result.record(time.perf_counter() - start)
+
+                        start = time.perf_counter()
+                        response = client.send_file(small, overwrite="yes")
+                        match = UPLOAD_NAME_RE.search(response)
+                        if not match:
+                            result.fail(response)
+                            continue
+                        response = client.handle_delete(match.group(1))
+                        if response.startswith("ERROR"):
+                            result.fail(response)
+                        else:
+                            result.record(time.perf_counter() - start, os.path.getsize(small))
+                finally:
+                    client.disconnect()
+
+            return {"churn": self._run_workers("churn", worker)}
+
+    def scenario_batch(self):
+        """Many small files per request through BATCH_UPLOAD and BATCH_DOWNLOAD."""
+        small = self.sizes[0]
+        batch_dir = os.path.join(self.workdir, "batch_source")
+        os.makedirs(batch_dir, exist_ok=True)
+        paths = []
+        for n in range(BATCH_FILES):
+            path = os.path.join(batch_dir, f"batch_{n:04d}.txt")
+            if not os.path.exists(path):
+                make_file(path, small)
+            paths.append(path)
+
+        with LoopbackServer(self.workdir, "batch", **self.server_kwargs) as server:
+            uploaded = {}
+
+            def upload_worker(index, result):
+                client = self._open_client(server)
+                try:
+                    for _ in range(self.iterations):
+                        start = time.perf_counter()
+                        results = client.send_files(paths, overwrite="yes")
+                        failed = [r for r in results if r["status"] != "OK"]
+                        if failed:
+                            result.fail(f"{len(failed)} files failed: {failed[0].get('message')}")
+                        else:
+                            result.record(time.perf_counter() - start, small * len(paths))
+                            uploaded[index] = [r["logical_name"] for r in results]
+                finally:
+                    client.disconnect()
+
+            def download_worker(index, result):
+                save_dir = os.path.join(self.workdir, f"batch_download_c{index}")
+                os.makedirs(save_dir, exist_ok=True)
+                client = self._open_client(server)
+                try:
+                    for _ in range(self.iterations):
+                        start = time.perf_counter()
+                        results = client.receive_files(uploaded.get(index, []), save_dir=save_dir)
+                        failed = [r for r in results if r["status"] != "OK"]
+                        if failed or not results:
+                            result.fail(f"{len(failed)} files failed")
+                        else:
+                            result.record(time.perf_counter() - start, small * len(results))
+                finally:
+                    client.disconnect()
+                    shutil.rmtree(save_dir, ignore_errors=True)
+
+            label = f"batch_{BATCH_FILES}x{format_size(small)}"
+            return {
+                f"{label}_upload": self._run_workers(f"{label}_upload", upload_worker),
+                f"{label}_download": self._run_workers(f"{label}_download", download_worker),
+            }
+
+    def scenario_storm(self):
+        with LoopbackServer(self.workdir, "storm", **self.server_kwargs) as server:
+            def worker(index, result):
+                for _ in range(self.storm_connections):
+                    start = time.perf_counter()
+                    client = self._open_client(server)
+                    client.disconnect()
+                    result.record(time.perf_counter() - start)
+
+            return {"storm": self._run_workers("storm", worker)}
+
+    # --- Entry point ---
+
+    def enable_tls(self):
+        """Switch server and clients to TLS using a throwaway self-signed certificate."""
+        certfile = os.path.join(self.workdir, "bench_cert.pem")
+        keyfile = os.path.join(self.workdir, "bench_key.pem")
+        if not os.path.exists(certfile):
+            tls.generate_self_signed(certfile, keyfile)
+        self.server_kwargs["ssl_context"] = tls.create_server_context(certfile, keyfile)
+        self.client_kwargs["ssl_context"] = tls.create_client_context(cafile=certfile)
+
+    def run(self, scenarios=None, suffix=""):
+        scenarios = scenarios or ALL_SCENARIOS
+        self._prepare_sources()
+        report = {
+            "meta": {
+                "git_revision": git_revision(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "clients": self.clients,
+                "profile": self.profile,
+                "sizes": self.sizes,
+                "iterations": self.iterations,
+                "server_kwargs": {k: str(v) for k, v in self.server_kwargs.items()},
+                "ktls_supported": tls.ktls_supported(),
+            },
+            "scenarios": {},
+        }
+        for name in scenarios:
+            print(f"[BENCH] Running scenario '{name}{suffix}'...")
+            for label, stats in getattr(self, f"scenario_{name}")().items():
+                report["scenarios"][label + suffix] = stats
+        return report
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def tls_overhead(report):
+    """Throughput overhead of each *_tls scenario against its plaintext twin, in percent."""
+    overhead = {}
+    for name, stats in report["scenarios"].items():
+        plain = report["scenarios"].get(name[:-len("_tls")]) if name.endswith("_tls") else None
+        if plain and plain["throughput_mb_s"] > 0:
+            overhead[name[:-len("_tls")]] = round(
+                (1 - stats["throughput_mb_s"] / plain["throughput_mb_s"]) * 100, 2)
+    return overhead
+
+
+def compare_reports(old, new):
+    """Return printable lines comparing throughput and latency of two reports."""
+    lines = [f"{'Scenario':<18} {'MB/s old':>10} {'MB/s new':>10} {'p50 ms old':>11} {'p50 ms new':>11} "
+             f"{'p99 ms old':>11} {'p99 ms new':>11}"]
+    for name, new_stats in new["scenarios"].items():
+        old_stats = old["scenarios"].get(name)
+        if not old_stats:
+            continue
+        lines.append(f"{name:<18} {old_stats['throughput_mb_s']:>10} {new_stats['throughput_mb_s']:>10} "
+                     f"{old_stats['latency_ms']['p50']:>11} {new_stats['latency_ms']['p50']:>11} "
+                     f"{old_stats['latency_ms']['p99']:>11} {new_stats['latency_ms']['p99']:>11}")
+    return lines
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Loopback benchmark for FileServer/FileClient")
+    parser.add_argument("--clients", type=int, default=4, help="Number of concurrent clients")
+    parser.add_argument("--profile", choices=sorted(SIZE_PROFILES), default="default",
+                        help="File size distribution for upload/download")
+    parser.add_argument("--iterations", type=int, default=3, help="Operations per client per size")
+    parser.add_argument("--scenarios", nargs="+", choices=ALL_SCENARIOS, default=ALL_SCENARIOS)
+    parser.add_argument("--tree-files", type=int, default=2000, help="Files in the DIR scenario tree")
+    parser.add_argument("--tree-dirs", type=int, default=20, help="Folders in the DIR scenario tree")
+    parser.add_argument("--storm-connections", type=int, default=50, help="Connections per client in the storm")
+    parser.add_argument("--username", default=DEFAULT_USERNAME)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--tls", choices=["off", "on", "both"], default="off",
+                        help="Run over TLS; 'both' runs plaintext and TLS and reports the overhead")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default=DEFAULT_FSYNC_POLICY,
+                        help="Server fsync policy for uploads")
+    parser.add_argument("--workdir", help="Scratch directory (default: a new temp dir)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two JSON reports and exit")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        print("\n".join(compare_reports(old, new)))
+        return 0
+
+    bench = Benchmark(clients=args.clients, profile=args.profile, iterations=args.iterations,
+                      tree_files=args.tree_files, tree_dirs=args.tree_dirs,
+                      storm_connections=args.storm_connections, username=args.username,
+                      password=args.password, workdir=args.workdir,
+                      server_kwargs={"fsync_policy": args.fsync})
+    try:
+        if args.tls == "on":
+            bench.enable_tls()
+        report = bench.run(args.scenarios, suffix="_tls" if args.tls == "on" else "")
+        if args.tls == "both":
+            bench.enable_tls()
+            report["scenarios"].update(bench.run(args.scenarios, suffix="_tls")["scenarios"])
+            report["tls_overhead_pct"] = tls_overhead(report)
+    finally:
+        if not args.workdir:
+            bench.cleanup()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"[BENCH] Report written to {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+import time
+
+from tree import INTERNAL_PREFIX
+
+# --- CONSTANTS ---
+CATALOG_FILE = INTERNAL_PREFIX + "catalog.sqlite3"  # Inside data_path; hidden from DIR like other bookkeeping
+ACCESS_FLUSH_EVERY = 64  # Download counts are buffered and written in one transaction per this many accesses
+DEFAULT_QUERY_LIMIT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    logical_name  TEXT PRIMARY KEY,
+    original_name TEXT NOT NULL,
+    owner         TEXT,
+    size          INTEGER NOT NULL,
+    mime          TEXT,
+    digest        TEXT,
+    algorithm     TEXT,
+    created_at    REAL NOT NULL,
+    last_access   REAL,
+    access_count  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS files_owner_created ON files (owner, created_at);
+CREATE INDEX IF NOT EXISTS files_original_name ON files (original_name);
+CREATE INDEX IF NOT EXISTS files_created ON files (created_at);
+"""
+
+
+class Catalog:
+    """File metadata (original name, owner, size, MIME, digest, times, access counts) in SQLite.
+
+    The database runs in WAL mode so lookups from many session threads do not
+    block on writers; each thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._access_lock = threading.Lock()
+        self._pending_access = {}  # logical_name -> (count, last_access)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; WAL keeps it crash-safe
+            self._local.db = db
+        return db
+
+    def record(self, logical_name, original_name, owner=None, size=0, mime=None, digest=None, algorithm=None):
+        """Insert or replace the entry for a newly stored file."""
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO files (logical_name, original_name, owner, size, mime, digest, algorithm,"
+                " created_at, access_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (logical_name, original_name, owner, size, mime, digest, algorithm, time.time()))
+
+    def record_many(self, entries):
+        """record() for many files in one transaction; entries are dicts with record()'s keyword names."""
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO files (logical_name, original_name, owner, size, mime, digest, algorithm,"
+                " created_at, access_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                [(entry["logical_name"], entry["original_name"], entry.get("owner"), entry.get("size", 0),
+                  entry.get("mime"), entry.get("digest"), entry.get("algorithm"), now) for entry in entries])
+
+    def record_access(self, logical_name):
+        """Count a download (buffered; see ACCESS_FLUSH_EVERY)."""
+        with self._access_lock:
+            count, _ = self._pending_access.get(logical_name, (0, None))
+            self._pending_access[logical_name] = (count + 1, time.time())
+            full = sum(count for count, _ in self._pending_access.values()) >= ACCESS_FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write buffered access counts."""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if pending:
+            with self._connect() as db:
+                db.executemany(
+                    "UPDATE files SET access_count = access_count + ?, last_access = ? WHERE logical_name = ?",
+                    [(count, last_access, name) for name, (count, last_access) in pending.items()])
+
+    def remove(self, logical_name):
+        with self._access_lock:
+            self._pending_access.pop(logical_name, None)
+        with self._connect() as db:
+            db.execute("DELETE FROM files WHERE logical_name = ?", (logical_name,))
+
+    def get(self, logical_name):
+        self.flush()
+        row = self._connect().execute("SELECT * FROM files WHERE logical_name = ?", (logical_name,)).fetchone()
+        return dict(row) if row else None
+
+    def find(self, owner=None, original_name=None, since=None, until=None, limit=DEFAULT_QUERY_LIMIT):
+        """Entries matching every given filter, newest first.
+
+        original_name may contain '*' wildcards; since/until are epoch seconds.
+        """
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if original_name is not None:
+            if "*" in original_name:
+                clauses.append("original_name GLOB ?")
+            else:
+                clauses.append("original_name = ?")
+            params.append(original_name)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        self.flush()
+        rows = self._connect().execute(
+            f"SELECT * FROM files {where} ORDER BY created_at DESC LIMIT ?", (*params, int(limit))).fetchall()
+        return [dict(row) for row in rows]
+
+    def original_names(self):
+        """{logical_name: original_name} for every entry (used to build the search index)."""
+        return dict(self._connect().execute("SELECT logical_name, original_name FROM files").fetchall())
+
+    def reconcile(self, files, mime_of=None):
+        """Match the catalog to the stored {name: size}: add unknown files, drop entries whose file is gone.
+
+        Returns (added, removed).
+        """
+        known = {row[0] for row in self._connect().execute("SELECT logical_name FROM files")}
+        added = [name for name in files if name not in known]
+        removed = [name for name in known if name not in files]
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT INTO files (logical_name, original_name, size, mime, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(name, name.rpartition("/")[2], files[name], mime_of(name) if mime_of else None, now)
+                 for name in added])
+            db.executemany("DELETE FROM files WHERE logical_name = ?", [(name,) for name in removed])
+        return len(added), len(removed)
+
+    def close(self):
+        self.flush()
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
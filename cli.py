@@ -0,0 +1,415 @@
+import argparse
+import fnmatch
+import getpass
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from client import PORT
+from pool import INTERACTIVE_RESERVE, ConnectionPool
+from progress import format_bytes
+from sync import CONFLICT_POLICIES, DIRECTIONS, SyncEngine, batches
+from tls import create_client_context
+
+# --- CONSTANTS ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_WORKERS = 4  # Parallel transfers (one pooled connection each)
+BATCH_FILES = 64  # Files per BATCH_UPLOAD/BATCH_DOWNLOAD exchange (cut earlier at sync.BATCH_BYTES)
+PROGRESS_INTERVAL = 1.0  # seconds between progress lines
+USER_ENV = "FT_USER"
+PASSWORD_ENV = "FT_PASSWORD"
+EXIT_OK, EXIT_FAILED, EXIT_ERROR = 0, 1, 2
+_TREE_SUMMARY = re.compile(r"(\d+) files \((\d+) bytes\)")
+
+
+class Progress:
+    """Thread-safe transfer counters, reported on stderr at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, command, total_files=0, total_bytes=0, enabled=True):
+        self.command = command
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.enabled = enabled
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.start = self._last_report = time.monotonic()
+        self._lock = threading.Lock()
+        self._tty = sys.stderr.isatty()
+
+    def add(self, results):
+        with self._lock:
+            for result in results:
+                if result["status"] == "OK":
+                    self.files += result.get("files", 1)
+                    self.bytes += result.get("size", 0)
+                else:
+                    self.failed += 1
+            now = time.monotonic()
+            if self.enabled and now - self._last_report >= PROGRESS_INTERVAL:
+                self._last_report = now
+                self._write(self.line(), final=False)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    @property
+    def throughput(self):
+        """Bytes per second so far."""
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def line(self):
+        files = f"{self.files}/{self.total_files}" if self.total_files else str(self.files)
+        failed = f", {self.failed} failed" if self.failed else ""
+        return (f"[{self.command}] {files} files, {format_bytes(self.bytes)} in {self.elapsed:.1f}s "
+                f"({format_bytes(self.throughput)}/s){failed}")
+
+    def finish(self):
+        if self.enabled:
+            self._write(self.line(), final=True)
+
+    def _write(self, line, final):
+        if self._tty:
+            sys.stderr.write(f"\r{line}\033[K" + ("\n" if final else ""))
+        else:
+            sys.stderr.write(line + "\n")
+        sys.stderr.flush()
+
+
+def _status_result(reply, **fields):
+    """Per-item result dict from a FileClient status string."""
+    ok = not reply.startswith(("ERROR", "CANCELLED"))
+    result = dict(fields, status="OK" if ok else "ERROR", message=reply.removeprefix("SUCCESS: "))
+    match = _TREE_SUMMARY.search(reply) if ok else None
+    if match:
+        result.update(files=int(match.group(1)), size=int(match.group(2)))
+    return result
+
+
+class BulkClient:
+    """Non-interactive bulk operations over a ConnectionPool, `workers` transfers at a time.
+
+    Every method returns a list of per-item result dicts with a "status" of OK
+    or ERROR, so callers (and --json output) never parse status strings.
+    """
+
+    def __init__(self, host, port, username, password, workers=DEFAULT_WORKERS, ssl_context=None,
+                 log_callback=None, progress=True, batch_files=BATCH_FILES):
+        self.workers = workers
+        self.batch_files = batch_files
+        self.progress_enabled = progress
+        # Bulk transfers may use all but INTERACTIVE_RESERVE connections, so add that many on top
+        self.pool = ConnectionPool(host, port, username, password, size=workers + INTERACTIVE_RESERVE,
+                                   log_callback=log_callback or (lambda message: None), stats_file=None,
+                                   ssl_context=ssl_context)
+        self.progress = None
+
+    def close(self):
+        self.pool.close()
+
+    def _run(self, tasks):
+        """Run (function, args) tasks on the worker threads; each returns a list of results."""
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(function, *args) for function, args in tasks]
+            for future in as_completed(futures):
+                batch = future.result()
+                self.progress.add(batch)
+                results.extend(batch)
+        return results
+
+    def _call(self, operation, *args):
+        return self.pool.call(operation, *args)
+
+    def _listing(self):
+        listing = self._call("list_files")
+        if isinstance(listing, str):
+            raise ConnectionError(listing)
+        return listing["files"], listing["folders"]
+
+    # --- Commands ---
+
+    def put(self, paths, recursive=False, remote_dir="", overwrite=False, verify=True):
+        """Upload files (glob patterns allowed, '**' recurses). Directories need recursive=True and
+        are uploaded as trees into remote_dir/<name>; plain files get server-assigned logical names."""
+        files, trees, results = [], [], []
+        for pattern in paths:
+            matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+            if not matches:
+                results.append({"path": pattern, "status": "ERROR", "message": "No matching files."})
+            for path in matches:
+                if os.path.isdir(path):
+                    # '**' already lists the files inside matching directories
+                    if recursive and "**" not in pattern:
+                        trees.append(path)
+                    elif not glob.has_magic(pattern):
+                        results.append({"path": path, "status": "ERROR", "message": "Is a directory (use -r)."})
+                    continue
+                try:
+                    files.append((path, os.path.getsize(path)))
+                except OSError as e:
+                    results.append({"path": path, "status": "ERROR", "message": e.strerror or str(e)})
+
+        self.progress = Progress("put", len(files), sum(size for _, size in files), self.progress_enabled)
+        self.progress.add(results)
+        overwrite = "yes" if overwrite else "no"
+        tasks = [(self._put_batch, (batch, overwrite, verify)) for batch in batches(files, self.batch_files)]
+        tasks += [(self._put_tree, (path, remote_dir)) for path in trees]
+        return results + self._run(tasks)
+
+    def _put_batch(self, paths, overwrite, verify):
+        reply = self._call("send_files", paths, overwrite, verify)
+        if isinstance(reply, str):
+            return [{"path": path, "status": "ERROR", "message": reply} for path in paths]
+        # send_files reports by base name; pair results back up with the local paths
+        by_name = {}
+        for path in paths:
+            by_name.setdefault(os.path.basename(path), deque()).append(path)
+        results = []
+        for result in reply:
+            queued = by_name.get(result["name"])
+            results.append(dict(result, path=queued.popleft() if queued else result["name"]))
+        return results
+
+    def _put_tree(self, path, remote_dir):
+        target = "/".join(part for part in (remote_dir.strip("/"), os.path.basename(os.path.abspath(path))) if part)
+        return [_status_result(self._call("upload_tree", path, target), path=path, name=target)]
+
+    def get(self, patterns, dest=".", recursive=False, verify=True):
+        """Download server files matching shell patterns into dest (folders too with recursive=True)."""
+        files, folders = self._listing()
+        names, trees, results = {}, [], []
+        for pattern in patterns:
+            matched = [name for name in files if fnmatch.fnmatchcase(name, pattern)]
+            matched_folders = [folder for folder in folders if fnmatch.fnmatchcase(folder, pattern)]
+            if recursive:
+                trees.extend(folder for folder in matched_folders if folder not in trees)
+            if not matched and not (recursive and matched_folders):
+                results.append({"name": pattern, "status": "ERROR", "message": "No matching files."})
+            names.update((name, files[name]) for name in matched)
+
+        for name in names:
+            os.makedirs(os.path.join(dest, os.path.dirname(name)), exist_ok=True)
+        self.progress = Progress("get", len(names), sum(names.values()), self.progress_enabled)
+        self.progress.add(results)
+        tasks = [(self._get_batch, (batch, dest, verify)) for batch in batches(names.items(), self.batch_files)]
+        tasks += [(self._get_tree, (folder, dest)) for folder in trees]
+        return results + self._run(tasks)
+
+    def _get_batch(self, names, dest, verify):
+        reply = self._call("receive_files", names, dest, verify)
+        if isinstance(reply, str):
+            return [{"name": name, "status": "ERROR", "message": reply} for name in names]
+        return reply
+
+    def _get_tree(self, folder, dest):
+        return [_status_result(self._call("download_tree", folder, os.path.join(dest, folder)), name=folder)]
+
+    def ls(self, patterns=()):
+        """{"files": [{name, size}], "folders": [...]} matching any of the patterns (everything without any)."""
+        files, folders = self._listing()
+
+        def wanted(name):
+            return not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+        return {"files": [{"name": name, "size": size} for name, size in sorted(files.items()) if wanted(name)],
+                "folders": sorted(folder for folder in folders if wanted(folder))}
+
+    def rm(self, patterns, recursive=False):
+        """Delete server files matching the patterns (and empty folders with recursive=True)."""
+        files, folders = self._listing()
+        names, results = [], []
+        for pattern in patterns:
+            matched = [name for name in files if fnmatch.fnmatchcase(name, pattern) and name not in names]
+            if recursive:
+                matched += [folder for folder in folders if fnmatch.fnmatchcase(folder, pattern)]
+            if not matched:
+                results.append({"name": pattern, "status": "ERROR", "message": "No matching files."})
+            names.extend(matched)
+        self.progress = Progress("rm", len(names), 0, self.progress_enabled)
+        self.progress.add(results)
+        # Files first, then folders deepest first, so folders are empty by the time they are removed
+        file_tasks = [(self._rm_file, (name,)) for name in names if name in files]
+        folder_names = sorted((name for name in names if name not in files), key=lambda name: -name.count("/"))
+        results += self._run(file_tasks)
+        for name in folder_names:
+            folder_results = self._rm_folder(name)
+            self.progress.add(folder_results)
+            results += folder_results
+        return results
+
+    def _rm_file(self, name):
+        return [_status_result(self._call("handle_delete", name), name=name)]
+
+    def _rm_folder(self, name):
+        return [_status_result(self._call("handle_subfolder", "DELETE", name), name=name)]
+
+    def mkdir(self, paths):
+        self.progress = Progress("mkdir", len(paths), 0, self.progress_enabled)
+        return self._run([(self._mkdir, (path,)) for path in paths])
+
+    def _mkdir(self, path):
+        return [_status_result(self._call("handle_subfolder", "CREATE", path), name=path)]
+
+    def sync(self, local_dir, remote_dir="", direction="both", delete=False, conflict="newer", dry_run=False):
+        """Sync a local directory with a server folder (see sync.SyncEngine). Returns the engine's summary."""
+        self.progress = Progress("sync", 0, 0, self.progress_enabled)
+        engine = SyncEngine(self.pool, local_dir, remote_dir, direction, delete, conflict, self.workers,
+                            on_result=self.progress.add)
+        return engine.run(dry_run)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Non-interactive bulk client for the file server.")
+    parser.add_argument("--host", default=os.environ.get("FT_HOST", DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FT_PORT", PORT)))
+    parser.add_argument("--user", default=os.environ.get(USER_ENV), help=f"Username (default: ${USER_ENV})")
+    parser.add_argument("--password", default=os.environ.get(PASSWORD_ENV),
+                        help=f"Password (default: ${PASSWORD_ENV}; prompted for on a terminal)")
+    parser.add_argument("--tls", action="store_true", help="Connect over TLS")
+    parser.add_argument("--ca-file", help="CA bundle for verifying the server certificate")
+    parser.add_argument("--insecure", action="store_true", help="Don't verify the server certificate")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help="Parallel transfers")
+    parser.add_argument("--batch-files", type=int, default=BATCH_FILES, help="Files per batch request")
+    parser.add_argument("--json", action="store_true", help="Print one JSON document of results on stdout")
+    parser.add_argument("-q", "--quiet", action="store_true", help="No progress output")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show client log messages on stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    put = commands.add_parser("put", help="Upload files")
+    put.add_argument("paths", nargs="+", help="Files, directories or glob patterns ('**' recurses)")
+    put.add_argument("-r", "--recursive", action="store_true", help="Upload directories as trees")
+    put.add_argument("--remote-dir", default="", help="Server folder that directories are uploaded into")
+    put.add_argument("--overwrite", action="store_true")
+    put.add_argument("--no-verify", action="store_true", help="Skip digest verification")
+
+    get = commands.add_parser("get", help="Download files")
+    get.add_argument("patterns", nargs="+", help="Server names or shell patterns")
+    get.add_argument("-d", "--dest", default=".", help="Local directory (default: current)")
+    get.add_argument("-r", "--recursive", action="store_true", help="Download matching folders as trees")
+    get.add_argument("--no-verify", action="store_true", help="Skip digest verification")
+
+    ls = commands.add_parser("ls", help="List server files")
+    ls.add_argument("patterns", nargs="*")
+    ls.add_argument("-l", "--long", action="store_true", help="Show sizes")
+
+    rm = commands.add_parser("rm", help="Delete server files")
+    rm.add_argument("patterns", nargs="+")
+    rm.add_argument("-r", "--recursive", action="store_true", help="Also delete matching (empty) folders")
+
+    mkdir = commands.add_parser("mkdir", help="Create server folders")
+    mkdir.add_argument("paths", nargs="+")
+
+    sync = commands.add_parser("sync", help="Sync a local directory with a server folder (changed files only)")
+    sync.add_argument("local_dir")
+    sync.add_argument("remote_dir", nargs="?", default="")
+    sync.add_argument("--direction", choices=DIRECTIONS, default="both",
+                      help="both ways, or one way: up (local wins) / down (server wins)")
+    sync.add_argument("--delete", action="store_true", help="Mirror deletions instead of restoring deleted files")
+    sync.add_argument("--conflict", choices=CONFLICT_POLICIES, default="newer",
+                      help="Which copy wins when both sides changed a file")
+    sync.add_argument("-n", "--dry-run", action="store_true", help="Only show what would be transferred")
+    return parser
+
+
+def _print_results(command, results):
+    for result in results:
+        if result["status"] != "OK":
+            target = result.get("path") or result.get("name")
+            print(f"{command}: {target}: {result.get('message', result['status'])}", file=sys.stderr)
+
+
+def _print_sync_summary(summary):
+    prefix = "[sync] would" if summary.get("dry_run") else "[sync]"
+    print(f"{prefix} upload {summary['upload']}, download {summary['download']}, delete "
+          f"{summary['delete_remote']} on the server and {summary['delete_local']} locally; "
+          f"{summary['unchanged']} unchanged, {len(summary['conflicts'])} conflicts", file=sys.stderr)
+    for conflict in summary["conflicts"]:
+        print(f"sync: {conflict['path']}: changed on both sides, kept the {conflict['winner']} copy", file=sys.stderr)
+
+
+def _print_listing(listing, long):
+    for folder in listing["folders"]:
+        print(f"{'':>12}  {folder}/" if long else f"{folder}/")
+    for entry in listing["files"]:
+        print(f"{entry['size']:>12}  {entry['name']}" if long else entry["name"])
+
+
+def run(args):
+    if not args.user:
+        raise SystemExit(f"error: --user or ${USER_ENV} is required")
+    password = args.password
+    if password is None:
+        if not sys.stdin.isatty():
+            raise SystemExit(f"error: --password or ${PASSWORD_ENV} is required")
+        password = getpass.getpass(f"Password for {args.user}: ")
+
+    ssl_context = None
+    if args.tls:
+        ssl_context = create_client_context(cafile=args.ca_file, verify=not args.insecure)
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    bulk = BulkClient(args.host, args.port, args.user, password, max(1, args.workers), ssl_context, log,
+                      progress=not args.quiet, batch_files=max(1, args.batch_files))
+    try:
+        if args.command == "ls":
+            listing = bulk.ls(args.patterns)
+            if args.json:
+                print(json.dumps(dict(listing, command="ls")))
+            else:
+                _print_listing(listing, args.long)
+            return EXIT_OK
+        if args.command == "put":
+            results = bulk.put(args.paths, args.recursive, args.remote_dir, args.overwrite, not args.no_verify)
+        elif args.command == "get":
+            results = bulk.get(args.patterns, args.dest, args.recursive, not args.no_verify)
+        elif args.command == "rm":
+            results = bulk.rm(args.patterns, args.recursive)
+        elif args.command == "mkdir":
+            results = bulk.mkdir(args.paths)
+        else:
+            summary = bulk.sync(args.local_dir, args.remote_dir, args.direction, args.delete, args.conflict,
+                                args.dry_run)
+            results = summary.pop("results")
+    finally:
+        bulk.close()
+
+    progress = bulk.progress
+    progress.finish()
+    failed = sum(1 for result in results if result["status"] != "OK")
+    if args.json:
+        report = {"command": args.command, "ok": len(results) - failed, "failed": failed,
+                  "bytes": progress.bytes, "seconds": round(progress.elapsed, 3),
+                  "throughput_mb_s": round(progress.throughput / (1024 * 1024), 2), "results": results}
+        if args.command == "sync":
+            report["sync"] = summary
+        print(json.dumps(report))
+    else:
+        if args.command == "sync":
+            _print_sync_summary(summary)
+        _print_results(args.command, results)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def main(argv=None):
+    """python cli.py --user user1 put -r reports/ '*.csv'   (password from $FT_PASSWORD)"""
+    args = build_arg_parser().parse_args(argv)
+    try:
+        return run(args)
+    except BrokenPipeError:
+        # Output piped into e.g. head, which has exited
+        sys.stdout = open(os.devnull, "w")
+        return EXIT_OK
+    except (ConnectionError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
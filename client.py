@@ -1,7 +1,18 @@
 import socket
 import os
+import select
+import io
+import json
+import zlib
 import hashlib
 from analysis import NetworkAnalysis as NA
+from protocol import (recv_frame, send_frame, send_json, recv_json, recv_into_file, send_from_file,
+                      ChunkedReader, ChunkedWriter)
+from integrity import INTEGRITY_RETRIES, IntegrityError, choose_algorithm, new_hasher, supported_algorithms
+from progress import PROGRESS_SLICE, ProgressMeter, TransferCancelled
+from search import DEFAULT_PAGE_SIZE
+import tree
+from tls import describe_connection
 import time
 import getpass  # Kept for potential future console use, but GUI will handle input
 
@@ -9,12 +20,126 @@ import getpass  # Kept for potential future console use, but GUI will handle inp
 IP = "192.168.131.12"
 PORT = 4450
 SIZE = 1024
+CHUNK_SIZE = 64 * 1024  # Buffer size for bulk file data
+INTEGRITY_FAILED = "Integrity check failed."  # Per-file batch result message for a digest mismatch
 FORMAT = "utf-8"
 SERVER_DATA_PATH = "server_data"  # Not used directly in client class, but kept for context
+CLIENT_STATS_FILE = "client_network_stats.csv"
+AUTH_PROMPT = "Please authenticate to continue."
+CONNECT_TIMEOUT = 10  # seconds
+
+
+class ReplicationStream:
+    """Changes streamed by a primary after REPLICATE; put changes are followed by their file data."""
+
+    def __init__(self, sock, algorithm, head):
+        self.sock = sock
+        self.algorithm = algorithm
+        self.head = head
+
+    def __iter__(self):
+        while True:
+            change = recv_json(self.sock)
+            if change.get("error"):
+                raise ConnectionError(change["error"])
+            yield change
+
+
+class RemoteFile(io.RawIOBase):
+    """Readable binary stream over one download, returned by FileClient.open_remote().
+
+    Data is read straight from the socket, so it can be piped into a compressor,
+    parser or another socket without a local copy. With a digest algorithm the
+    data is hashed as it is read and IntegrityError is raised by the read that
+    reaches the end if it doesn't match. The session is busy until the stream
+    is closed; closing early reads and discards the rest of the file.
+    """
+
+    def __init__(self, client, name, size, algorithm=None):
+        super().__init__()
+        self.client = client
+        self.sock = client.client_socket
+        self.name = name
+        self.size = size
+        self.algorithm = algorithm
+        self.digest = None
+        self._hasher = new_hasher(algorithm) if algorithm else None
+        self._remaining = size
+        self._finished = False
+        self._start_time = client.analyzer.start_record_time()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._remaining == 0:
+            self._finish()
+            return 0
+        view = memoryview(b).cast("B")
+        count = self.sock.recv_into(view, min(len(view), self._remaining))
+        if not count:
+            raise ConnectionError(f"Connection closed after {self.size - self._remaining} of {self.size} bytes")
+        if self._hasher is not None:
+            self._hasher.update(view[:count])
+        self._remaining -= count
+        if self._remaining == 0:
+            self._finish()
+        return count
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """Yield the data as memoryview chunks of one reused buffer (each is only valid until the next)."""
+        view = memoryview(bytearray(chunk_size))
+        while True:
+            count = self.readinto(view)
+            if not count:
+                return
+            yield view[:count]
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self._hasher is not None:
+            expected = recv_frame(self.sock).decode(FORMAT)
+            if expected != self._hasher.hexdigest():
+                raise IntegrityError(f"Integrity check failed for '{self.name}'.")
+            self.digest = expected
+        self.client.analyzer.stop_record_time(self._start_time, self.size, operation="CLIENT_DOWNLOAD")
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if not self._finished:
+                # Skip the rest of the data and the digest trailer so the session stays in sync
+                buf = bytearray(CHUNK_SIZE)
+                while self._remaining:
+                    count = self.sock.recv_into(buf, min(CHUNK_SIZE, self._remaining))
+                    if not count:
+                        raise ConnectionError("Connection closed while skipping file data")
+                    self._remaining -= count
+                self._finished = True
+                if self._hasher is not None:
+                    recv_frame(self.sock)
+        except OSError:
+            self.client.disconnect()
+        finally:
+            super().close()
+
+
+def _iter_source(source, chunk_size=CHUNK_SIZE):
+    """Bytes chunks from a readable binary file object, a bytes-like object or an iterable of bytes-like chunks"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+    elif hasattr(source, "read"):
+        yield from iter(lambda: source.read(chunk_size), b"")
+    else:
+        yield from source
 
 
 class FileClient:
-    def __init__(self, ip=IP, port=PORT, log_callback=None):
+    def __init__(self, ip=IP, port=PORT, log_callback=None, stats_file=CLIENT_STATS_FILE, timeout=CONNECT_TIMEOUT,
+                 ssl_context=None, server_hostname=None, tls_session=None):
         self.ip = ip
         self.port = port
         self.addr = (ip, port)
@@ -23,7 +148,14 @@ class FileClient:
         self.is_connected = False
         self.is_authenticated = False
         self.username = None
+        self.session_token = None  # Issued by the server on login, used by resume_session()
         self.log_callback = log_callback  # Function passed by the UI for logging
+        self.stats_file = stats_file  # None disables writing the CSV on disconnect()
+        self.timeout = timeout
+        self.ssl_context = ssl_context  # tls.create_client_context(...) enables TLS
+        self.server_hostname = server_hostname or ip
+        self.tls_session = tls_session  # Reused on reconnect for an abbreviated TLS handshake
+        self._prompt_received = False  # Welcome and auth prompt can arrive in one recv
 
         self._log(f"Initialized with target server: {self.ip}:{self.port}")
 
@@ -58,8 +190,14 @@ class FileClient:
 
         try:
             self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.settimeout(10)  # Set 10 second timeout
+            self.client_socket.settimeout(self.timeout)
+            self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.client_socket.connect(self.addr)
+            if self.ssl_context:
+                self.client_socket = self.ssl_context.wrap_socket(self.client_socket,
+                                                                  server_hostname=self.server_hostname,
+                                                                  session=self.tls_session)
+                self._log(f"TLS established: {describe_connection(self.client_socket)}")
             self.is_connected = True
             self._log(f"Successfully connected to server at {self.ip}:{self.port}")
 
@@ -69,6 +207,9 @@ class FileClient:
             # Receive welcome message from server (if any)
             try:
                 welcome_msg = self.client_socket.recv(SIZE).decode(FORMAT)
+                if welcome_msg.endswith(AUTH_PROMPT):
+                    self._prompt_received = True
+                    welcome_msg = welcome_msg[:-len(AUTH_PROMPT)]
                 if "@" in welcome_msg:
                     cmd, msg = welcome_msg.split("@", 1)
                     if cmd == "OK":
@@ -93,32 +234,56 @@ class FileClient:
             return "ERROR: Not connected to server."
 
         try:
-            # Receive authentication prompt
-            msg = self.client_socket.recv(SIZE).decode(FORMAT)
-            self._log(f"Server Prompt: {msg}")
-
             # Hash password before sending
             hashed_password = self._hash_password(password)
+            return self._send_credentials(f"{username}@{hashed_password}", username)
+        except Exception as e:
+            self._log(f"Authentication error: {e}")
+            self.disconnect()
+            return f"ERROR: {e}"
 
-            # Send credentials
-            self.client_socket.send(f"{username}@{hashed_password}".encode(FORMAT))
-
-            # Receive authentication result
-            response = self.client_socket.recv(SIZE).decode(FORMAT)
+    def resume_session(self, token=None):
+        """Re-authenticate with a session token from a previous login (one message, no password)."""
+        token = token or self.session_token
+        if not token:
+            return "ERROR: No session token available."
+        if not self.is_connected and not self.connect():
+            return "ERROR: Not connected to server."
 
-            if response == "AUTH_SUCCESS":
-                self.is_authenticated = True
-                self.username = username
-                self._log("Authentication successful!")
-                return "AUTH_SUCCESS"
-            else:
-                self._log("Authentication failed. Invalid credentials.")
-                return "AUTH_FAILED"
+        try:
+            return self._send_credentials(f"TOKEN@{token}", self.username)
         except Exception as e:
-            self._log(f"Authentication error: {e}")
+            self._log(f"Session resume error: {e}")
             self.disconnect()
             return f"ERROR: {e}"
 
+    def _send_credentials(self, credentials, username):
+        """Send one credentials message and process the AUTH_SUCCESS@<token>/AUTH_FAILED reply."""
+        # Receive authentication prompt (unless it came in with the welcome message)
+        if self._prompt_received:
+            msg = AUTH_PROMPT
+            self._prompt_received = False
+        else:
+            msg = self.client_socket.recv(SIZE).decode(FORMAT)
+        self._log(f"Server Prompt: {msg}")
+
+        # Send credentials
+        self.client_socket.send(credentials.encode(FORMAT))
+
+        # Receive authentication result
+        response = self.client_socket.recv(SIZE).decode(FORMAT)
+
+        if response.startswith("AUTH_SUCCESS"):
+            self.is_authenticated = True
+            self.username = username
+            if "@" in response:
+                self.session_token = response.split("@", 1)[1]
+            self._log("Authentication successful!")
+            return "AUTH_SUCCESS"
+        else:
+            self._log("Authentication failed. Invalid credentials.")
+            return "AUTH_FAILED"
+
     def disconnect(self):
         """Logs out and closes the client socket."""
         if self.is_connected:
@@ -127,30 +292,93 @@ class FileClient:
                     self.client_socket.send("LOGOUT".encode(FORMAT))
                     self._log("Logging out...")
 
+                if self.ssl_context:
+                    # TLS 1.3 tickets arrive after the handshake, so keep the latest session for reconnects
+                    self.tls_session = self.client_socket.session or self.tls_session
+
                 self.client_socket.close()
                 self._log("Disconnected from the server.")
             except Exception as e:
                 self._log(f"Error during disconnect: {e}")
             finally:
                 # Save statistics before closing
-                if self.analyzer:
-                    self.analyzer.save_stats(filename="client_network_stats.csv")
+                if self.analyzer and self.stats_file:
+                    self.analyzer.save_stats(filename=self.stats_file)
 
         self.client_socket = None
         self.is_connected = False
         self.is_authenticated = False
-        self.username = None
+        self._prompt_received = False
+        # username and session_token are kept so resume_session() can reconnect
         return "DISCONNECTED"
 
+    def _abandon_connection(self):
+        """Close the connection mid-transfer without LOGOUT, which the server would read as file data.
+
+        The server sees a short transfer and discards it.
+        """
+        self.is_authenticated = False
+        self.disconnect()
+
+    def ping(self):
+        """Cheap keepalive round trip. Returns True if the server answered PONG."""
+        if not self.is_authenticated:
+            return False
+        try:
+            self.client_socket.send("PING".encode(FORMAT))
+            return self.client_socket.recv(SIZE).decode(FORMAT) == "PONG"
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    def server_closed(self):
+        """True if the server has closed this idle connection (e.g. while draining for a restart).
+
+        Non-blocking: checks for a pending EOF without a round trip, so pools can run it on every checkout.
+        """
+        if not self.is_connected:
+            return True
+        try:
+            readable, _, _ = select.select([self.client_socket], [], [], 0)
+            # Peek below TLS (SSLSocket.recv refuses flags): an empty read is the server's FIN
+            return bool(readable) and not socket.socket.recv(self.client_socket, 1, socket.MSG_PEEK)
+        except (OSError, ValueError):
+            return True
+
     # --- File Operations ---
 
-    def send_file(self, filepath, overwrite="no"):
-        """Send file to server. Returns status message."""
+    @staticmethod
+    def _offered_algorithm(ready):
+        """Pick a digest algorithm from a server 'READY@alg1,alg2' message (None for a bare READY)."""
+        if "@" not in ready:
+            return None
+        return choose_algorithm(ready.split("@", 1)[1].split(","))
+
+    def send_file(self, filepath, overwrite="no", verify=True, progress=None, cancel_event=None):
+        """Send file to server. Returns status message.
+
+        With verify=True the data is hashed as it is sent and the server checks the
+        digest; an upload rejected for a mismatch is retried. progress, if given, is
+        called with throttled progress.ProgressEvent objects; setting cancel_event
+        aborts the transfer (and closes the connection).
+        """
+        for attempt in range(INTEGRITY_RETRIES + 1):
+            result = self._send_file_once(filepath, overwrite, verify, progress, cancel_event)
+            if not result.startswith("ERROR: Integrity check failed") or attempt == INTEGRITY_RETRIES:
+                return result
+            self._log(f"{result} Retrying upload...")
+
+    def _send_file_once(self, filepath, overwrite, verify, progress=None, cancel_event=None):
         if not self.is_authenticated:
             return "ERROR: Not authenticated."
 
         self.client_socket.send("UPLOAD".encode(FORMAT))
-        self.client_socket.recv(SIZE)  # Wait for server READY signal
+        ready = self.client_socket.recv(SIZE).decode(FORMAT)  # Wait for server READY signal
+        if ready.startswith("ERROR"):
+            # e.g. a read-only replica, which closes the session after refusing
+            self._log(ready)
+            self.disconnect()
+            return ready
+        algorithm = self._offered_algorithm(ready) if verify else None
 
         try:
             filesize = os.path.getsize(filepath)
@@ -159,7 +387,8 @@ class FileClient:
             start_time = self.analyzer.start_record_time()
             bytes_transferred = 0
 
-            self.client_socket.send(f"{filename}@{filesize}".encode(FORMAT))
+            metadata = f"{filename}@{filesize}@{algorithm}" if algorithm else f"{filename}@{filesize}"
+            self.client_socket.send(metadata.encode(FORMAT))
 
             response = self.client_socket.recv(SIZE).decode(FORMAT)
 
@@ -172,36 +401,71 @@ class FileClient:
 
                 response = self.client_socket.recv(SIZE).decode(FORMAT)
 
-            if response == "OK":
+            if response.startswith("OK"):
+                # Without verification this is a zero-copy sendfile(); with it, data is hashed in the same pass
+                hasher = new_hasher(algorithm) if algorithm else None
+                meter = None
+                if progress is not None or cancel_event is not None:
+                    meter = ProgressMeter(filename, "upload", filesize, progress, cancel_event)
+                chunk_size = CHUNK_SIZE if hasher is not None or meter is None else PROGRESS_SLICE
                 with open(filepath, "rb") as f:
-                    while True:
-                        data = f.read(SIZE)
-                        if not data:
-                            break
-                        self.client_socket.send(data)
-                        bytes_transferred += len(data)
-
-                msg = self.client_socket.recv(SIZE).decode(FORMAT)
+                    bytes_transferred = send_from_file(self.client_socket, f, filesize, chunk_size, hasher,
+                                                       progress=meter)
+                if bytes_transferred < filesize:
+                    # File shrank while sending. Padding would be stored as data when nothing verifies it,
+                    # so drop the connection and let the server discard the short upload
+                    self._log(f"'{filename}' changed while uploading; upload aborted.")
+                    self._abandon_connection()
+                    return f"ERROR: Upload failed - '{filename}' changed while uploading."
+                if hasher is not None:
+                    send_frame(self.client_socket, hasher.hexdigest().encode(FORMAT))
+
+                # An empty unverified upload sends nothing, so the result can arrive in the same recv as OK
+                msg = response[2:] or self.client_socket.recv(SIZE).decode(FORMAT)
                 self._log(msg)
+                if not msg:
+                    raise ConnectionError("Connection closed before the upload was confirmed.")
+                if msg.startswith("ERROR"):
+                    return msg
 
                 self.analyzer.stop_record_time(start_time, bytes_transferred, operation="CLIENT_UPLOAD")
+                if meter is not None:
+                    meter.finish()
                 return f"SUCCESS: {msg}"
 
             return f"ERROR: Unexpected server response during upload: {response}"
 
+        except TransferCancelled:
+            # The server discards the partial upload when the connection drops mid-data
+            self._log(f"Upload of '{filepath}' cancelled.")
+            self._abandon_connection()
+            return f"CANCELLED: Upload of '{os.path.basename(filepath)}' cancelled."
         except FileNotFoundError:
             return f"ERROR: File '{filepath}' not found."
         except Exception as e:
             self._log(f"Error uploading file: {e}")
             return f"ERROR: Upload failed - {e}"
 
-    def receive_file(self, filename):
-        """Download file from server. Returns status message."""
+    def receive_file(self, filename, save_dir=None, verify=True, progress=None, cancel_event=None):
+        """Download file from server into save_dir (default: cwd). Returns status message.
+
+        With verify=True the data is hashed as it arrives and compared with the
+        server's digest trailer; a mismatched download is deleted and retried.
+        progress and cancel_event work as in send_file().
+        """
+        for attempt in range(INTEGRITY_RETRIES + 1):
+            result = self._receive_file_once(filename, save_dir, verify, progress, cancel_event)
+            if not result.startswith("ERROR: Integrity check failed") or attempt == INTEGRITY_RETRIES:
+                return result
+            self._log(f"{result} Retrying download...")
+
+    def _receive_file_once(self, filename, save_dir, verify, progress=None, cancel_event=None):
         if not self.is_authenticated:
             return "ERROR: Not authenticated."
 
         self.client_socket.send("DOWNLOAD".encode(FORMAT))
-        self.client_socket.recv(SIZE)  # Wait for server READY signal
+        ready = self.client_socket.recv(SIZE).decode(FORMAT)  # Wait for server READY signal
+        algorithm = self._offered_algorithm(ready) if verify else None
 
         try:
             start_time = self.analyzer.start_record_time()
@@ -214,31 +478,377 @@ class FileClient:
                 return response
 
             filesize = int(response)
-            self.client_socket.send("READY".encode(FORMAT))
+            # READY@algorithm asks the server for a digest trailer after the data
+            self.client_socket.send((f"READY@{algorithm}" if algorithm else "READY").encode(FORMAT))
 
             # Use filedialog.asksaveasfilename in the GUI, but here we use a simple path
-            save_path = os.path.join(os.getcwd(), filename)
+            save_dir = save_dir or os.getcwd()
+            save_path = os.path.join(save_dir, filename)
 
-            bytes_transferred = 0
+            hasher = new_hasher(algorithm) if algorithm else None
+            meter = None
+            if progress is not None or cancel_event is not None:
+                meter = ProgressMeter(filename, "download", filesize, progress, cancel_event)
             with open(save_path, "wb") as f:
-                received = 0
-                while received < filesize:
-                    data = self.client_socket.recv(SIZE)
-                    if not data:
-                        break
-                    f.write(data)
-                    received += len(data)
-                    bytes_transferred += len(data)
+                bytes_transferred = recv_into_file(self.client_socket, f, filesize, CHUNK_SIZE, hasher, meter)
+
+            if hasher is not None:
+                expected = recv_frame(self.client_socket).decode(FORMAT)
+                if expected != hasher.hexdigest():
+                    os.remove(save_path)
+                    self._log(f"Integrity check failed for '{filename}'.")
+                    return f"ERROR: Integrity check failed for '{filename}'."
 
             self._log(f"File '{filename}' downloaded successfully to {save_path}.")
 
             self.analyzer.stop_record_time(start_time, bytes_transferred, operation="CLIENT_DOWNLOAD")
-            return f"SUCCESS: File '{filename}' downloaded successfully to {os.getcwd()}."
+            if meter is not None:
+                meter.finish()
+            return f"SUCCESS: File '{filename}' downloaded successfully to {save_dir}."
 
+        except TransferCancelled:
+            # The rest of the file is still in flight, so this connection can't be reused
+            self.disconnect()
+            try:
+                os.remove(save_path)
+            except OSError:
+                pass
+            self._log(f"Download of '{filename}' cancelled.")
+            return f"CANCELLED: Download of '{filename}' cancelled."
         except Exception as e:
             self._log(f"Error downloading file: {e}")
             return f"ERROR: Download failed - {e}"
 
+    def open_remote(self, filename, verify=True):
+        """Open a server file as a readable binary stream (a RemoteFile; use it as a context manager).
+
+        Raises FileNotFoundError if the server has no such file and ConnectionError if not logged in.
+        """
+        if not self.is_authenticated:
+            raise ConnectionError("Not authenticated.")
+
+        self.client_socket.send("DOWNLOAD".encode(FORMAT))
+        ready = self.client_socket.recv(SIZE).decode(FORMAT)
+        algorithm = self._offered_algorithm(ready) if verify else None
+        self.client_socket.send(filename.encode(FORMAT))
+
+        response = self.client_socket.recv(SIZE).decode(FORMAT)
+        if response.startswith("ERROR"):
+            self._log(response)
+            raise FileNotFoundError(response.split(":", 1)[1].strip())
+
+        self.client_socket.send((f"READY@{algorithm}" if algorithm else "READY").encode(FORMAT))
+        return RemoteFile(self, filename, int(response), algorithm)
+
+    def send_stream(self, source, filename, overwrite="no", verify=True):
+        """Upload data of unknown length under filename. Returns status message.
+
+        source is a readable binary file object (a pipe, a compressor's output),
+        a bytes-like object or an iterable of bytes-like chunks such as a
+        generator. The data is sent as ChunkedWriter frames, so nothing is
+        buffered to disk first. A source can only be read once, so unlike
+        send_file() an integrity failure is not retried.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        self.client_socket.send("STREAM_UPLOAD".encode(FORMAT))
+        ready = self.client_socket.recv(SIZE).decode(FORMAT)
+        if ready.startswith("ERROR"):
+            self._log(ready)
+            self.disconnect()
+            return ready
+        algorithm = self._offered_algorithm(ready) if verify else None
+
+        start_time = self.analyzer.start_record_time()
+        self.client_socket.send((f"{filename}@{algorithm}" if algorithm else filename).encode(FORMAT))
+        response = self.client_socket.recv(SIZE).decode(FORMAT)
+        if response == "EXISTS":
+            self.client_socket.send(overwrite.encode(FORMAT))
+            if overwrite.lower() != "yes":
+                self._log("Upload cancelled by user (file exists).")
+                return "CANCELLED: File already exists on server."
+            response = self.client_socket.recv(SIZE).decode(FORMAT)
+        if not response.startswith("OK"):
+            return response if response.startswith("ERROR") else \
+                f"ERROR: Unexpected server response during upload: {response}"
+
+        hasher = new_hasher(algorithm) if algorithm else None
+        writer = ChunkedWriter(self.client_socket, CHUNK_SIZE)
+        try:
+            for chunk in _iter_source(source):
+                if hasher is not None:
+                    hasher.update(chunk)
+                writer.write(chunk)
+            writer.close()
+        except Exception as e:
+            # The server would store whatever arrived; dropping the connection makes it discard the upload
+            self._log(f"Error streaming '{filename}': {e}")
+            self.is_authenticated = False
+            self.disconnect()
+            return f"ERROR: Upload failed - {e}"
+        if hasher is not None:
+            send_frame(self.client_socket, hasher.hexdigest().encode(FORMAT))
+
+        msg = self.client_socket.recv(SIZE).decode(FORMAT)
+        self._log(msg)
+        if not msg:
+            self.disconnect()
+            return "ERROR: Upload failed - connection closed before the upload was confirmed."
+        if msg.startswith("ERROR"):
+            return msg
+        self.analyzer.stop_record_time(start_time, writer.bytes_written, operation="CLIENT_UPLOAD")
+        return f"SUCCESS: {msg}"
+
+    @staticmethod
+    def _integrity_failures(results):
+        return [result for result in results if result.get("message") == INTEGRITY_FAILED]
+
+    def send_files(self, filepaths, overwrite="no", verify=True):
+        """Upload many files in one BATCH_UPLOAD exchange. Returns a list of per-file result dicts.
+
+        Files the server rejects for a digest mismatch are sent again in a follow-up batch.
+        """
+        results = self._send_files_once(filepaths, overwrite, verify)
+        for _ in range(INTEGRITY_RETRIES):
+            failed = {result["name"] for result in self._integrity_failures(results)}
+            if not failed or not self.is_authenticated:
+                break
+            self._log(f"Retrying {len(failed)} file(s) that failed the integrity check...")
+            retry = self._send_files_once([p for p in filepaths if os.path.basename(p) in failed], overwrite, verify)
+            results = [result for result in results if result.get("name") not in failed] + retry
+        return results
+
+    def _send_files_once(self, filepaths, overwrite, verify):
+        if not self.is_authenticated:
+            return [{"name": os.path.basename(p), "status": "ERROR", "message": "Not authenticated."}
+                    for p in filepaths]
+
+        entries, results, readable = [], [], []
+        for filepath in filepaths:
+            try:
+                entries.append({"name": os.path.basename(filepath), "size": os.path.getsize(filepath)})
+                readable.append(filepath)
+            except OSError as e:
+                results.append({"name": os.path.basename(filepath), "status": "ERROR", "message": str(e)})
+        if not entries:
+            return results
+
+        start_time = self.analyzer.start_record_time()
+        try:
+            self.client_socket.send("BATCH_UPLOAD".encode(FORMAT))
+            ready = self.client_socket.recv(SIZE).decode(FORMAT)  # Wait for server READY signal
+            if ready.startswith("ERROR"):
+                raise ConnectionError(ready)
+            algorithm = self._offered_algorithm(ready) if verify else None
+            manifest = {"files": entries, "overwrite": overwrite}
+            if algorithm:
+                manifest["algorithm"] = algorithm
+            send_json(self.client_socket, manifest)
+
+            # Stream every file back to back with no per-file round trip; each is followed by a trailer
+            # frame holding its digest (empty when not verifying)
+            bytes_transferred = 0
+            for filepath, entry in zip(readable, entries):
+                hasher = new_hasher(algorithm) if algorithm else None
+                with open(filepath, "rb") as f:
+                    sent = send_from_file(self.client_socket, f, entry["size"], CHUNK_SIZE, hasher)
+                if sent < entry["size"]:
+                    # File shrank after the manifest was sent: pad to keep the stream in sync and abort
+                    # the entry, so the server discards it and reports the error as this file's result
+                    self.client_socket.sendall(bytes(entry["size"] - sent))
+                    trailer = "ERROR: File changed while uploading."
+                else:
+                    trailer = hasher.hexdigest() if hasher is not None else ""
+                send_frame(self.client_socket, trailer.encode(FORMAT))
+                bytes_transferred += entry["size"]
+
+            reply = recv_json(self.client_socket)
+            self.analyzer.stop_record_time(start_time, bytes_transferred, operation="CLIENT_BATCH_UPLOAD")
+            if reply.get("error"):
+                self._log(f"ERROR: {reply['error']}")
+            results.extend(reply.get("results", []))
+            ok = sum(1 for result in results if result.get("status") == "OK")
+            self._log(f"Batch upload finished: {ok}/{len(filepaths)} files uploaded.")
+            return results
+        except Exception as e:
+            self._log(f"Error during batch upload: {e}")
+            self.disconnect()  # The stream position is unknown, so this connection can't be reused
+            return results + [{"name": entry["name"], "status": "ERROR", "message": f"Batch upload failed - {e}"}
+                              for entry in entries]
+
+    def receive_files(self, filenames, save_dir=None, verify=True):
+        """Download many files in one BATCH_DOWNLOAD exchange. Returns a list of per-file result dicts.
+
+        Files whose digest trailer doesn't match are deleted and fetched again in a follow-up batch.
+        """
+        results = self._receive_files_once(filenames, save_dir, verify)
+        for _ in range(INTEGRITY_RETRIES):
+            failed = {result["name"] for result in self._integrity_failures(results)}
+            if not failed or not self.is_authenticated:
+                break
+            self._log(f"Retrying {len(failed)} file(s) that failed the integrity check...")
+            retry = self._receive_files_once([name for name in filenames if name in failed], save_dir, verify)
+            results = [result for result in results if result.get("name") not in failed] + retry
+        return results
+
+    def _receive_files_once(self, filenames, save_dir, verify):
+        if not self.is_authenticated:
+            return [{"name": name, "status": "ERROR", "message": "Not authenticated."} for name in filenames]
+
+        save_dir = save_dir or os.getcwd()
+        results = []
+        start_time = self.analyzer.start_record_time()
+        try:
+            self.client_socket.send("BATCH_DOWNLOAD".encode(FORMAT))
+            self.client_socket.recv(SIZE)  # Wait for server READY signal
+            request = {"files": list(filenames)}
+            if verify:
+                request["algorithms"] = supported_algorithms()
+            send_json(self.client_socket, request)
+
+            bytes_transferred = 0
+            while True:
+                header = recv_json(self.client_socket)
+                if header.get("end"):
+                    if header.get("error"):
+                        self._log(f"ERROR: {header['error']}")
+                    break
+                if header["status"] != "OK":
+                    results.append(header)
+                    continue
+
+                save_path = os.path.join(save_dir, header["name"])
+                hasher = new_hasher(header["algorithm"]) if header.get("algorithm") else None
+                with open(save_path, "wb") as f:
+                    recv_into_file(self.client_socket, f, header["size"], CHUNK_SIZE, hasher)
+                bytes_transferred += header["size"]
+                if hasher is not None and recv_frame(self.client_socket).decode(FORMAT) != hasher.hexdigest():
+                    os.remove(save_path)
+                    results.append({"name": header["name"], "status": "ERROR", "message": INTEGRITY_FAILED})
+                    continue
+                results.append({"name": header["name"], "status": "OK", "size": header["size"], "path": save_path})
+
+            self.analyzer.stop_record_time(start_time, bytes_transferred, operation="CLIENT_BATCH_DOWNLOAD")
+            ok = sum(1 for result in results if result["status"] == "OK")
+            self._log(f"Batch download finished: {ok}/{len(filenames)} files saved to {save_dir}.")
+            return results
+        except Exception as e:
+            self._log(f"Error during batch download: {e}")
+            self.disconnect()  # The stream position is unknown, so this connection can't be reused
+            done = {result["name"] for result in results}
+            return results + [{"name": name, "status": "ERROR", "message": f"Batch download failed - {e}"}
+                              for name in filenames if name not in done]
+
+    @staticmethod
+    def _until_cancelled(rel_paths, cancel_event):
+        for rel_path in rel_paths:
+            if cancel_event is not None and cancel_event.is_set():
+                raise TransferCancelled()
+            yield rel_path
+
+    def upload_tree(self, local_dir, remote_dir="", compression="none", resume=True, cancel_event=None,
+                    rel_paths=None):
+        """Upload a local directory tree as one tar stream. Returns status message.
+
+        With resume=True an interrupted upload into the same remote folder continues
+        after the last file the server completed. rel_paths ('/'-separated, relative
+        to local_dir) sends just those files, without resume tracking.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+        if not os.path.isdir(local_dir):
+            return f"ERROR: '{local_dir}' is not a directory."
+
+        start_time = self.analyzer.start_record_time()
+        try:
+            self.client_socket.send("TREE_UPLOAD".encode(FORMAT))
+            self.client_socket.recv(SIZE)  # Wait for server READY signal
+            partial = rel_paths is not None
+            send_json(self.client_socket, {"path": remote_dir, "compression": compression,
+                                           "resume": resume and not partial, "resume_marker": not partial})
+            reply = recv_json(self.client_socket)
+            if reply["status"] != "OK":
+                return f"ERROR: {reply['message']}"
+
+            if reply.get("resume_after"):
+                self._log(f"Resuming tree upload after '{reply['resume_after']}'.")
+            if not partial:
+                rel_paths = tree.skip_past(local_dir, tree.iter_tree(local_dir), reply.get("resume_after"))
+            writer = ChunkedWriter(self.client_socket)
+            tree.write_tree(writer, local_dir, self._until_cancelled(rel_paths, cancel_event), compression)
+            writer.close()
+
+            reply = recv_json(self.client_socket)
+            if reply["status"] != "OK":
+                return f"ERROR: {reply['message']}"
+            self.analyzer.stop_record_time(start_time, writer.bytes_written, operation="CLIENT_TREE_UPLOAD")
+            msg = f"Uploaded {reply['files']} files ({reply['bytes']} bytes) from '{local_dir}'."
+            self._log(msg)
+            return f"SUCCESS: {msg}"
+        except TransferCancelled:
+            # Closing mid-stream leaves the server's resume marker at the last completed file
+            self._log("Tree upload cancelled; it can be resumed later.")
+            self.disconnect()
+            return "CANCELLED: Tree upload cancelled."
+        except Exception as e:
+            self._log(f"Error uploading tree: {e}")
+            self.disconnect()  # The stream position is unknown, so this connection can't be reused
+            return f"ERROR: Tree upload failed - {e}"
+
+    def download_tree(self, remote_dir, local_dir, compression="none", resume=True, cancel_event=None,
+                      rel_paths=None):
+        """Download a remote folder ("" for everything) into local_dir as one tar stream. Returns status message.
+
+        rel_paths (relative to remote_dir) fetches just those files, without resume tracking.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        os.makedirs(local_dir, exist_ok=True)
+        partial = rel_paths is not None
+        resume_after = tree.read_marker(local_dir) if resume and not partial else None
+
+        def file_done(rel_path):
+            if not partial:
+                tree.write_marker(local_dir, rel_path)
+            if cancel_event is not None and cancel_event.is_set():
+                raise TransferCancelled()
+
+        start_time = self.analyzer.start_record_time()
+        try:
+            self.client_socket.send("TREE_DOWNLOAD".encode(FORMAT))
+            self.client_socket.recv(SIZE)  # Wait for server READY signal
+            request = {"path": remote_dir, "compression": compression, "resume_after": resume_after}
+            if partial:
+                request["paths"] = list(rel_paths)
+            send_json(self.client_socket, request)
+            reply = recv_json(self.client_socket)
+            if reply["status"] != "OK":
+                return f"ERROR: {reply['message']}"
+
+            if resume_after:
+                self._log(f"Resuming tree download after '{resume_after}'.")
+            reader = ChunkedReader(self.client_socket)
+            tree.extract_tree(reader, local_dir, compression, on_file=file_done)
+            reader.drain()
+            summary = recv_json(self.client_socket)
+
+            if not partial:
+                tree.clear_marker(local_dir)
+            self.analyzer.stop_record_time(start_time, reader.bytes_read, operation="CLIENT_TREE_DOWNLOAD")
+            msg = f"Downloaded {summary['files']} files ({summary['bytes']} bytes) into '{local_dir}'."
+            self._log(msg)
+            return f"SUCCESS: {msg}"
+        except TransferCancelled:
+            self._log("Tree download cancelled; it can be resumed later.")
+            self.disconnect()
+            return "CANCELLED: Tree download cancelled."
+        except Exception as e:
+            self._log(f"Error downloading tree: {e}")
+            self.disconnect()  # The stream position is unknown, so this connection can't be reused
+            return f"ERROR: Tree download failed - {e}"
+
     def handle_delete(self, filename):
         """Handle delete command. Returns server response."""
         if not self.is_authenticated:
@@ -258,7 +868,7 @@ class FileClient:
 
         start_time = self.analyzer.start_record_time()
         self.client_socket.send("DIR".encode(FORMAT))
-        response = self.client_socket.recv(SIZE).decode(FORMAT)
+        response = recv_frame(self.client_socket).decode(FORMAT)
         self._log("\n--- Server Directory Listing ---")
         self._log(response)
 
@@ -275,4 +885,165 @@ class FileClient:
         response = self.client_socket.recv(SIZE).decode(FORMAT)
         self._log(response)
         self.analyzer.stop_record_time(start_time, 0, operation="CLIENT_SUBFOLDER")
-        return response
\ No newline at end of file
+        return response
+
+    def query_catalog(self, owner=None, original_name=None, since=None, until=None, limit=None):
+        """Look up file metadata on the server (original_name may use '*'; since/until are epoch seconds).
+
+        Returns a list of entry dicts, or an ERROR string.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        start_time = self.analyzer.start_record_time()
+        self.client_socket.send("CATALOG".encode(FORMAT))
+        self.client_socket.recv(SIZE)  # Wait for server READY signal
+        send_json(self.client_socket, {"owner": owner, "original_name": original_name,
+                                       "since": since, "until": until, "limit": limit})
+        reply = recv_json(self.client_socket)
+        self.analyzer.stop_record_time(start_time, 0, operation="CLIENT_CATALOG")
+        if reply.get("error"):
+            self._log(f"ERROR: {reply['error']}")
+            return f"ERROR: {reply['error']}"
+        return reply["files"]
+
+    def search(self, query, content=False, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """Search file names (and text file content when content=True) on the server.
+
+        Returns one ranked page as {"results": [...], "total": n, "next_offset": ...}; pass
+        next_offset back to get the following page (None once there are no more). ERROR string on failure.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        start_time = self.analyzer.start_record_time()
+        self.client_socket.send("SEARCH".encode(FORMAT))
+        self.client_socket.recv(SIZE)  # Wait for server READY signal
+        send_json(self.client_socket, {"query": query, "content": content, "offset": offset, "limit": limit})
+        reply = recv_json(self.client_socket)
+        self.analyzer.stop_record_time(start_time, 0, operation="CLIENT_SEARCH")
+        if reply.get("error"):
+            self._log(f"ERROR: {reply['error']}")
+            return f"ERROR: {reply['error']}"
+        return reply
+
+    # --- Cluster ---
+
+    def get_ring(self):
+        """The connected node's cluster ring ({nodes, vnodes, version, self}), or an ERROR string."""
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        self.client_socket.send("RING".encode(FORMAT))
+        reply = recv_json(self.client_socket)
+        return f"ERROR: {reply['error']}" if reply.get("error") else reply
+
+    def set_ring(self, nodes, version):
+        """Admin: make the connected node adopt a new ring version. Returns the node's ring or an ERROR string."""
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        self.client_socket.send("RING_SET".encode(FORMAT))
+        self.client_socket.recv(SIZE)  # Wait for server READY signal
+        send_json(self.client_socket, {"nodes": list(nodes), "version": version})
+        reply = recv_json(self.client_socket)
+        return f"ERROR: {reply['error']}" if reply.get("error") else reply
+
+    def list_files(self):
+        """The server's files and folders as {"files": {name: size}, "folders": [...]}, or an ERROR string."""
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        self.client_socket.send("LIST".encode(FORMAT))
+        reply = recv_json(self.client_socket)
+        return f"ERROR: {reply['error']}" if reply.get("error") else reply
+
+    def get_manifest(self, remote_dir="", expect=None, paths=None, digests=None, algorithm=None):
+        """{name: (size, mtime_ns)} of a server folder for sync. Returns a dict or an ERROR string.
+
+        The reply is {"token", "count", "unchanged", "files", "digests"}; when expect equals the
+        folder's current token, "unchanged" is True and "files" is empty.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        request = {"path": remote_dir, "expect": expect, "paths": paths, "digests": digests, "algorithm": algorithm}
+        self.client_socket.send("MANIFEST".encode(FORMAT))
+        self.client_socket.recv(SIZE)  # Wait for server READY signal
+        send_json(self.client_socket, request)
+        reply = recv_json(self.client_socket)
+        if reply["status"] != "OK":
+            return f"ERROR: {reply['message']}"
+        body = json.loads(zlib.decompress(recv_frame(self.client_socket)).decode(FORMAT))
+        reply["files"] = {name: tuple(signature) for name, signature in body["files"].items()}
+        reply["digests"] = body["digests"]
+        return reply
+
+    def cluster_put(self, filepath, name, original_name=None, owner=None):
+        """Admin: store a file on the connected node under an existing logical name (cluster hand-over).
+
+        Returns "OK", "EXISTS: ..." or an ERROR string.
+        """
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            return f"ERROR: File '{filepath}' not found."
+
+        self.client_socket.send("CLUSTER_PUT".encode(FORMAT))
+        algorithm = self._offered_algorithm(self.client_socket.recv(SIZE).decode(FORMAT))
+        send_json(self.client_socket, {"name": name, "size": size, "original_name": original_name,
+                                       "owner": owner, "algorithm": algorithm})
+        reply = recv_json(self.client_socket)
+        if reply["status"] != "OK":
+            return f"{reply['status']}: {reply.get('message', '')}"
+
+        hasher = new_hasher(algorithm) if algorithm else None
+        with open(filepath, "rb") as f:
+            sent = send_from_file(self.client_socket, f, size, CHUNK_SIZE, hasher)
+        if sent < size:
+            # File shrank while sending: drop the connection so the node discards the short file, as upload does
+            self._abandon_connection()
+            return f"ERROR: '{name}' changed while it was sent."
+        if hasher is not None:
+            send_frame(self.client_socket, hasher.hexdigest().encode(FORMAT))
+        reply = recv_json(self.client_socket)
+        return "OK" if reply["status"] == "OK" else f"ERROR: {reply.get('message', '')}"
+
+    # --- Replication ---
+
+    def open_replication_stream(self, since):
+        """Admin: turn this connection into a stream of the primary's changes after seq `since`.
+
+        Returns a ReplicationStream; the connection can't be used for anything else afterwards.
+        """
+        if not self.is_authenticated:
+            raise ConnectionError("Not authenticated.")
+
+        self.client_socket.send("REPLICATE".encode(FORMAT))
+        algorithm = self._offered_algorithm(self.client_socket.recv(SIZE).decode(FORMAT))
+        send_json(self.client_socket, {"since": since, "algorithm": algorithm})
+        reply = recv_json(self.client_socket)
+        if reply.get("error"):
+            raise ConnectionError(reply["error"])
+        return ReplicationStream(self.client_socket, algorithm, reply["head"])
+
+    def replication_status(self):
+        """The server's replication role and lag, or an ERROR string."""
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        self.client_socket.send("REPL_STATUS".encode(FORMAT))
+        return recv_json(self.client_socket)
+
+    def handle_profile(self, action):
+        """Admin-only profiling control (START, STOP, STATS, SPANS_ON, SPANS_OFF, RESET). Returns server response."""
+        if not self.is_authenticated:
+            return "ERROR: Not authenticated."
+
+        self.client_socket.send(f"PROFILE@{action}".encode(FORMAT))
+        response = recv_frame(self.client_socket).decode(FORMAT)
+        self._log(response)
+        return response
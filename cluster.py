@@ -0,0 +1,358 @@
+import argparse
+import bisect
+import hashlib
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pool import ConnectionPool
+from search import DEFAULT_PAGE_SIZE
+from tree import format_listing
+
+# --- CONSTANTS ---
+DEFAULT_VNODES = 128  # Points per node on the ring; more points spread ownership more evenly
+MOVED_PREFIX = "MOVED@"  # In an ERROR reply: the name belongs to another node (followed by its address)
+CLUSTER_POOL_SIZE = 2  # Pooled connections per node in ClusterClient
+NAME_TAG_LENGTH = 6  # Hex digits of the minting node's id in cluster logical names (TS042-1f3a9c.txt)
+
+
+def node_id(host, port):
+    return f"{host}:{port}"
+
+
+def parse_node(node):
+    """'host:port' -> (host, port)"""
+    host, _, port = node.rpartition(":")
+    return host, int(port)
+
+
+def placement_key(name):
+    """What a name is placed by on the ring: its top-level folder, so a folder tree stays on one node"""
+    return name.strip("/").split("/", 1)[0]
+
+
+def _point(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping logical names to nodes ('host:port').
+
+    Each node is placed at `vnodes` points; a name belongs to the first node
+    point clockwise from the hash of its placement_key(). Adding or removing one
+    of N nodes only changes the owner of about 1/N of the names.
+    """
+
+    def __init__(self, nodes=(), vnodes=DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self.nodes = sorted(set(nodes))
+        points = sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, name):
+        if not self._hashes:
+            raise LookupError("The hash ring has no nodes.")
+        index = bisect.bisect(self._hashes, _point(placement_key(name))) % len(self._hashes)
+        return self._owners[index]
+
+
+class ClusterMembership:
+    """A server node's view of the cluster: its own address, the ring and its version.
+
+    Passed as FileServer(cluster=...). peer_username/peer_password are the
+    (admin) credentials this node uses to hand files to their new owners when
+    the ring changes. Logical names minted here carry name_tag, so they stay
+    unique across nodes even after ownership moves with a new ring.
+    """
+
+    def __init__(self, self_node, nodes, vnodes=DEFAULT_VNODES, peer_username="admin", peer_password=None):
+        self.self_node = self_node
+        self.ring = HashRing(nodes, vnodes)
+        self.version = 0
+        self.peer_username = peer_username
+        self.peer_password = peer_password
+        self.name_tag = hashlib.md5(self_node.encode("utf-8")).hexdigest()[:NAME_TAG_LENGTH]
+        self.conflicts = {}  # name -> why a hand-over to its new owner was refused
+        self._lock = threading.Lock()
+
+    def owner(self, name):
+        return self.ring.owner(name)
+
+    def owns(self, name):
+        return self.ring.owner(name) == self.self_node
+
+    @property
+    def is_member(self):
+        return self.self_node in self.ring.nodes
+
+    def update(self, nodes, version):
+        """Adopt a newer ring. Returns False if version is not newer than the current one."""
+        with self._lock:
+            if version <= self.version:
+                return False
+            self.ring = HashRing(nodes, self.ring.vnodes)
+            self.version = version
+            return True
+
+    def describe(self):
+        return {"nodes": self.ring.nodes, "vnodes": self.ring.vnodes, "version": self.version,
+                "self": self.self_node, "conflicts": dict(self.conflicts)}
+
+
+def _is_moved(result):
+    return isinstance(result, str) and MOVED_PREFIX in result
+
+
+class ClusterClient:
+    """FileClient operations routed across a cluster by consistent hashing.
+
+    The ring is fetched from any reachable seed node with RING. Uploads go to the
+    owner of the original file name (which mints a logical name it owns itself),
+    and downloads and deletes go to the owner of the logical name. A MOVED reply
+    refreshes the ring and retries once. DIR, CATALOG and SEARCH fan out to every
+    node and merge the results. Each node gets its own ConnectionPool.
+    """
+
+    def __init__(self, seeds, username, password, pool_size=CLUSTER_POOL_SIZE, log_callback=None, stats_file=None,
+                 ssl_context=None):
+        self.seeds = list(seeds)
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+        self.log_callback = log_callback
+        self.stats_file = stats_file
+        self.ssl_context = ssl_context
+        self.ring = None
+        self.version = -1
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.refresh_ring()
+
+    def _log(self, message):
+        timestamp = time.strftime("[%Y-%m-%d %H:%M:%S] [CLUSTER]")
+        full_message = f"{timestamp} {message}"
+        if self.log_callback:
+            self.log_callback(full_message)
+        else:
+            print(full_message)
+
+    def _pool(self, node):
+        with self._lock:
+            pool = self._pools.get(node)
+            if pool is None:
+                host, port = parse_node(node)
+                pool = self._pools[node] = ConnectionPool(host, port, self.username, self.password,
+                                                          size=self.pool_size, log_callback=self.log_callback,
+                                                          stats_file=self.stats_file, ssl_context=self.ssl_context)
+            return pool
+
+    def _call(self, node, operation, *args, **kwargs):
+        try:
+            return self._pool(node).call(operation, *args, **kwargs)
+        except (OSError, ConnectionError) as e:
+            return f"ERROR: {operation} on {node} failed - {e}"
+
+    def refresh_ring(self):
+        """Fetch the current ring from the first node that answers (known nodes first, then seeds)."""
+        candidates = list(dict.fromkeys((self.ring.nodes if self.ring else []) + self.seeds))
+        for node in candidates:
+            ring = self._call(node, "get_ring")
+            if isinstance(ring, dict) and ring["version"] >= self.version:
+                self.ring = HashRing(ring["nodes"], ring["vnodes"])
+                self.version = ring["version"]
+                self._log(f"Ring v{self.version}: {', '.join(self.ring.nodes)}")
+                return self.ring
+        raise ConnectionError("No cluster node answered RING.")
+
+    def _routed(self, key, operation, *args, **kwargs):
+        """Run an operation on the owner of key, following one MOVED reply."""
+        result = self._call(self.ring.owner(key), operation, *args, **kwargs)
+        if _is_moved(result):
+            self.refresh_ring()
+            result = self._call(self.ring.owner(key), operation, *args, **kwargs)
+        return result
+
+    def _by_owner(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.ring.owner(key), []).append(key)
+        return groups
+
+    def _fan_out(self, operation, *args, nodes=None, **kwargs):
+        """{node: result} of running an operation on every node (or the given nodes) in parallel."""
+        nodes = nodes or self.ring.nodes
+        with ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+            futures = {node: executor.submit(self._call, node, operation, *args, **kwargs) for node in nodes}
+        return {node: future.result() for node, future in futures.items()}
+
+    # --- Routed operations ---
+
+    def send_file(self, filepath, overwrite="no", verify=True, progress=None, cancel_event=None):
+        return self._routed(os.path.basename(filepath), "send_file", filepath, overwrite, verify, progress,
+                            cancel_event)
+
+    def send_stream(self, source, filename, overwrite="no", verify=True):
+        return self._routed(filename, "send_stream", source, filename, overwrite, verify)
+
+    def receive_file(self, filename, save_dir=None, verify=True, progress=None, cancel_event=None):
+        return self._routed(filename, "receive_file", filename, save_dir, verify, progress, cancel_event)
+
+    def handle_delete(self, filename):
+        return self._routed(filename, "handle_delete", filename)
+
+    def send_files(self, filepaths, overwrite="no", verify=True):
+        """Batch upload split by owner; returns the per-file results of every node's batch."""
+        by_name = {}
+        for filepath in filepaths:
+            by_name.setdefault(os.path.basename(filepath), []).append(filepath)
+        results = []
+        for node, names in self._by_owner(by_name).items():
+            paths = [path for name in names for path in by_name[name]]
+            reply = self._call(node, "send_files", paths, overwrite, verify)
+            if isinstance(reply, str):
+                results.extend({"name": os.path.basename(path), "status": "ERROR", "message": reply}
+                               for path in paths)
+            else:
+                results.extend(reply)
+        return results
+
+    def upload_tree(self, local_dir, remote_dir, compression="none", resume=True, cancel_event=None,
+                    rel_paths=None):
+        """Upload a tree to the node owning its top-level folder (a tree is never split across nodes)."""
+        if not placement_key(remote_dir):
+            return "ERROR: Cluster tree uploads need a remote folder (a top-level folder lives on one node)."
+        return self._routed(remote_dir, "upload_tree", local_dir, remote_dir, compression, resume, cancel_event,
+                            rel_paths)
+
+    def download_tree(self, remote_dir, local_dir, compression="none", resume=True, cancel_event=None,
+                      rel_paths=None):
+        if not placement_key(remote_dir):
+            return "ERROR: Cluster tree downloads need a remote folder (a top-level folder lives on one node)."
+        return self._routed(remote_dir, "download_tree", remote_dir, local_dir, compression, resume, cancel_event,
+                            rel_paths)
+
+    def receive_files(self, filenames, save_dir=None, verify=True):
+        results = []
+        for node, names in self._by_owner(filenames).items():
+            reply = self._call(node, "receive_files", names, save_dir, verify)
+            if isinstance(reply, str):
+                results.extend({"name": name, "status": "ERROR", "message": reply} for name in names)
+            else:
+                results.extend(reply)
+        return results
+
+    # --- Fan-out operations ---
+
+    def list_files(self):
+        """({name: size}, folders) merged from every node."""
+        files, folders = {}, set()
+        for node, listing in self._fan_out("list_files").items():
+            if isinstance(listing, str):
+                raise ConnectionError(f"{node}: {listing}")
+            files.update(listing["files"])
+            folders.update(listing["folders"])
+        return files, folders
+
+    def handle_dir(self):
+        try:
+            files, folders = self.list_files()
+        except ConnectionError as e:
+            return f"ERROR: Could not list directory - {e}"
+        return format_listing(files, folders, f"cluster: {len(self.ring.nodes)} nodes")
+
+    def handle_subfolder(self, action, path):
+        """Create or delete a folder on every node (a folder may hold files owned by any of them)."""
+        replies = self._fan_out("handle_subfolder", action, path)
+        errors = [f"{node}: {reply}" for node, reply in replies.items() if reply.startswith("ERROR")]
+        if errors and len(errors) == len(replies):
+            return errors[0].split(": ", 1)[1]
+        return "; ".join(errors) if errors else next(iter(replies.values()))
+
+    def query_catalog(self, owner=None, original_name=None, since=None, until=None, limit=None):
+        entries = []
+        for node, reply in self._fan_out("query_catalog", owner, original_name, since, until, limit).items():
+            if isinstance(reply, str):
+                return f"{reply} ({node})"
+            entries.extend(reply)
+        entries.sort(key=lambda entry: entry["created_at"], reverse=True)
+        return entries[:limit] if limit else entries
+
+    def search(self, query, content=False, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """One merged page of ranked matches from every node."""
+        results, total = [], 0
+        for node, reply in self._fan_out("search", query, content, 0, offset + limit).items():
+            if isinstance(reply, str):
+                return f"{reply} ({node})"
+            results.extend(reply["results"])
+            total += reply["total"]
+        page = heapq.nsmallest(offset + limit, results, key=lambda result: (-result["score"], result["name"]))[offset:]
+        next_offset = offset + len(page) if offset + len(page) < total else None
+        return {"results": page, "total": total, "next_offset": next_offset}
+
+    # --- Membership ---
+
+    def conflicts(self):
+        """{node: {name: reason}} of files a node could not hand to their new owner and still holds.
+
+        Asks removed nodes this client has talked to as well, since they may still hold such files.
+        """
+        with self._lock:
+            nodes = sorted(set(self.ring.nodes) | set(self._pools))
+        conflicts = {}
+        for node, ring in self._fan_out("get_ring", nodes=nodes).items():
+            if isinstance(ring, dict) and ring.get("conflicts"):
+                conflicts[node] = ring["conflicts"]
+        return conflicts
+
+    def set_nodes(self, nodes):
+        """Change cluster membership (admin). Every old and new node adopts the new ring and moves files it no
+        longer owns to their new owner in the background."""
+        version = self.version + 1
+        replies = {}
+        for node in sorted(set(self.ring.nodes) | set(nodes)):
+            replies[node] = self._call(node, "set_ring", sorted(set(nodes)), version)
+        self.ring = HashRing(nodes, self.ring.vnodes)
+        self.version = version
+        self._log(f"Ring v{version} sent: {replies}")
+        return replies
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+def main():
+    """Run one cluster node: python cluster.py --node 127.0.0.1:5001 --nodes 127.0.0.1:5001,127.0.0.1:5002"""
+    from server import FileServer, SERVER_DATA_PATH
+
+    parser = argparse.ArgumentParser(description="Run one node of a file server cluster.")
+    parser.add_argument("--node", required=True, help="This node's host:port (as clients reach it)")
+    parser.add_argument("--nodes", required=True, help="Comma-separated host:port of every node, this one included")
+    parser.add_argument("--data", help=f"Data directory (default: {SERVER_DATA_PATH}_<port>)")
+    parser.add_argument("--vnodes", type=int, default=DEFAULT_VNODES)
+    parser.add_argument("--peer-user", default="admin", help="Admin user for moving files between nodes")
+    parser.add_argument("--peer-password", default=os.environ.get("FT_PEER_PASSWORD"),
+                        help="Its password (default: $FT_PEER_PASSWORD)")
+    args = parser.parse_args()
+
+    host, port = parse_node(args.node)
+    membership = ClusterMembership(args.node, args.nodes.split(","), args.vnodes, args.peer_user, args.peer_password)
+    server = FileServer(host, port, args.data or f"{SERVER_DATA_PATH}_{port}", cluster=membership,
+                        stats_file=None)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
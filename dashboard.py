@@ -0,0 +1,93 @@
+import time
+from collections import Counter, deque
+
+from protocol import stream_bytes
+
+# --- CONSTANTS ---
+SAMPLE_INTERVAL = 1.0  # Seconds between dashboard samples
+HISTORY_SAMPLES = 60  # Samples kept for the throughput and latency sparklines
+HOT_FILES = 10  # Rows in the hottest files table
+HOT_WINDOW_SAMPLES = 60  # Hottest files are ranked by downloads over this many samples
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values):
+    """Text sparkline of a sequence of numbers, scaled to its maximum."""
+    peak = max(values, default=0)
+    if not peak:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(value / peak * len(SPARK_CHARS)))] for value in values)
+
+
+class DashboardSampler:
+    """Turns a FileServer's counters into dashboard snapshots, one per sample() call.
+
+    Everything is read from counters the server already keeps up to date:
+    per-session byte counts and current operation (active_clients), operation
+    durations recorded by NetworkAnalysis and per-file download counts. A sample
+    copies the client list under clients_lock and takes the download counter,
+    so it never waits on a transfer. Call it at a fixed low rate (SAMPLE_INTERVAL)
+    from the GUI or a monitoring thread.
+    """
+
+    def __init__(self, server, history=HISTORY_SAMPLES):
+        self.server = server
+        self.throughput = deque(maxlen=history)  # Bytes/sec per sample
+        self.latency = deque(maxlen=history)  # Mean operation latency per sample (ms)
+        self._hits = deque(maxlen=HOT_WINDOW_SAMPLES)
+        self._hot_totals = Counter()
+        self._last_bytes = {}  # addr -> bytes at the previous sample
+        self._last_closed = server.closed_session_bytes
+        self._last_record = len(server.server_analyzer.stats_data)
+        self._last_time = time.monotonic()
+
+    def sample(self):
+        """A snapshot: clients, current throughput/latency, their histories and the hottest files."""
+        now = time.monotonic()
+        elapsed = max(now - self._last_time, 1e-6)
+        self._last_time = now
+        server = self.server
+
+        clients, moved, current = [], 0, {}
+        for addr, session in server.list_active_clients():
+            stream = session.get('stream')
+            total = session['bytes'] + (stream_bytes(stream) if stream is not None else 0)
+            delta = max(0, total - self._last_bytes.get(addr, 0))
+            current[addr] = total
+            moved += delta
+            clients.append({"user": session['username'], "address": f"{addr[0]}:{addr[1]}",
+                            "connected_for": time.time() - session['connected_since'],
+                            "operation": session.get('operation') or "idle", "rate": delta / elapsed})
+        # Sessions that ended since the last sample: count what they moved after it
+        counted = sum(count for addr, count in self._last_bytes.items() if addr not in current)
+        closed = server.closed_session_bytes
+        moved += max(0, closed - self._last_closed - counted)
+        self._last_closed = closed
+        self._last_bytes = current
+        rate = moved / elapsed
+        self.throughput.append(rate)
+
+        durations = self._new_durations()
+        latency_ms = sum(durations) / len(durations) * 1000 if durations else 0.0
+        self.latency.append(latency_ms)
+
+        hits = server.take_file_hits()
+        if len(self._hits) == self._hits.maxlen:
+            self._hot_totals.subtract(self._hits[0])  # Falls out of the window with this append
+        self._hits.append(hits)
+        self._hot_totals.update(hits)
+        self._hot_totals = +self._hot_totals  # Drops files with no downloads left in the window
+
+        return {"clients": sorted(clients, key=lambda client: -client["rate"]), "throughput": rate,
+                "latency_ms": latency_ms, "ops_per_sec": len(durations) / elapsed,
+                "throughput_history": list(self.throughput), "latency_history": list(self.latency),
+                "hot_files": self._hot_totals.most_common(HOT_FILES)}
+
+    def _new_durations(self):
+        """Durations of the operations NetworkAnalysis recorded since the last sample."""
+        records = self.server.server_analyzer.stats_data
+        if len(records) < self._last_record:  # The record list was replaced
+            self._last_record = 0
+        new = records[self._last_record:]
+        self._last_record += len(new)
+        return [record['Duration_s'] for record in new if record['Operation'].endswith("_RESP")]
@@ -0,0 +1,154 @@
+import os
+import threading
+import uuid
+
+from tree import INTERNAL_PREFIX, PART_PREFIX
+
+# --- CONSTANTS ---
+FSYNC_POLICIES = ("none", "file", "file+dir")
+DEFAULT_FSYNC_POLICY = "file"
+TEMP_PREFIX = INTERNAL_PREFIX + "upload_"  # In-progress uploads; hidden from DIR like other bookkeeping files
+
+
+def temp_path_for(final_path):
+    """Unique temp file beside final_path (same directory, so the final rename is atomic)."""
+    directory, name = os.path.split(final_path)
+    return os.path.join(directory, f"{TEMP_PREFIX}{uuid.uuid4().hex[:12]}_{name}")
+
+
+def remove_stale_temp_files(directory):
+    """Delete upload and tree-extraction temp files left by a crash anywhere under directory. Returns the number removed."""
+    removed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.startswith((TEMP_PREFIX, PART_PREFIX)):
+                try:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
+def fsync_file(path):
+    """Flush a closed file's data to disk."""
+    fd = os.open(path, os.O_RDWR)  # Windows refuses to fsync a read-only descriptor
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path):
+    """Make renames inside path durable (a no-op where directories can't be opened, e.g. Windows)."""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _CommitRequest:
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupCommitter:
+    """Publishes finished uploads by renaming temp files into place under an fsync policy.
+
+    "none" only renames, "file" fsyncs each file before its rename, and "file+dir"
+    also fsyncs the parent directory after the rename. Under "file" and "file+dir"
+    commits go through one committer thread that takes everything queued while the
+    previous group was syncing: the group's file fsyncs are issued back to back
+    (so the filesystem folds them into shared journal commits), then its renames,
+    then one fsync per directory, so N concurrent uploads share one flush round.
+    """
+
+    def __init__(self, policy=DEFAULT_FSYNC_POLICY):
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported fsync policy '{policy}' (expected one of {', '.join(FSYNC_POLICIES)})")
+        self.policy = policy
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.groups = 0  # Flush rounds
+        self.committed = 0  # Files published
+
+    def commit(self, pairs):
+        """Atomically rename each closed (temp_path, final_path) pair; blocks until durable under the policy."""
+        if not pairs:
+            return
+        if self.policy == "none":
+            for temp_path, final_path in pairs:
+                os.replace(temp_path, final_path)
+            with self._cond:
+                self.committed += len(pairs)
+            return
+
+        request = _CommitRequest(pairs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Committer is closed")
+            self._pending.append(request)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._commit_loop, name="GroupCommit", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        request.done.wait()
+        if request.error:
+            raise request.error
+
+    def close(self):
+        """Finish queued commits and stop the committer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread:
+            thread.join()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                group, self._pending = self._pending, []
+            self._commit_group(group)
+
+    def _commit_group(self, group):
+        # A request is published only once all of its files are on disk
+        for request in group:
+            try:
+                for temp_path, _ in request.pairs:
+                    fsync_file(temp_path)
+            except OSError as e:
+                request.error = e
+        directories = {}
+        for request in group:
+            if request.error:
+                continue
+            try:
+                for temp_path, final_path in request.pairs:
+                    os.replace(temp_path, final_path)
+                    if self.policy == "file+dir":
+                        directories.setdefault(os.path.dirname(final_path) or ".", []).append(request)
+            except OSError as e:
+                request.error = e
+        for directory, requests in directories.items():
+            try:
+                fsync_directory(directory)
+            except OSError as e:
+                for request in requests:
+                    request.error = request.error or e
+        with self._cond:
+            self.groups += 1
+            self.committed += sum(len(request.pairs) for request in group if not request.error)
+        for request in group:
+            request.done.set()
@@ -0,0 +1,197 @@
+import argparse
+import os
+import signal
+import socket
+import tempfile
+import threading
+
+from protocol import send_json, recv_json
+from server import DRAIN_TIMEOUT, IP, PORT, SERVER_DATA_PATH, FileServer
+
+# --- CONSTANTS ---
+HANDOFF_TIMEOUT = 10  # Seconds either process waits for the other during a handoff
+FD_MARKER = b"F"  # The byte the listening socket's descriptor travels with
+
+
+def handoff_path(port):
+    """Unix socket a running server listens on for its successor (one per port)"""
+    return os.path.join(tempfile.gettempdir(), f"fileserver-{port}.handoff")
+
+
+class HandoffListener:
+    """Hands a running FileServer's listening socket to a new process, then drains the old one.
+
+    Listens on a Unix socket (handoff_path(port)). When a successor connects
+    (receive_handoff()), the server stops accepting and closes its idle
+    sessions, and the listening socket is passed over (SCM_RIGHTS) with the
+    name counters and session tokens. Connections arriving meanwhile wait in
+    the socket's backlog, so none is refused. Once the successor accepts, this
+    server drains: in-flight commands finish, then it stops and `finished` is
+    set. If the successor fails first, this server accepts again.
+    """
+
+    def __init__(self, server, path=None, drain_timeout=DRAIN_TIMEOUT):
+        self.server = server
+        self.path = path or handoff_path(server.port)
+        self.drain_timeout = drain_timeout
+        self.finished = threading.Event()
+        self.handed_off = False
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left by a crashed server, or already taken over by this process
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o600)  # Whoever connects gets the listening socket: same user only
+        self._sock.listen(1)
+        self._sock.settimeout(1.0)
+        self._thread = threading.Thread(target=self._serve, name="HandoffListener", daemon=True)
+        self._thread.start()
+        self.server._log(f"[HANDOFF] Waiting for a successor on {self.path}")
+
+    def close(self):
+        """Stop listening (the path is left alone once a successor owns it)"""
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+            if not self.handed_off and os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _serve(self):
+        while not self.server.shutdown_flag.is_set() and not self.handed_off:
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # close()
+            with conn:
+                conn.settimeout(HANDOFF_TIMEOUT)
+                self._hand_over(conn)
+        if self.handed_off:
+            self.close()
+            self.finished.set()
+
+    def _hand_over(self, conn):
+        try:
+            if recv_json(conn).get("op") != "takeover":
+                return
+        except (OSError, ValueError, ConnectionError):
+            return
+        server = self.server
+        server._log("[HANDOFF] Successor connected; handing over the listening socket.")
+        server.stop_accepting()
+        closed = server.close_idle_sessions()
+        server._log(f"[HANDOFF] Stopped accepting; closed {closed} idle session(s).")
+        try:
+            socket.send_fds(conn, [FD_MARKER], [server.server.fileno()])
+            send_json(conn, server.handoff_state())
+            reply = recv_json(conn)
+        except (OSError, ValueError, ConnectionError) as e:
+            reply = {"op": "failed", "error": str(e)}
+        if reply.get("op") != "ready":
+            server._log(f"[HANDOFF] Handoff failed ({reply.get('error', reply)}); resuming.")
+            server.resume_accepting()
+            return
+
+        self.handed_off = True
+        server._log("[HANDOFF] Successor is accepting connections.")
+        cut_off = server.drain(self.drain_timeout)
+        try:
+            # Lets the successor pick up what this server stored while draining
+            send_json(conn, {"op": "drained", "cut_off": cut_off})
+        except OSError:
+            pass
+
+
+def receive_handoff(server, path=None, timeout=HANDOFF_TIMEOUT):
+    """Take over the listening socket of the server running on server.port and start server on it.
+
+    Returns False (having changed nothing) if no server is waiting on the handoff socket, so the caller
+    can start() normally. server.catch_up() runs in the background once the predecessor has drained.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path or handoff_path(server.port))
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return False
+
+    try:
+        send_json(sock, {"op": "takeover"})
+        _, fds, _, _ = socket.recv_fds(sock, len(FD_MARKER), 1)
+        if not fds:
+            raise ConnectionError("No listening socket was passed.")
+        listener = socket.socket(fileno=fds[0])
+        server.adopt_state(recv_json(sock))
+        if not server.start(listen_socket=listener):
+            listener.close()
+            raise ConnectionError("Could not start on the inherited socket.")
+        send_json(sock, {"op": "ready"})
+    except (OSError, ValueError, ConnectionError) as e:
+        try:
+            send_json(sock, {"op": "failed", "error": str(e)})
+        except OSError:
+            pass
+        sock.close()
+        raise ConnectionError(f"Handoff failed: {e}") from e
+
+    server._log("[HANDOFF] Took over the listening socket; the previous server is draining.")
+    threading.Thread(target=_await_drained, args=(server, sock), name="HandoffCatchUp", daemon=True).start()
+    return True
+
+
+def _await_drained(server, sock):
+    sock.settimeout(None)  # The predecessor's drain timeout may be longer than ours
+    try:
+        reply = recv_json(sock)
+        server._log(f"[HANDOFF] Previous server drained ({reply.get('cut_off', 0)} session(s) cut off).")
+    except (OSError, ValueError, ConnectionError):
+        server._log("[HANDOFF] Lost contact with the previous server while it drained.")
+    finally:
+        sock.close()
+    server.catch_up()
+
+
+def main():
+    """Run a server that can be replaced in place: start the new version with the same arguments.
+
+    python handoff.py --port 4450 --data server_data
+    A second instance on the same port takes over the first one's listening socket; the first drains and exits.
+    SIGTERM (or Ctrl+C) drains and exits.
+    """
+    parser = argparse.ArgumentParser(description="Run a file server that supports drain and hot restart.")
+    parser.add_argument("--host", default=IP)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--data", default=SERVER_DATA_PATH, help="Data directory")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="Seconds in-flight commands get to finish on shutdown or handoff")
+    args = parser.parse_args()
+
+    server = FileServer(args.host, args.port, args.data, stats_file=None)
+    if not receive_handoff(server) and not server.start():
+        return 1
+
+    listener = HandoffListener(server, drain_timeout=args.drain_timeout)
+    listener.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: stop.set())
+    try:
+        while not stop.wait(0.5) and not listener.handed_off:
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if listener.handed_off:
+            listener.finished.wait()  # The listener thread is draining this server
+        else:
+            listener.close()
+            server.drain(args.drain_timeout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+
+try:
+    import xxhash
+except ImportError:  # Optional, fastest non-cryptographic option when installed
+    xxhash = None
+
+# --- CONSTANTS ---
+HASH_CHUNK = 1024 * 1024
+INTEGRITY_RETRIES = 1  # Extra attempts after a digest mismatch
+
+
+class IntegrityError(Exception):
+    """Received data does not match the sender's digest."""
+
+
+def supported_algorithms():
+    """Digest algorithms available here, fastest first."""
+    algorithms = []
+    if xxhash is not None:
+        algorithms.append("xxh3_128")
+    algorithms.append("blake2b")
+    algorithms.append("sha256")
+    return algorithms
+
+
+def choose_algorithm(offered):
+    """Pick our most preferred algorithm that the peer also offered (None if there is no overlap)."""
+    offered = set(offered)
+    for name in supported_algorithms():
+        if name in offered:
+            return name
+    return None
+
+
+def new_hasher(name):
+    if name == "xxh3_128":
+        if xxhash is None:
+            raise ValueError("xxhash is not installed")
+        return xxhash.xxh3_128()
+    if name == "blake2b":
+        return hashlib.blake2b(digest_size=32)
+    if name == "sha256":
+        return hashlib.sha256()
+    raise ValueError(f"Unsupported digest algorithm '{name}'")
+
+
+def hash_file(path, name):
+    """Digest of a file on disk (a full read; prefer hashing inline with a transfer)."""
+    hasher = new_hasher(name)
+    buf = bytearray(HASH_CHUNK)
+    view = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            count = f.readinto(buf)
+            if not count:
+                break
+            hasher.update(view[:count])
+    return hasher.hexdigest()
+
+
+class DigestCache:
+    """Per-file digests keyed by path and validated against size and mtime.
+
+    Lets downloads of unchanged files send a known digest without rehashing,
+    which keeps the zero-copy sendfile() path.
+    """
+
+    def __init__(self):
+        self._entries = {}  # path -> (size, mtime_ns, {algorithm: digest})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, path, algorithm):
+        try:
+            size, mtime_ns = self._signature(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0] == size and entry[1] == mtime_ns:
+            return entry[2].get(algorithm)
+        return None
+
+    def put(self, path, algorithm, digest):
+        try:
+            size, mtime_ns = self._signature(path)
+        except OSError:
+            return
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == size and entry[1] == mtime_ns:
+                entry[2][algorithm] = digest
+            else:
+                self._entries[path] = (size, mtime_ns, {algorithm: digest})
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
@@ -0,0 +1,255 @@
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from client import FileClient, CLIENT_STATS_FILE, CONNECT_TIMEOUT
+
+# --- CONSTANTS ---
+DEFAULT_POOL_SIZE = 4
+KEEPALIVE_INTERVAL = 30  # seconds of idleness before a connection is pinged
+MAX_CONNECT_ATTEMPTS = 5
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_MAX = 10  # seconds
+
+INTERACTIVE_RESERVE = 1  # Connections bulk transfers may not take, so DIR/DELETE never queue behind them
+
+# Operations that are safe to run again on a fresh connection after a connection failure
+IDEMPOTENT_OPERATIONS = {"handle_dir", "receive_file", "ping", "query_catalog", "search", "list_files", "get_ring",
+                         "replication_status", "get_manifest"}
+# Long-running transfers that are limited to size - INTERACTIVE_RESERVE connections
+BULK_OPERATIONS = {"send_file", "receive_file", "send_files", "receive_files", "upload_tree", "download_tree",
+                   "send_stream"}
+
+
+class PoolClosedError(Exception):
+    """Raised when acquiring from a pool that has been closed."""
+
+
+class ConnectionPool:
+    """Keeps warm, authenticated FileClient connections and hands them out per operation.
+
+    New connections prefer the session token (one-message resume) and fall back
+    to the password. Failed connects are retried with exponential backoff and
+    idle connections are kept alive with PING. Bulk transfers can use all but
+    INTERACTIVE_RESERVE connections, leaving a lane free for interactive calls.
+    """
+
+    def __init__(self, ip, port, username, password=None, session_token=None, size=DEFAULT_POOL_SIZE,
+                 keepalive_interval=KEEPALIVE_INTERVAL, max_attempts=MAX_CONNECT_ATTEMPTS,
+                 timeout=CONNECT_TIMEOUT, log_callback=None, stats_file=CLIENT_STATS_FILE, ssl_context=None,
+                 server_hostname=None):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.session_token = session_token
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.log_callback = log_callback
+        self.stats_file = stats_file
+        self.ssl_context = ssl_context
+        self.server_hostname = server_hostname
+        self.tls_session = None  # Shared so new pooled connections resume TLS instead of a full handshake
+
+        self._idle = queue.LifoQueue()  # (client, last_used) - LIFO keeps the warmest connections busy
+        self._slots = threading.BoundedSemaphore(size)
+        self._bulk_slots = threading.BoundedSemaphore(max(1, size - INTERACTIVE_RESERVE))
+        self._lock = threading.Lock()
+        self._all = set()
+        self._closed = threading.Event()
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="PoolKeepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    # --- Internal Helpers ---
+
+    def _log(self, message):
+        timestamp = time.strftime("[%Y-%m-%d %H:%M:%S] [POOL]")
+        full_message = f"{timestamp} {message}"
+        if self.log_callback:
+            self.log_callback(full_message)
+        else:
+            print(full_message)
+
+    def _open(self):
+        """Open and authenticate a new connection, retrying with exponential backoff."""
+        last_error = "unknown error"
+        for attempt in range(self.max_attempts):
+            if self._closed.is_set():
+                raise PoolClosedError("Connection pool is closed.")
+
+            client = FileClient(self.ip, self.port, log_callback=self.log_callback, stats_file=self.stats_file,
+                                timeout=self.timeout, ssl_context=self.ssl_context,
+                                server_hostname=self.server_hostname, tls_session=self.tls_session)
+            client.username = self.username
+            if client.connect():
+                result = "AUTH_FAILED"
+                if self.session_token:
+                    result = client.resume_session(self.session_token)
+                    if result != "AUTH_SUCCESS" and self.password is not None:
+                        # The server closes the connection after a failed login
+                        client.disconnect()
+                        client.connect()
+                if result != "AUTH_SUCCESS" and self.password is not None and client.is_connected:
+                    result = client.authenticate(self.username, self.password)
+                if result == "AUTH_SUCCESS":
+                    # Later connections can resume with the newest token and TLS session
+                    self.session_token = client.session_token
+                    if self.ssl_context:
+                        self.tls_session = client.client_socket.session or self.tls_session
+                    with self._lock:
+                        self._all.add(client)
+                    return client
+                last_error = result
+                client.disconnect()
+                if result == "AUTH_FAILED":
+                    # Wrong credentials will not fix themselves with a retry
+                    break
+            else:
+                last_error = f"could not connect to {self.ip}:{self.port}"
+
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            self._log(f"Connection attempt {attempt + 1} failed ({last_error}); retrying in {delay:.2f}s")
+            if self._closed.wait(delay):
+                break
+        raise ConnectionError(f"Could not open pooled connection: {last_error}")
+
+    def _discard(self, client):
+        with self._lock:
+            self._all.discard(client)
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+    def _keepalive_loop(self):
+        """Ping connections that have been idle for longer than keepalive_interval."""
+        while not self._closed.wait(self.keepalive_interval / 2):
+            checked = []
+            while True:
+                try:
+                    client, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if time.monotonic() - last_used < self.keepalive_interval:
+                    checked.append((client, last_used))
+                elif client.ping():
+                    checked.append((client, time.monotonic()))
+                else:
+                    self._log("Dropping dead idle connection.")
+                    self._discard(client)
+            for client, last_used in reversed(checked):
+                with self._lock:
+                    # acquire() may have opened replacements while these were being checked
+                    surplus = len(self._all) > self.size
+                if surplus:
+                    self._discard(client)
+                else:
+                    self._idle.put((client, last_used))
+
+    # --- Public API ---
+
+    def acquire(self, timeout=None, bulk=False):
+        """Borrow an authenticated FileClient. Blocks while all `size` connections are in use.
+
+        Pass bulk=True for long transfers (and the same to release()) so they leave the interactive lane free.
+        """
+        if self._closed.is_set():
+            raise PoolClosedError("Connection pool is closed.")
+        if bulk and not self._bulk_slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a pooled connection.")
+        if not self._slots.acquire(timeout=timeout):
+            if bulk:
+                self._bulk_slots.release()
+            raise TimeoutError("Timed out waiting for a pooled connection.")
+        try:
+            while True:
+                try:
+                    client, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                # A draining server closes idle connections; notice that without a round trip and reconnect
+                if client.server_closed():
+                    self._discard(client)
+                    continue
+                if time.monotonic() - last_used < self.keepalive_interval or client.ping():
+                    return client
+                self._discard(client)
+        except BaseException:
+            self._slots.release()
+            if bulk:
+                self._bulk_slots.release()
+            raise
+
+    def release(self, client, broken=False, bulk=False):
+        """Return a connection to the pool, or close it if it is broken or the pool is closed."""
+        try:
+            if broken or self._closed.is_set() or not client.is_authenticated:
+                self._discard(client)
+            else:
+                self._idle.put((client, time.monotonic()))
+        finally:
+            self._slots.release()
+            if bulk:
+                self._bulk_slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None, bulk=False):
+        """with pool.connection() as client: ... - broken connections are not returned to the pool."""
+        client = self.acquire(timeout=timeout, bulk=bulk)
+        broken = False
+        try:
+            yield client
+        except (OSError, ConnectionError):
+            broken = True
+            raise
+        finally:
+            self.release(client, broken=broken, bulk=bulk)
+
+    def call(self, operation, *args, **kwargs):
+        """Run a FileClient method (e.g. "send_file") on a pooled connection.
+
+        After an ERROR result the connection is health-checked before reuse, and
+        idempotent operations are retried once on a fresh connection if the
+        connection itself failed.
+        """
+        bulk = operation in BULK_OPERATIONS
+        for attempt in range(2):
+            client = self.acquire(bulk=bulk)
+            broken = False
+            try:
+                result = getattr(client, operation)(*args, **kwargs)
+                if isinstance(result, str) and result.startswith("ERROR") and not client.ping():
+                    broken = True
+                    if attempt == 0 and operation in IDEMPOTENT_OPERATIONS:
+                        continue
+                return result
+            except (OSError, ConnectionError) as e:
+                broken = True
+                if attempt == 0 and operation in IDEMPOTENT_OPERATIONS:
+                    self._log(f"{operation} failed on a pooled connection ({e}); retrying.")
+                    continue
+                return f"ERROR: {operation} failed - {e}"
+            finally:
+                self.release(client, broken=broken, bulk=bulk)
+
+    def warm(self, count=None):
+        """Open up to `count` connections ahead of time (default: the pool size)."""
+        clients = [self.acquire() for _ in range(min(count or self.size, self.size))]
+        for client in clients:
+            self.release(client)
+
+    def close(self):
+        """Close every connection and stop the keepalive thread."""
+        self._closed.set()
+        with self._lock:
+            clients = list(self._all)
+            self._all.clear()
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
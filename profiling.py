@@ -0,0 +1,183 @@
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+# --- CONSTANTS ---
+DEFAULT_SAMPLE_INTERVAL = 0.005  # 200 Hz
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    """Times the body of a with-block and records it under a phase name."""
+    __slots__ = ("instrumentation", "name", "start")
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _TimedAcquire:
+    """Acquires a lock, records how long the wait took and releases it on exit."""
+    __slots__ = ("instrumentation", "lock", "name")
+
+    def __init__(self, instrumentation, lock, name):
+        self.instrumentation = instrumentation
+        self.lock = lock
+        self.name = name
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.instrumentation.record(self.name, time.perf_counter() - start)
+        return self.lock
+
+    def __exit__(self, exc_type, exc, tb):
+        self.lock.release()
+        return False
+
+
+class Instrumentation:
+    """Opt-in span timers for the server hot paths.
+
+    When disabled, span() and acquire() hand back a no-op context (or the lock
+    itself) so the instrumented code costs one attribute check per call.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: [0, 0.0, 0.0])  # name -> [count, total_s, max_s]
+
+    def span(self, name):
+        """Context manager timing a protocol phase."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def acquire(self, lock, name):
+        """Context manager that holds `lock` and records the time spent waiting for it."""
+        if not self.enabled:
+            return lock
+        return _TimedAcquire(self, lock, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            stat = self._stats[name]
+            stat[0] += 1
+            stat[1] += seconds
+            if seconds > stat[2]:
+                stat[2] = seconds
+
+    def snapshot(self):
+        """Return {phase: {count, total_s, avg_ms, max_ms}} for every recorded phase."""
+        with self._lock:
+            items = [(name, list(stat)) for name, stat in self._stats.items()]
+        return {
+            name: {
+                'count': count,
+                'total_s': round(total, 6),
+                'avg_ms': round(total / count * 1000, 4) if count else 0.0,
+                'max_ms': round(peak * 1000, 4),
+            }
+            for name, (count, total, peak) in items
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def format_report(self):
+        """Human readable table of the span statistics, slowest total first."""
+        lines = [f"{'Phase':<28} {'Count':>9} {'Total (s)':>11} {'Avg (ms)':>10} {'Max (ms)':>10}"]
+        stats = sorted(self.snapshot().items(), key=lambda item: item[1]['total_s'], reverse=True)
+        for name, stat in stats:
+            lines.append(f"{name:<28} {stat['count']:>9} {stat['total_s']:>11.4f} "
+                         f"{stat['avg_ms']:>10.4f} {stat['max_ms']:>10.4f}")
+        if len(lines) == 1:
+            lines.append("(no spans recorded - is instrumentation enabled?)")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack from a background thread.
+
+    Samples are aggregated as collapsed stacks ("thread;frame;frame count"),
+    the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL, output_dir="."):
+        self.interval = interval
+        self.output_dir = output_dir
+        self._counts = defaultdict(int)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling. Returns False if already running."""
+        with self._lock:
+            if self.is_running:
+                return False
+            self._counts.clear()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="SamplingProfiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling and dump the collapsed stacks. Returns the output path (None if not running)."""
+        with self._lock:
+            if not self.is_running:
+                return None
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            return self.dump()
+
+    def toggle(self):
+        """Start if stopped, otherwise stop and dump. Returns the dump path when stopping."""
+        if self.is_running:
+            return self.stop()
+        self.start()
+        return None
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"Thread-{ident}"))
+                self._counts[";".join(reversed(stack))] += 1
+
+    def dump(self, path=None):
+        """Write collected samples in collapsed-stack format."""
+        if path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, time.strftime("profile_%Y%m%d_%H%M%S.collapsed"))
+        with open(path, "w") as f:
+            for stack, count in sorted(self._counts.items()):
+                f.write(f"{stack} {count}\n")
+        return path
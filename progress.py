@@ -0,0 +1,101 @@
+import time
+from dataclasses import dataclass
+
+# --- CONSTANTS ---
+PROGRESS_INTERVAL = 0.25  # Minimum seconds between progress events for one transfer
+RATE_SMOOTHING = 0.3  # Weight of the newest interval in the smoothed rate (exponential moving average)
+PROGRESS_SLICE = 1024 * 1024  # sendfile() slice size while progress is reported (fewer, larger syscalls)
+
+
+class TransferCancelled(Exception):
+    """Raised inside a transfer when its cancel event is set."""
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    name: str
+    direction: str  # "upload" or "download"
+    done: int  # Bytes transferred so far
+    total: int
+    rate: float  # Bytes/sec over the last interval
+    avg_rate: float  # Smoothed bytes/sec, used for the ETA
+    eta: float = None  # Seconds left (None until a rate is known)
+    elapsed: float = 0.0
+    finished: bool = False
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 1.0
+
+    def describe(self):
+        """e.g. '1.2 GB / 5.0 GB  112.4 MB/s  ETA 00:34'"""
+        if self.finished:
+            return f"{format_bytes(self.done)} in {self.elapsed:.1f}s ({format_bytes(self.avg_rate)}/s)"
+        return (f"{format_bytes(self.done)} / {format_bytes(self.total)}  {format_bytes(self.rate)}/s  "
+                f"ETA {format_eta(self.eta)}")
+
+
+class ProgressMeter:
+    """Counts the bytes of one transfer and emits throttled ProgressEvents to a callback.
+
+    Called with each chunk's byte count from the transfer loop, so the per-chunk
+    cost is an addition, a clock read and (with a cancel event) a flag check; the
+    rates and the event are only computed every PROGRESS_INTERVAL seconds. Raises
+    TransferCancelled from the transfer loop once cancel_event is set.
+    """
+
+    def __init__(self, name, direction, total, callback=None, cancel_event=None, interval=PROGRESS_INTERVAL):
+        self.name = name
+        self.direction = direction
+        self.total = total
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.interval = interval
+        self.done = 0
+        self.avg_rate = 0.0
+        self.start = self._last_time = time.monotonic()
+        self._last_done = 0
+        self._next_report = self.start + interval
+
+    def __call__(self, count):
+        self.done += count
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise TransferCancelled()
+        if self.callback is not None:
+            now = time.monotonic()
+            if now >= self._next_report:
+                self._report(now)
+
+    def _report(self, now):
+        rate = (self.done - self._last_done) / (now - self._last_time)
+        self.avg_rate = rate if not self.avg_rate else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.avg_rate
+        self._last_time, self._last_done = now, self.done
+        self._next_report = now + self.interval
+        eta = (self.total - self.done) / self.avg_rate if self.avg_rate else None
+        self.callback(ProgressEvent(self.name, self.direction, self.done, self.total, rate, self.avg_rate, eta,
+                                    now - self.start))
+
+    def finish(self):
+        """Emit the final event (always, regardless of the interval)."""
+        if self.callback is None:
+            return
+        elapsed = time.monotonic() - self.start
+        average = self.done / elapsed if elapsed > 0 else 0.0
+        self.callback(ProgressEvent(self.name, self.direction, self.done, self.total, average, average, 0.0,
+                                    elapsed, finished=True))
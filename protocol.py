@@ -0,0 +1,200 @@
+import json
+import struct
+
+# --- CONSTANTS ---
+# Every frame starts with an 8-byte unsigned big-endian payload length
+FRAME_HEADER = struct.Struct("!Q")
+
+
+# --- Framing helpers shared by FileServer and FileClient ---
+
+def recv_exact(sock, n):
+    """Receive exactly n bytes from the socket or raise ConnectionError."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    received = 0
+    while received < n:
+        count = sock.recv_into(view[received:], n - received)
+        if not count:
+            raise ConnectionError(f"Connection closed after {received} of {n} bytes")
+        received += count
+    return bytes(buf)
+
+
+def send_frame(sock, payload):
+    """Send a length-prefixed payload (bytes) in one call."""
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """Receive a payload sent with send_frame."""
+    (length,) = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    return recv_exact(sock, length)
+
+
+def send_json(sock, obj):
+    """Send a JSON-serialisable object as one frame."""
+    send_frame(sock, json.dumps(obj, separators=(",", ":")).encode("utf-8"))
+
+
+def recv_json(sock):
+    """Receive an object sent with send_json."""
+    return json.loads(recv_frame(sock).decode("utf-8"))
+
+
+def recv_into_file(sock, f, nbytes, chunk_size=64 * 1024, hasher=None, progress=None):
+    """Copy exactly nbytes from the socket into an open binary file, hashing inline if a hasher is given.
+
+    progress(n), if given, is called after each chunk is written.
+    """
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    received = 0
+    while received < nbytes:
+        count = sock.recv_into(view, min(chunk_size, nbytes - received))
+        if not count:
+            raise ConnectionError(f"Connection closed after {received} of {nbytes} bytes")
+        chunk = view[:count]
+        f.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        received += count
+        if progress is not None:
+            progress(count)
+    return received
+
+
+def send_from_file(sock, f, nbytes, chunk_size=64 * 1024, hasher=None, throttle=None, progress=None):
+    """Send nbytes from an open binary file. Returns the byte count sent.
+
+    Without a hasher this is a zero-copy sendfile(); with one, each chunk is
+    hashed as it is sent so the data is still read only once. throttle(n), if
+    given, is called before each chunk and progress(n) after it (sendfile() then
+    runs in chunk_size slices).
+    """
+    if nbytes == 0:
+        return 0
+    if hasher is None and throttle is None and progress is None:
+        return sock.sendfile(f, count=nbytes)
+    if hasher is None:
+        offset = f.tell()
+        sent = 0
+        while sent < nbytes:
+            count = min(chunk_size, nbytes - sent)
+            if throttle is not None:
+                throttle(count)
+            count = sock.sendfile(f, offset + sent, count)
+            if not count:
+                break
+            sent += count
+            if progress is not None:
+                progress(count)
+        return sent
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    sent = 0
+    while sent < nbytes:
+        count = f.readinto(view[:min(chunk_size, nbytes - sent)])
+        if not count:
+            break
+        chunk = view[:count]
+        hasher.update(chunk)
+        if throttle is not None:
+            throttle(count)
+        sock.sendall(chunk)
+        sent += count
+        if progress is not None:
+            progress(count)
+    return sent
+
+
+def stream_bytes(stream):
+    """Bytes moved so far by a ChunkedReader or ChunkedWriter."""
+    return getattr(stream, "bytes_read", 0) or getattr(stream, "bytes_written", 0)
+
+
+class ChunkedWriter:
+    """Write-only file object that sends data as frames, ended by an empty frame.
+
+    Lets streams of unknown length (tar archives, generators) share the
+    connection with the framed messages that follow them.
+    """
+
+    def __init__(self, sock, chunk_size=64 * 1024):
+        self.sock = sock
+        self.chunk_size = chunk_size
+        self._buf = bytearray()
+        self.bytes_written = 0
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if not self._buf and len(data) >= self.chunk_size:
+            # A large write becomes its own frame without being copied through the buffer
+            self.sock.sendall(FRAME_HEADER.pack(len(data)))
+            self.sock.sendall(data)
+            self.bytes_written += len(data)
+            return len(data)
+        self._buf += data
+        if len(self._buf) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buf:
+            send_frame(self.sock, bytes(self._buf))
+            self.bytes_written += len(self._buf)
+            self._buf.clear()
+
+    def close(self):
+        """Flush and send the end-of-stream marker (the socket stays open)."""
+        if not self.closed:
+            self.flush()
+            send_frame(self.sock, b"")
+            self.closed = True
+
+
+class ChunkedReader:
+    """Read-only file object for a stream sent by ChunkedWriter."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._buf = b""
+        self._pos = 0
+        self.bytes_read = 0
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        payload = recv_frame(self.sock)
+        if not payload:
+            self.finished = True
+        self._buf, self._pos = payload, 0
+
+    def read(self, n=-1):
+        chunks = []
+        while (n < 0 or n > 0) and not self.finished:
+            if self._pos >= len(self._buf):
+                self._fill()
+                continue
+            end = len(self._buf) if n < 0 else min(len(self._buf), self._pos + n)
+            chunk = self._buf[self._pos:end]
+            self._pos = end
+            chunks.append(chunk)
+            if n > 0:
+                n -= len(chunk)
+        data = b"".join(chunks)
+        self.bytes_read += len(data)
+        return data
+
+    def drain(self):
+        """Consume the rest of the stream up to the end marker."""
+        while not self.finished:
+            self._fill()
+
+    def close(self):
+        pass
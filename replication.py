@@ -0,0 +1,303 @@
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from client import FileClient
+from cluster import parse_node
+from pool import ConnectionPool
+from tree import INTERNAL_PREFIX
+
+# --- CONSTANTS ---
+CHANGELOG_FILE = INTERNAL_PREFIX + "changelog.sqlite3"  # Primary's ordered change log, inside data_path
+REPLICA_STATE_FILE = INTERNAL_PREFIX + "replica_seq"  # Last change a replica applied, for incremental catch-up
+MAX_LOG_ENTRIES = 100_000  # Older changes are trimmed; a replica further behind than this gets a full snapshot
+TRIM_EVERY = 1000  # Appends between trims
+STREAM_BATCH = 256  # Changes read from the log per query while streaming
+HEARTBEAT_INTERVAL = 1.0  # Seconds between heartbeats on an idle stream (carry the primary's head for lag)
+RECONNECT_BASE = 0.5  # seconds
+RECONNECT_MAX = 10  # seconds
+REPLICA_POOL_SIZE = 2  # Pooled connections per server in ReplicatedClient
+
+# Operations ReplicatedClient sends to replicas; everything else goes to the primary
+READ_OPERATIONS = ("receive_file", "receive_files", "handle_dir", "list_files", "download_tree", "search",
+                   "query_catalog")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+    op   TEXT NOT NULL,
+    name TEXT NOT NULL,
+    info TEXT,
+    time REAL NOT NULL
+);
+"""
+
+
+class ChangeLog:
+    """Ordered log of committed changes (put, delete, mkdir, rmdir) that replicas replay.
+
+    Entries are appended after a change is committed and numbered by a
+    monotonically increasing seq, so a replica that remembers the last seq it
+    applied can resume from there after a disconnect.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._appends = 0
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+        self._head = self._query_head()
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _query_head(self):
+        return self._connect().execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def append(self, op, name, **info):
+        """Record a committed change. Returns its seq."""
+        with self._cond:
+            with self._connect() as db:
+                seq = db.execute("INSERT INTO changes (op, name, info, time) VALUES (?, ?, ?, ?)",
+                                 (op, name, json.dumps(info), time.time())).lastrowid
+            self._head = seq
+            self._appends += 1
+            trim = self._appends % TRIM_EVERY == 0
+            self._cond.notify_all()
+        if trim:
+            self.trim()
+        return seq
+
+    @property
+    def head(self):
+        return self._head
+
+    def refresh(self):
+        """Pick up changes another process appended to the same log (a predecessor draining after a handoff)."""
+        with self._cond:
+            head = self._query_head()
+            if head > self._head:
+                self._head = head
+                self._cond.notify_all()
+        return self._head
+
+    def oldest(self):
+        """Seq of the oldest retained change (head + 1 when the log is empty)."""
+        seq = self._connect().execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        return seq if seq is not None else self._head + 1
+
+    def since(self, seq, limit=STREAM_BATCH):
+        rows = self._connect().execute("SELECT seq, op, name, info, time FROM changes WHERE seq > ? ORDER BY seq"
+                                       " LIMIT ?", (seq, limit)).fetchall()
+        return [dict(json.loads(info or "{}"), seq=seq, op=op, name=name, time=stamp)
+                for seq, op, name, info, stamp in rows]
+
+    def wait(self, seq, timeout):
+        """Block until a change after seq exists or timeout passes. Returns True if there is one."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._head > seq, timeout)
+
+    def trim(self, keep=MAX_LOG_ENTRIES):
+        with self._connect() as db:
+            db.execute("DELETE FROM changes WHERE seq <= ?", (self._head - keep,))
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+class Follower:
+    """Keeps a replica FileServer in step with its primary: FileServer(replica_of=Follower("host:port", ...)).
+
+    A background thread logs in to the primary (as an admin user), sends
+    REPLICATE with the last applied seq and applies the streamed changes. The
+    applied seq is saved after every change, so a reconnect only replays what
+    was missed. status() reports the replication lag.
+    """
+
+    def __init__(self, primary, username="admin", password=None):
+        self.primary = primary
+        self.username = username
+        self.password = password
+        self.server = None
+        self.applied_seq = 0
+        self.primary_seq = 0
+        self.lag_seconds = 0.0
+        self.connected = False
+        self.last_error = None
+        self._state_path = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._client = None
+
+    def start(self, server):
+        self.server = server
+        self._state_path = os.path.join(server.data_path, REPLICA_STATE_FILE)
+        try:
+            with open(self._state_path) as f:
+                self.applied_seq = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self.applied_seq = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ReplicaFollower", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        client = self._client
+        if client and client.client_socket:
+            try:
+                client.client_socket.close()  # Unblocks the stream read
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def status(self):
+        return {"role": "replica", "primary": self.primary, "connected": self.connected,
+                "applied_seq": self.applied_seq, "primary_seq": self.primary_seq,
+                "lag_entries": max(0, self.primary_seq - self.applied_seq),
+                "lag_seconds": round(self.lag_seconds, 3), "last_error": self.last_error}
+
+    def _save_seq(self, seq):
+        self.applied_seq = seq
+        partial = self._state_path + ".tmp"
+        with open(partial, "w") as f:
+            f.write(str(seq))
+        os.replace(partial, self._state_path)
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                self._follow()
+                attempt = 0
+            except Exception as e:
+                self.last_error = str(e)
+            if self.connected:
+                attempt = 0  # The stream was up; back off from scratch
+            self.connected = False
+            if self._stop.is_set():
+                return
+            delay = min(RECONNECT_MAX, RECONNECT_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.server._log(f"[REPLICA] Stream from {self.primary} ended ({self.last_error}); "
+                             f"reconnecting in {delay:.1f}s.")
+            self._stop.wait(delay)
+
+    def _follow(self):
+        host, port = parse_node(self.primary)
+        client = self._client = FileClient(host, port, log_callback=lambda message: None, stats_file=None)
+        if not client.connect():
+            raise ConnectionError(f"could not connect to {self.primary}")
+        try:
+            if client.authenticate(self.username, self.password or "") != "AUTH_SUCCESS":
+                raise ConnectionError(f"could not log in to {self.primary} as '{self.username}'")
+            client.client_socket.settimeout(None)
+            stream = client.open_replication_stream(self.applied_seq)
+            self.connected = True
+            self.last_error = None
+            self.server._log(f"[REPLICA] Following {self.primary} from change {self.applied_seq}.")
+            for change in stream:
+                self._apply(client.client_socket, change, stream.algorithm)
+                if self._stop.is_set():
+                    return
+        finally:
+            client.disconnect()
+
+    def _apply(self, sock, change, algorithm):
+        op = change["op"]
+        self.primary_seq = max(self.primary_seq, change.get("head", change.get("seq") or 0))
+        if op == "heartbeat":
+            if self.applied_seq >= self.primary_seq:
+                self.lag_seconds = 0.0
+            return
+        if op == "snapshot":
+            self.server._apply_replicated_snapshot(change["files"], change.get("folders", ()))
+            return
+        if op == "snapshot_end":
+            self._save_seq(change["seq"])
+            return
+
+        self.server._apply_replicated_change(sock, change, algorithm)
+        if change.get("seq"):
+            self.lag_seconds = max(0.0, time.time() - change["time"])
+            self._save_seq(change["seq"])
+
+
+class ReplicatedClient:
+    """Sends writes to the primary and spreads reads across replicas (round robin).
+
+    A read that fails on a replica, for example because the file was uploaded
+    moments ago and has not replicated yet, is retried on the primary. Each
+    server gets its own ConnectionPool.
+    """
+
+    def __init__(self, primary, replicas, username, password, pool_size=REPLICA_POOL_SIZE, log_callback=None,
+                 stats_file=None, ssl_context=None):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+        self.log_callback = log_callback
+        self.stats_file = stats_file
+        self.ssl_context = ssl_context
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._next_replica = itertools.cycle(self.replicas or [primary])
+
+    def _pool(self, node):
+        with self._lock:
+            pool = self._pools.get(node)
+            if pool is None:
+                host, port = parse_node(node)
+                pool = self._pools[node] = ConnectionPool(host, port, self.username, self.password,
+                                                          size=self.pool_size, log_callback=self.log_callback,
+                                                          stats_file=self.stats_file, ssl_context=self.ssl_context)
+            return pool
+
+    def _call(self, node, operation, *args, **kwargs):
+        try:
+            return self._pool(node).call(operation, *args, **kwargs)
+        except (OSError, ConnectionError) as e:
+            return f"ERROR: {operation} on {node} failed - {e}"
+
+    def _read(self, operation, *args, **kwargs):
+        with self._lock:
+            node = next(self._next_replica)
+        result = self._call(node, operation, *args, **kwargs)
+        if node != self.primary and isinstance(result, str) and result.startswith("ERROR"):
+            result = self._call(self.primary, operation, *args, **kwargs)
+        return result
+
+    def __getattr__(self, operation):
+        if operation.startswith("_"):
+            raise AttributeError(operation)
+        if operation in READ_OPERATIONS:
+            return lambda *args, **kwargs: self._read(operation, *args, **kwargs)
+        return lambda *args, **kwargs: self._call(self.primary, operation, *args, **kwargs)
+
+    def replication_status(self):
+        """{server: status} for the primary and every replica (lag per replica)."""
+        return {node: self._call(node, "replication_status") for node in [self.primary] + self.replicas}
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
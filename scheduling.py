@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# --- CONSTANTS ---
+DEFAULT_BULK_SLOTS = 4  # Bulk transfer chunks allowed in flight at once; the rest queue fairly
+ACQUIRE_POLL = 1.0  # Seconds a queued chunk waits between checks for abort()
+
+
+class TransferAborted(ConnectionAbortedError):
+    """Raised to a bulk chunk waiting for a slot when its session is aborted (drain deadline, shutdown)."""
+
+
+class BulkStream:
+    """Per-chunk pacing callback for one bulk transfer: stream(nbytes) waits for a fair turn.
+
+    The turn is held until the next call, release() or close().
+    """
+
+    def __init__(self, scheduler, session, weight=1.0):
+        self._scheduler = scheduler
+        self.session = session
+        self.weight = weight
+        self._holding = False
+
+    def __call__(self, nbytes):
+        self.release()
+        self._scheduler._acquire(self.session, self.weight, nbytes)
+        self._holding = True
+
+    def release(self):
+        if self._holding:
+            self._holding = False
+            self._scheduler._release()
+
+    close = release
+
+
+class IoScheduler:
+    """Two-lane scheduler for server transfers.
+
+    Interactive operations (DIR, DELETE, SUBFOLDER, SEARCH...) run at once and
+    hold back new bulk chunks while they are active, so they must only wrap
+    local work, never a socket send or recv that a slow client could stall. Bulk transfers take a slot
+    per chunk; when slots are contended they are granted in start-time fair
+    queuing order, so sessions share the disk and network in proportion to
+    their weights no matter how many chunks each one pushes.
+    """
+
+    def __init__(self, slots=DEFAULT_BULK_SLOTS):
+        if slots < 1:
+            raise ValueError("slots must be at least 1")
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._free = slots
+        self._interactive = 0
+        self._waiters = []  # heap of [finish_tag, seq, start_tag, event, session, aborted]
+        self._finish = {}  # session -> virtual finish tag of its last queued chunk
+        self._vclock = 0.0
+        self._seq = itertools.count()
+
+    @contextmanager
+    def interactive(self):
+        """Run a control or metadata operation ahead of queued bulk chunks."""
+        with self._lock:
+            self._interactive += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._interactive -= 1
+                self._grant_locked()
+
+    def stream(self, session, weight=1.0):
+        return BulkStream(self, session, weight)
+
+    def abort(self, session=None):
+        """Fail the queued chunks of one session (or of every session) with TransferAborted."""
+        with self._lock:
+            aborted = [entry for entry in self._waiters if session is None or entry[4] == session]
+            if not aborted:
+                return
+            self._waiters = [entry for entry in self._waiters if not any(entry is other for other in aborted)]
+            heapq.heapify(self._waiters)
+            for entry in aborted:
+                entry[5] = True
+                entry[3].set()
+
+    def forget(self, session):
+        """Drop fairness state for a closed session."""
+        with self._lock:
+            self._finish.pop(session, None)
+
+    def _acquire(self, session, weight, nbytes):
+        with self._lock:
+            start = max(self._vclock, self._finish.get(session, 0.0))
+            finish = start + nbytes / weight
+            self._finish[session] = finish
+            if self._free and not self._interactive and not self._waiters:
+                # Uncontended fast path: no queueing, no event
+                self._free -= 1
+                self._vclock = start
+                return
+            entry = [finish, next(self._seq), start, threading.Event(), session, False]
+            heapq.heappush(self._waiters, entry)
+        # abort() sets the event too; the timeout only bounds how long a missed wakeup could block
+        while not entry[3].wait(ACQUIRE_POLL) and not entry[5]:
+            pass
+        if entry[5]:
+            raise TransferAborted("Transfer aborted while waiting for a bulk slot.")
+
+    def _release(self):
+        with self._lock:
+            self._free += 1
+            self._grant_locked()
+
+    def _grant_locked(self):
+        while self._free and not self._interactive and self._waiters:
+            _, _, start, event, _, _ = heapq.heappop(self._waiters)
+            self._free -= 1
+            self._vclock = max(self._vclock, start)
+            event.set()
@@ -0,0 +1,206 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+
+# --- CONSTANTS ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_CONTENT_BYTES = 1024 * 1024  # Only the start of large text files is indexed
+NAME_EXACT_SCORE = 4.0  # A query term equal to a whole name token
+NAME_PREFIX_SCORE = 2.0  # A query term that is a prefix of a name token
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric words of text ('Report_2024.final.txt' -> report, 2024, final, txt)."""
+    return _TOKEN.findall(text.lower())
+
+
+class _PrefixIndex:
+    """Inverted index from tokens to {doc_id: count}, with a sorted vocabulary for prefix lookups."""
+
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []  # Sorted tokens, so all tokens with a prefix are one contiguous bisect range
+
+    def add(self, doc_id, tokens):
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            posting[doc_id] = count
+        return tuple(counts)
+
+    def remove(self, doc_id, tokens):
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    def expand(self, prefix):
+        """Every indexed token starting with prefix."""
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff", start)
+        return self.vocabulary[start:end]
+
+
+class SearchIndex:
+    """In-memory search over stored files: names always, text content optionally.
+
+    Names (logical and original) go into a prefix index, so 'rep' finds
+    'Report.txt' and 'ts00' finds 'TS001.txt'. Text file content goes into a
+    separate word index. Every query term must match a file's name or content;
+    name matches rank above content matches, and content matches rank by term
+    frequency weighted by rarity. Updates are incremental (add/remove per file).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = _PrefixIndex()
+        self._content = _PrefixIndex()
+        self._docs = {}  # doc_id -> [name, original_name, size, name_tokens, content_tokens]
+        self._ids = {}  # logical name -> doc_id
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def names(self):
+        with self._lock:
+            return list(self._ids)
+
+    def add(self, name, original_name=None, size=0, text=None):
+        """Index a stored file (replacing any previous entry for name); text is its decoded content, if any."""
+        original_name = original_name or name.rpartition("/")[2]
+        name_tokens = tokenize(name) + tokenize(original_name)
+        content_tokens = tokenize(text) if text else []
+        with self._lock:
+            self._remove_locked(name)
+            doc_id = self._next_id
+            self._next_id += 1
+            self._ids[name] = doc_id
+            self._docs[doc_id] = [name, original_name, size, self._names.add(doc_id, name_tokens),
+                                  self._content.add(doc_id, content_tokens)]
+
+    def set_content(self, name, text):
+        """Index (or re-index) the content of an already indexed file. Returns False if name isn't indexed."""
+        content_tokens = tokenize(text) if text else []
+        with self._lock:
+            doc_id = self._ids.get(name)
+            if doc_id is None:
+                return False
+            doc = self._docs[doc_id]
+            self._content.remove(doc_id, doc[4])
+            doc[4] = self._content.add(doc_id, content_tokens)
+            return True
+
+    def remove(self, name):
+        with self._lock:
+            self._remove_locked(name)
+
+    def _remove_locked(self, name):
+        doc_id = self._ids.pop(name, None)
+        if doc_id is None:
+            return
+        _, _, _, name_tokens, content_tokens = self._docs.pop(doc_id)
+        self._names.remove(doc_id, name_tokens)
+        self._content.remove(doc_id, content_tokens)
+
+    def search(self, query, content=False, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """One page of ranked matches for query.
+
+        Returns {"results": [{name, original_name, size, score, matched}], "total": n,
+        "next_offset": offset of the next page or None}.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        if not terms:
+            return {"results": [], "total": 0, "next_offset": None}
+
+        with self._lock:
+            scores = None
+            via_content = set()
+            for term in terms:
+                term_scores = self._name_scores(term)
+                if content:
+                    for doc_id, score in self._content_scores(term).items():
+                        if doc_id not in term_scores:
+                            via_content.add(doc_id)
+                        term_scores[doc_id] = term_scores.get(doc_id, 0.0) + score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    # Every term has to match: keep the intersection
+                    scores = {doc_id: scores[doc_id] + term_scores[doc_id]
+                              for doc_id in scores.keys() & term_scores.keys()}
+                if not scores:
+                    break
+
+            total = len(scores)
+            results = []
+            for doc_id, score in self._top(scores, offset + limit)[offset:]:
+                name, original_name, size, _, _ = self._docs[doc_id]
+                results.append({"name": name, "original_name": original_name, "size": size,
+                                "score": round(score, 3), "matched": "content" if doc_id in via_content else "name"})
+
+        next_offset = offset + len(results) if offset + len(results) < total else None
+        return {"results": results, "total": total, "next_offset": next_offset}
+
+    @staticmethod
+    def _top(scores, count):
+        """The count best (doc_id, score) pairs, ties broken oldest first.
+
+        Scores take few distinct values, so docs are bucketed by score and only
+        the buckets that reach the page are ordered.
+        """
+        buckets = {}
+        for doc_id, score in scores.items():
+            bucket = buckets.get(score)
+            if bucket is None:
+                buckets[score] = [doc_id]
+            else:
+                bucket.append(doc_id)
+        top = []
+        for score in sorted(buckets, reverse=True):
+            top.extend((doc_id, score) for doc_id in heapq.nsmallest(count - len(top), buckets[score]))
+            if len(top) >= count:
+                break
+        return top
+
+    def _name_scores(self, term):
+        scores = {}
+        for token in self._names.expand(term):
+            if token != term:
+                scores.update(dict.fromkeys(self._names.postings[token], NAME_PREFIX_SCORE))
+        exact = self._names.postings.get(term)
+        if exact:
+            scores.update(dict.fromkeys(exact, NAME_EXACT_SCORE))
+        return scores
+
+    def _content_scores(self, term):
+        """tf-idf style scores for whole-word content matches (below any name match)."""
+        posting = self._content.postings.get(term)
+        if not posting:
+            return {}
+        idf = math.log(1 + len(self._docs) / len(posting))
+        return {doc_id: min(1.0, math.log1p(count) * idf / 10) for doc_id, count in posting.items()}
+
+
+def read_text(path, limit=MAX_CONTENT_BYTES):
+    """The first limit bytes of a text file, decoded leniently (None if it can't be read)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(limit).decode("utf-8", errors="replace")
+    except OSError:
+        return None
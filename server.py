@@ -3,8 +3,29 @@ import os
 import hashlib
 import threading
 import mimetypes
-from collections import defaultdict
+import json
+import zlib
+import signal
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from analysis import NetworkAnalysis
+from protocol import (FRAME_HEADER, recv_exact, send_frame, recv_frame, send_json, recv_json, send_from_file,
+                      stream_bytes, ChunkedReader, ChunkedWriter)
+from integrity import DigestCache, IntegrityError, choose_algorithm, hash_file, new_hasher, supported_algorithms
+import tree
+import durability
+from durability import DEFAULT_FSYNC_POLICY, GroupCommitter
+from shaping import PRIORITY_BYTES, SHAPED_CHUNK
+from scheduling import DEFAULT_BULK_SLOTS, IoScheduler
+from storage import LocalStorage
+from catalog import CATALOG_FILE, DEFAULT_QUERY_LIMIT, Catalog
+from search import DEFAULT_PAGE_SIZE, SearchIndex, read_text
+from cluster import MOVED_PREFIX, parse_node
+from client import FileClient
+from replication import HEARTBEAT_INTERVAL, ChangeLog
+from profiling import Instrumentation, SamplingProfiler
+from tls import describe_connection
+from auth import Authenticator, MemoryUserStore, SessionManager, TOKEN_PREFIX, DEFAULT_SESSION_TTL
 import time
 
 # --- CONSTANTS ---
@@ -12,10 +33,19 @@ IP = socket.gethostbyname(socket.gethostname())
 PORT = 4450
 ADDR = (IP, PORT)
 SIZE = 1024
+CHUNK_SIZE = 64 * 1024  # Buffer size for bulk file data (control messages still use SIZE)
 FORMAT = "utf-8"
 SERVER_DATA_PATH = "server_data"
-
-# Simple user dictionary (username: hashed_password)
+SERVER_STATS_FILE = "server_network_stats.csv"
+ADMIN_USERS = {"admin"}  # Users allowed to run PROFILE@... admin commands
+# Writes a read-only replica refuses (DELETE@name and SUBFOLDER@... are single messages; the rest stream data)
+REPLICA_REJECTED_COMMANDS = {"UPLOAD", "STREAM_UPLOAD", "BATCH_UPLOAD", "TREE_UPLOAD", "CLUSTER_PUT", "DELETE",
+                             "SUBFOLDER"}
+DRAIN_TIMEOUT = 30  # Seconds drain() lets in-flight commands run before closing their connections
+DRAIN_POLL = 0.1  # Seconds between checks for finished sessions while draining
+UNKNOWN_SIZE = float("inf")  # Pacing size for streamed uploads, whose length isn't known up front (always bulk)
+
+# Default users seeded into the user store (username: sha256 of the password, as sent by the client)
 USERS = {
     "admin": "ef92b778bafe771e89245b89ecbc08a44a4e166c06659911881f383d4473e94f",
     "user1": "ef92b778bafe771e89245b89ecbc08a44a4e166c06659911881f383d4473e94f"
@@ -44,11 +74,19 @@ def get_file_type_prefix(filename):
 
 
 class FileServer:
-    def __init__(self, ip=IP, port=PORT, data_path=SERVER_DATA_PATH, log_callback=None):
+    def __init__(self, ip=IP, port=PORT, data_path=SERVER_DATA_PATH, log_callback=None,
+                 stats_file=SERVER_STATS_FILE, instrumentation=None, profile_dir=".", user_store=None,
+                 session_ttl=DEFAULT_SESSION_TTL, ssl_context=None, fsync_policy=DEFAULT_FSYNC_POLICY,
+                 rate_limits=None, bulk_slots=DEFAULT_BULK_SLOTS, storage=None, catalog_file=CATALOG_FILE,
+                 index_content=True, cluster=None, changelog_file=None, replica_of=None):
         self.ip = ip
         self.port = port
         self.addr = (ip, port)
-        self.data_path = data_path
+        # Pluggable backend (storage.LocalStorage by default, or storage.TieredStorage); data_path is its local root
+        self.storage = storage or LocalStorage(data_path)
+        self.data_path = self.storage.root
+        self.stats_file = stats_file  # None disables writing the CSV on stop()
+        self.ssl_context = ssl_context  # tls.create_server_context(...) enables TLS on every connection
 
         # New logging attribute
         self.log_callback = log_callback
@@ -56,8 +94,19 @@ class FileServer:
         self.server = None
         self.server_analyzer = NetworkAnalysis(role="Server", address=f"{self.ip}:{self.port}")
 
+        # Opt-in hot path spans and the on-demand sampling profiler
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
+        self.profiler = SamplingProfiler(output_dir=profile_dir)
+
+        # Pluggable user store, off-thread credential verification and resumable sessions
+        self.user_store = user_store or MemoryUserStore.from_digests(USERS)
+        self.authenticator = Authenticator(self.user_store)
+        self.sessions = SessionManager(ttl=session_ttl)
+        self.user_store.on_change(self._user_changed)
+
         # --- MISSING ATTRIBUTES TO ADD (The "rest of __init__") ---
         self.shutdown_flag = threading.Event()
+        self.draining = threading.Event()  # Set by stop_accepting()/drain(): no new connections or commands
 
         # Threading Locks and State
         self.counter_lock = threading.Lock()
@@ -68,63 +117,246 @@ class FileServer:
         self.active_clients = {}
         self.file_counters = defaultdict(int)
         self.files_in_use = set()
+        self._names_handed_off = False  # Set by handoff_state(): a successor process mints new names now
+
+        # Dashboard counters: bytes moved by sessions that have ended, and downloads per file since the last
+        # take_file_hits()
+        self.closed_session_bytes = 0
+        self.file_hits = Counter()
         # -----------------------------------------------------------
 
+        # Digests of stored files, so downloads of unchanged files skip rehashing
+        self.digest_cache = DigestCache()
+
+        # Uploads land in temp files and are renamed into place under this fsync policy
+        self.committer = GroupCommitter(fsync_policy)
+
+        # Optional shaping.RateLimits (global, per user, per connection); None leaves transfers unshaped
+        self.rate_limits = rate_limits
+
+        # Control/metadata operations go ahead of bulk transfer chunks, which are shared fairly across sessions
+        self.scheduler = IoScheduler(bulk_slots)
+
+        # Optional cluster.ClusterMembership: this node only mints and serves names it owns on the hash ring
+        self.cluster = cluster
+        self._rebalance_lock = threading.Lock()
+        self._rebalance_pending = False
+        self._rebalance_thread = None
+
+        # Primary: changelog_file (e.g. replication.CHANGELOG_FILE) records committed changes for replicas.
+        # Replica: replica_of is a replication.Follower that applies a primary's changes; clients can only read.
+        self.replica_of = replica_of
+        self._replicas = {}  # addr -> last change streamed to that replica
+
         # Initial setup
         self._setup_data_directory()
+        self.changelog = ChangeLog(os.path.join(self.data_path, changelog_file)) if changelog_file else None
+        # Metadata catalog (original names, owners, digests, access counts); catalog_file=None disables it
+        self.catalog = Catalog(os.path.join(self.data_path, catalog_file)) if catalog_file else None
+        self._reconcile_catalog()
+        # SEARCH index over file names, plus the content of text (TS) files unless index_content is False
+        self.index_content = index_content
+        self.search_index = SearchIndex()
+        self._build_search_index()
         self._get_existing_file_count()
 
     # --- Setup Methods ---
 
     def _setup_data_directory(self):
         """Create the server data directory if it doesn't exist"""
-        if not os.path.exists(self.data_path):
-            os.makedirs(self.data_path)
+        self.storage.setup()
+
+    def _reconcile_catalog(self):
+        """Catalog files stored before the catalog existed and forget ones removed behind its back"""
+        if not self.catalog:
+            return
+        added, removed = self.catalog.reconcile(self.storage.files(), lambda name: mimetypes.guess_type(name)[0])
+        if added or removed:
+            self._log(f"[INIT] Catalog reconciled: {added} added, {removed} removed.")
+
+    def _build_search_index(self):
+        """Index every stored name now; text content is indexed by a background thread"""
+        originals = self.catalog.original_names() if self.catalog else {}
+        files = self.storage.files()
+        for name, size in files.items():
+            self.search_index.add(name, originals.get(name), size)
+        self._log(f"[INIT] Search index built for {len(files)} files.")
+        if self.index_content:
+            text_files = [name for name in files if get_file_type_prefix(name) == 'TS']
+            if text_files:
+                threading.Thread(target=self._index_existing_content, args=(text_files,),
+                                 name="SearchIndexer", daemon=True).start()
+
+    def _index_existing_content(self, names):
+        # Reads the local path only, so files demoted to a cold tier are not promoted just to be indexed
+        for name in names:
+            if self.shutdown_flag.is_set():
+                return
+            text = read_text(self.storage.path(name))
+            if text:
+                self.search_index.set_content(name, text)
+        self._log(f"[INIT] Search content index built for {len(names)} text files.")
+
+    def _index_file(self, logical_filename, original_filename, size):
+        """Add a newly stored file to the search index (with its content if it is a text file)"""
+        text = None
+        if self.index_content and get_file_type_prefix(logical_filename) == 'TS':
+            with self.instrumentation.span("search_index"):
+                text = read_text(self.storage.path(logical_filename))
+        self.search_index.add(logical_filename, original_filename, size, text)
 
     def _get_existing_file_count(self):
         # ...
         with self.counter_lock:  # <-- **ERROR:** self.counter_lock is not defined
-            for filename in os.listdir(self.data_path):
-                if len(filename) >= 5:
-                    prefix = filename[:2]
-                    try:
-                        num = int(filename[2:5])
-                        if num > self.file_counters[prefix]:
-                            self.file_counters[prefix] = num # <-- **ERROR:** self.file_counters is not defined
-                    except ValueError:
-                        pass
+            for filename in self.storage.names():
+                self._note_logical_name_locked(filename)
         self._log(f"[INIT] File counters initialized: {dict(self.file_counters)}")
 
+    def _note_logical_name_locked(self, filename):
+        """Keep the counter of filename's type prefix at or above its number (caller holds counter_lock)"""
+        if len(filename) >= 5:
+            prefix = filename[:2]
+            try:
+                num = int(filename[2:5])
+                if num > self.file_counters[prefix]:
+                    self.file_counters[prefix] = num # <-- **ERROR:** self.file_counters is not defined
+            except ValueError:
+                pass
+
     def _generate_logical_filename(self, original_filename):
         """Generate logical filename with type prefix and counter"""
-        _, ext = os.path.splitext(original_filename)
-        prefix = get_file_type_prefix(original_filename)
-
-        with self.counter_lock:
-            self.file_counters[prefix] += 1
-            counter = self.file_counters[prefix]
+        return self._generate_logical_filenames([original_filename])[0]
+
+    def _generate_logical_filenames(self, original_filenames):
+        """Generate logical filenames for a batch while taking counter_lock once"""
+        prefixed = [(get_file_type_prefix(name), os.path.splitext(name)[1]) for name in original_filenames]
+        logical_filenames = []
+
+        if self.cluster and not self.cluster.is_member:
+            raise RuntimeError(f"{MOVED_PREFIX}{self.cluster.owner(original_filenames[0])}")
+
+        with self.instrumentation.acquire(self.counter_lock, "lock_wait:counter_lock"):
+            if self._names_handed_off:
+                raise RuntimeError("Server is restarting; retry the upload.")
+            for prefix, ext in prefixed:
+                while True:
+                    self.file_counters[prefix] += 1
+                    if not self.cluster:
+                        logical_filename = f"{prefix}{self.file_counters[prefix]:03d}{ext}"
+                        break
+                    # The node tag keeps names unique after ownership moves; skipping numbers owned by other
+                    # nodes keeps every name on the node that minted it until the ring changes
+                    logical_filename = f"{prefix}{self.file_counters[prefix]:03d}-{self.cluster.name_tag}{ext}"
+                    if self.cluster.owns(logical_filename):
+                        break
+                logical_filenames.append(logical_filename)
 
-        return f"{prefix}{counter:03d}{ext}"
+        return logical_filenames
 
     # --- Client Pool Management ---
 
-    def _add_client_to_pool(self, addr, username):
-        """Add client to connection pool"""
+    def _add_client_to_pool(self, addr, username, conn=None):
+        """Add client to connection pool. Returns its session entry."""
         with self.clients_lock:
-            self.active_clients[addr] = {
+            session = self.active_clients[addr] = {
                 'username': username,
-                'connected_at': threading.current_thread().name
+                'conn': conn,
+                'closing': False,  # Set by drain() when it closes this session while idle
+                'connected_at': threading.current_thread().name,
+                'connected_since': time.time(),
+                'operation': None,  # Command being handled, for the dashboard
+                'bytes': 0,  # File data sent and received; only this session's thread writes it
+                'stream': None,  # Tree transfer in progress, counted separately until it ends
+                'shaper': self.rate_limits.shaper_for(username) if self.rate_limits else None
             }
             self._log(f"[CLIENT POOL] Added {username}@{addr}. Total clients: {len(self.active_clients)}")
+        return session
 
     def _remove_client_from_pool(self, addr):
         """Remove client from connection pool"""
         with self.clients_lock:
             if addr in self.active_clients:
                 username = self.active_clients[addr]['username']
-                del self.active_clients[addr]
+                self.closed_session_bytes += self.active_clients.pop(addr)['bytes']
+                self.scheduler.forget(addr)
                 self._log(f"[CLIENT POOL] Removed {username}@{addr}. Total clients: {len(self.active_clients)}")
 
+    def _transfer_throttle(self, addr, size):
+        """Per-chunk rate limiting callback for a transfer of size bytes on this connection (None if unshaped)"""
+        with self.clients_lock:
+            client = self.active_clients.get(addr)
+        shaper = client and client.get('shaper')
+        return shaper.for_transfer(size) if shaper else None
+
+    @contextmanager
+    def _transfer_pacing(self, addr, size):
+        """Per-chunk callback applying rate limits and fair bulk scheduling to one transfer (None if neither applies)
+
+        Also counts the transfer's bytes for the dashboard: per chunk for bulk transfers, all at once at the end
+        for small ones (which keeps their zero-copy path).
+        """
+        with self.clients_lock:
+            session = self.active_clients.get(addr)
+        throttle = self._transfer_throttle(addr, size)
+        if size <= PRIORITY_BYTES:
+            # Small files skip the bulk lane: no slot per chunk. They don't enter interactive() either, which
+            # would hold back every bulk transfer for as long as a slow client takes to read the file
+            try:
+                yield throttle
+            finally:
+                if session is not None:
+                    session['bytes'] += size
+            return
+        stream = self.scheduler.stream(addr)
+
+        def pace(nbytes):
+            if throttle is not None:
+                stream.release()  # Don't hold a bulk slot while sleeping for tokens
+                throttle(nbytes)
+            stream(nbytes)
+            if session is not None:
+                session['bytes'] += nbytes
+
+        try:
+            yield pace
+        finally:
+            stream.close()
+
+    @contextmanager
+    def _counted_stream(self, addr, stream):
+        """Show a tree transfer's ChunkedReader/ChunkedWriter byte count on the dashboard while it runs"""
+        with self.clients_lock:
+            session = self.active_clients.get(addr)
+        if session is None:
+            yield
+            return
+        session['stream'] = stream
+        try:
+            yield
+        finally:
+            session['stream'] = None
+            session['bytes'] += stream_bytes(stream)
+
+    def _record_hit(self, filename):
+        with self.counter_lock:
+            self.file_hits[filename] += 1
+
+    def take_file_hits(self):
+        """Downloads per file since the previous call, as a Counter (the dashboard samples this)."""
+        with self.counter_lock:
+            hits, self.file_hits = self.file_hits, Counter()
+        return hits
+
+    def _username(self, addr):
+        with self.clients_lock:
+            client = self.active_clients.get(addr)
+        return client['username'] if client else None
+
+    def _catalog_entry(self, addr, logical_filename, original_filename, size, digest=None, algorithm=None):
+        return {"logical_name": logical_filename, "original_name": original_filename, "owner": self._username(addr),
+                "size": size, "mime": mimetypes.guess_type(original_filename)[0],
+                "digest": digest, "algorithm": algorithm if digest else None}
+
     def list_active_clients(self):
         """Return list of active clients"""
         with self.clients_lock:
@@ -132,8 +364,12 @@ class FileServer:
 
     # --- Core Server Methods ---
 
-    def start(self):
-        """Initialize and start the server listener thread"""
+    def start(self, listen_socket=None):
+        """Initialize and start the server listener thread
+
+        listen_socket is an already bound and listening socket to accept on instead of binding
+        (handoff.receive_handoff() gets one from the process being replaced).
+        """
         if self.server:
             self._log("[ERROR] Server is already running.")
             return
@@ -141,17 +377,31 @@ class FileServer:
         self._log(f"[STARTING] Server is starting on {self.ip}:{self.port}...")
 
         try:
-            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server.bind(self.addr)
-            self.server.listen()
+            if listen_socket is None:
+                self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.server.bind(self.addr)
+                self.server.listen()
+                # Not when taking over: temp files are then uploads the previous process is still receiving
+                removed = durability.remove_stale_temp_files(self.data_path)
+                if removed:
+                    self._log(f"[INIT] Removed {removed} incomplete upload(s) left by a previous run.")
+            else:
+                self.server = listen_socket
+            # Port 0 asks the OS for an ephemeral port; report the one we actually got
+            self.port = self.server.getsockname()[1]
+            self.addr = (self.ip, self.port)
             self.server.settimeout(1.0)
 
             self.shutdown_flag.clear()
+            self.draining.clear()
+            self._names_handed_off = False
             self.accept_thread = threading.Thread(target=self._accept_clients_loop, name="AcceptThread")
             self.accept_thread.start()
 
             self._log(f"[LISTENING] Server is listening on {self.ip}:{self.port}")
+            if self.replica_of:
+                self.replica_of.start(self)
             return True
 
         except Exception as e:
@@ -167,6 +417,7 @@ class FileServer:
 
         self._log("[STOPPING] Server shutdown initiated...")
         self.shutdown_flag.set()
+        self.scheduler.abort()
 
         # Give the accept thread a moment to finish its current loop
         self.accept_thread.join(timeout=2)
@@ -174,16 +425,122 @@ class FileServer:
         # Close the server socket
         self.server.close()
         self.server = None
+        if self.replica_of:
+            self.replica_of.stop()
+        self.committer.close()
+        if self.catalog:
+            self.catalog.flush()
 
         # Save statistics
-        self.server_analyzer.save_stats(filename="server_network_stats.csv")
+        if self.stats_file:
+            self.server_analyzer.save_stats(filename=self.stats_file)
 
         self._log("[SHUTDOWN] Server closed.")
         self._log(f"[FINAL STATS] Total active clients at shutdown: {len(self.list_active_clients())}")
 
+    def stop_accepting(self):
+        """Stop accepting connections. The listening socket stays open until stop(), so new ones queue."""
+        self.draining.set()
+        if self.accept_thread is not threading.current_thread():
+            self.accept_thread.join()
+
+    def resume_accepting(self):
+        """Undo stop_accepting() (e.g. after a failed handoff). Sessions closed meanwhile stay closed."""
+        if not self.server or self.shutdown_flag.is_set() or not self.draining.is_set():
+            return
+        with self.counter_lock:
+            self._names_handed_off = False
+        self.draining.clear()
+        self.accept_thread = threading.Thread(target=self._accept_clients_loop, name="AcceptThread")
+        self.accept_thread.start()
+        self._log("[DRAIN] Accepting connections again.")
+
+    def close_idle_sessions(self):
+        """Disconnect sessions that are waiting for a command, so their clients reconnect. Returns how many.
+
+        Only meant while draining: busy sessions are left alone and end after their current command.
+        """
+        with self.clients_lock:
+            idle = [session for session in self.active_clients.values()
+                    if session['operation'] is None and not session['closing']]
+            for session in idle:
+                session['closing'] = True
+        for session in idle:
+            self._shutdown_connection(session['conn'])
+        return len(idle)
+
+    @staticmethod
+    def _shutdown_connection(conn):
+        # shutdown() rather than close(): wakes the session's blocked recv() and sends the client a FIN
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except (OSError, AttributeError):
+            pass
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """Stop without cutting off transfers: in-flight commands get up to `timeout` seconds to finish.
+
+        New connections are no longer accepted (they queue on the listening socket instead of being
+        refused), idle sessions are closed and busy ones close after their current command. Sessions
+        still busy at the deadline are cut off. Then the server stops. Returns the number cut off.
+        """
+        if not self.server:
+            self._log("[STOP] Server is not running.")
+            return 0
+
+        self._log(f"[DRAIN] Draining: no new connections, waiting up to {timeout}s for in-flight commands...")
+        self.stop_accepting()
+        deadline = time.monotonic() + timeout
+        closed = 0
+        while True:
+            closed += self.close_idle_sessions()
+            busy = [(addr, session) for addr, session in self.list_active_clients() if not session['closing']]
+            if not busy or time.monotonic() >= deadline:
+                break
+            time.sleep(DRAIN_POLL)
+        for addr, session in busy:
+            self._log(f"[DRAIN] Cutting off {session['username']} ({session['operation']}) at the deadline.")
+            self._shutdown_connection(session['conn'])
+            self.scheduler.abort(addr)  # A chunk queued for a bulk slot would not notice the closed socket
+        self._log(f"[DRAIN] Drained: {closed} idle session(s) closed, {len(busy)} cut off.")
+        self.stop()
+        return len(busy)
+
+    def handoff_state(self):
+        """Name counters and session tokens for a process taking over (see handoff.py).
+
+        From here on this server mints no new logical names, so the two processes can't hand out the same one.
+        """
+        with self.counter_lock:
+            self._names_handed_off = True
+            counters = dict(self.file_counters)
+        return {"file_counters": counters, "sessions": self.sessions.export()}
+
+    def adopt_state(self, state):
+        """Carry on from a handoff_state() of the process being replaced (call before start())"""
+        with self.counter_lock:
+            for prefix, count in state.get("file_counters", {}).items():
+                self.file_counters[prefix] = max(self.file_counters[prefix], count)
+        adopted = self.sessions.import_sessions(state.get("sessions", {}))
+        self._log(f"[HANDOFF] Adopted name counters and {adopted} session token(s).")
+
+    def catch_up(self):
+        """Pick up writes a predecessor made while it drained: search index entries and changelog head"""
+        files = self.storage.files()
+        indexed = set(self.search_index.names())
+        originals = self.catalog.original_names() if self.catalog and files.keys() - indexed else {}
+        for name in files.keys() - indexed:
+            self._index_file(name, originals.get(name), files[name])
+        for name in indexed - files.keys():
+            self.search_index.remove(name)
+        if self.changelog:
+            self.changelog.refresh()
+        self._log(f"[HANDOFF] Caught up: {len(files.keys() - indexed)} file(s) indexed, "
+                  f"{len(indexed - files.keys())} removed.")
+
     def _accept_clients_loop(self):
         """The main loop for accepting new client connections"""
-        while not self.shutdown_flag.is_set():
+        while not self.shutdown_flag.is_set() and not self.draining.is_set():
             try:
                 conn, addr = self.server.accept()
                 thread = threading.Thread(target=self._handle_client, args=(conn, addr), name=f"Client-{addr[1]}")
@@ -192,7 +549,7 @@ class FileServer:
             except socket.timeout:
                 continue
             except Exception as e:
-                if not self.shutdown_flag.is_set():
+                if not self.shutdown_flag.is_set() and not self.draining.is_set():
                     self._log(f"[ERROR in Accept Loop] {e}")
 
     # --- Client Handler Methods (Mostly unchanged logic, now prefixed with _) ---
@@ -210,14 +567,27 @@ class FileServer:
             print(full_message)
 
     def _authenticate_client(self, conn):
-        """Authenticate client with username and hashed password"""
+        """Authenticate client with username@hashed_password or a TOKEN@<session token>"""
         try:
             conn.send("Please authenticate to continue.".encode(FORMAT))
             credentials = conn.recv(SIZE).decode(FORMAT)
-            username, hashed_password = credentials.split("@")
+            username, secret = credentials.split("@", 1)
+
+            if username == TOKEN_PREFIX:
+                # Resumed session: a single dictionary lookup, no password hashing
+                username = self.sessions.resume(secret)
+                if username and self.user_store.get(username) is None:
+                    self.sessions.revoke(secret)  # Removed since the token was issued
+                    username = None
+                if username:
+                    conn.send(f"AUTH_SUCCESS@{secret}".encode(FORMAT))
+                    return True, username
+                conn.send("AUTH_FAILED".encode(FORMAT))
+                return False, None
 
-            if username in USERS and USERS[username] == hashed_password:
-                conn.send("AUTH_SUCCESS".encode(FORMAT))
+            if self.authenticator.verify(username, secret):
+                token = self.sessions.issue(username)
+                conn.send(f"AUTH_SUCCESS@{token}".encode(FORMAT))
                 return True, username
             else:
                 conn.send("AUTH_FAILED".encode(FORMAT))
@@ -226,18 +596,38 @@ class FileServer:
             self._log(f"Authentication error: {e}")
             return False, None
 
+    def _user_changed(self, username):
+        """User store hook: session tokens stop working at once when a user is removed or their password replaced"""
+        revoked = self.sessions.revoke_user(username)
+        if revoked:
+            change = "removed" if self.user_store.get(username) is None else "changed password"
+            self._log(f"[AUTH] User '{username}' {change}; {revoked} session(s) revoked.")
+
+    @staticmethod
+    def _ready_message():
+        """READY plus the digest algorithms this server can verify"""
+        return f"READY@{','.join(supported_algorithms())}"
+
+    @staticmethod
+    def _parse_upload_metadata(data):
+        """Parse 'name@size' or 'name@size@algorithm' (names may themselves contain '@')"""
+        parts = data.rsplit("@", 2)
+        if len(parts) == 3 and parts[2] in supported_algorithms():
+            return parts[0], int(parts[1]), parts[2]
+        original_filename, filesize = data.rsplit("@", 1)
+        return original_filename, int(filesize), None
+
     def _handle_upload(self, conn, addr):
         """Handle file upload from client"""
         try:
-            conn.send("READY".encode(FORMAT))
+            conn.send(self._ready_message().encode(FORMAT))
             data = conn.recv(SIZE).decode(FORMAT)
-            original_filename, filesize = data.split("@")
-            filesize = int(filesize)
+            original_filename, filesize, algorithm = self._parse_upload_metadata(data)
 
             logical_filename = self._generate_logical_filename(original_filename)
-            filepath = os.path.join(self.data_path, logical_filename)
+            filepath = self.storage.path(logical_filename)
 
-            if os.path.exists(filepath):
+            if self.storage.exists(logical_filename):
                 conn.send("EXISTS".encode(FORMAT))
                 overwrite = conn.recv(SIZE).decode(FORMAT)
                 if overwrite.lower() != "yes":
@@ -245,14 +635,26 @@ class FileServer:
 
             conn.send("OK".encode(FORMAT))
 
-            with open(filepath, "wb") as f:
-                received = 0
-                while received < filesize:
-                    data = conn.recv(SIZE)
-                    if not data:
-                        break
-                    f.write(data)
-                    received += len(data)
+            # Readers never see a partial file: data goes to a temp file that is renamed when complete
+            temp_path = durability.temp_path_for(filepath)
+            try:
+                with open(temp_path, "wb") as f, self._transfer_pacing(addr, filesize) as pace:
+                    digest = self._receive_upload(conn, f, filesize, algorithm, pace)
+                self._commit_uploads([(temp_path, filepath)])
+                self.storage.stored(logical_filename)
+            except IntegrityError:
+                self._log(f"[{addr}] Integrity check failed for '{original_filename}' ({algorithm}).")
+                conn.send(f"ERROR: Integrity check failed for '{original_filename}'.".encode(FORMAT))
+                return
+            finally:
+                self._discard_temp(temp_path)
+            if digest:
+                self.digest_cache.put(filepath, algorithm, digest)
+            if self.catalog:
+                self.catalog.record(**self._catalog_entry(addr, logical_filename, original_filename, filesize,
+                                                          digest, algorithm))
+            self._index_file(logical_filename, original_filename, filesize)
+            self._log_change("put", logical_filename, original_name=original_filename, owner=self._username(addr))
 
             self._log(f"[{addr}] File '{original_filename}' uploaded as '{logical_filename}'.")
             conn.send(f"File uploaded successfully as '{logical_filename}'.".encode(FORMAT))
@@ -260,139 +662,999 @@ class FileServer:
             self._log(f"[{addr}] Upload error: {e}")
             conn.send(f"ERROR: Upload failed - {e}".encode(FORMAT))
 
+    def _handle_stream_upload(self, conn, addr):
+        """Handle an upload of unknown length: 'name' or 'name@algorithm', then ChunkedWriter frames"""
+        try:
+            conn.send(self._ready_message().encode(FORMAT))
+            data = conn.recv(SIZE).decode(FORMAT)
+            original_filename, _, algorithm = data.rpartition("@")
+            if algorithm not in supported_algorithms():
+                original_filename, algorithm = data, None
+
+            logical_filename = self._generate_logical_filename(original_filename)
+            filepath = self.storage.path(logical_filename)
+
+            if self.storage.exists(logical_filename):
+                conn.send("EXISTS".encode(FORMAT))
+                overwrite = conn.recv(SIZE).decode(FORMAT)
+                if overwrite.lower() != "yes":
+                    return
+
+            conn.send("OK".encode(FORMAT))
+
+            temp_path = durability.temp_path_for(filepath)
+            try:
+                with open(temp_path, "wb") as f, self._transfer_pacing(addr, UNKNOWN_SIZE) as pace:
+                    filesize, digest = self._receive_stream(conn, f, algorithm, pace)
+                self._commit_uploads([(temp_path, filepath)])
+                self.storage.stored(logical_filename)
+            except IntegrityError:
+                self._log(f"[{addr}] Integrity check failed for streamed '{original_filename}' ({algorithm}).")
+                conn.send(f"ERROR: Integrity check failed for '{original_filename}'.".encode(FORMAT))
+                return
+            finally:
+                self._discard_temp(temp_path)
+            if digest:
+                self.digest_cache.put(filepath, algorithm, digest)
+            if self.catalog:
+                self.catalog.record(**self._catalog_entry(addr, logical_filename, original_filename, filesize,
+                                                          digest, algorithm))
+            self._index_file(logical_filename, original_filename, filesize)
+            self._log_change("put", logical_filename, original_name=original_filename, owner=self._username(addr))
+
+            self._log(f"[{addr}] Stream '{original_filename}' ({filesize} bytes) uploaded as '{logical_filename}'.")
+            conn.send(f"File uploaded successfully as '{logical_filename}'.".encode(FORMAT))
+        except (ConnectionError, OSError) as e:
+            # The rest of the stream can't be skipped reliably once framing is lost; end the session
+            self._log(f"[{addr}] Stream upload aborted: {e}")
+            raise
+        except Exception as e:
+            self._log(f"[{addr}] Stream upload error: {e}")
+            conn.send(f"ERROR: Upload failed - {e}".encode(FORMAT))
+
+    def _receive_stream(self, conn, f, algorithm=None, throttle=None):
+        """Receive ChunkedWriter frames into an open temp file until the empty end frame, then verify them.
+
+        Returns (size, digest). Raises IntegrityError on a digest mismatch.
+        """
+        hasher = new_hasher(algorithm) if algorithm else None
+        size = 0
+        while True:
+            (length,) = FRAME_HEADER.unpack(recv_exact(conn, FRAME_HEADER.size))
+            if not length:
+                break
+            received = self._receive_into_file(conn, f, length, hasher, throttle)
+            size += received
+            if received < length:
+                raise ConnectionError(f"Connection closed after {received} of {length} bytes of a chunk")
+        digest = hasher.hexdigest() if hasher else None
+        if digest is not None and recv_frame(conn).decode(FORMAT) != digest:
+            raise IntegrityError("Integrity check failed.")
+        return size, digest
+
+    def _receive_upload(self, conn, f, size, algorithm=None, throttle=None, trailer=False):
+        """Receive one uploaded file into an open temp file and verify its digest trailer.
+
+        With trailer=True a trailer frame follows even without an algorithm (empty), and a trailer
+        starting with ERROR means the sender gave up on this file. Returns the digest (None without an
+        algorithm). Raises IntegrityError on a mismatch or an aborted file.
+        """
+        hasher = new_hasher(algorithm) if algorithm else None
+        received = self._receive_into_file(conn, f, size, hasher, throttle)
+        if received < size:
+            raise ConnectionError(f"Connection closed after {received} of {size} bytes")
+        digest = hasher.hexdigest() if hasher else None
+        if digest is not None or trailer:
+            sent = recv_frame(conn).decode(FORMAT)
+            if sent.startswith("ERROR"):
+                raise IntegrityError(sent.partition(": ")[2] or sent)
+            if digest is not None and sent != digest:
+                raise IntegrityError("Integrity check failed.")
+        return digest
+
+    def _commit_uploads(self, pairs):
+        """Fsync and rename finished temp files into place (grouped with other uploads)"""
+        with self.instrumentation.span("commit"):
+            self.committer.commit(pairs)
+        for _, filepath in pairs:
+            self.digest_cache.invalidate(filepath)
+
+    @staticmethod
+    def _discard_temp(temp_path):
+        """Remove a temp file that was not committed (no-op once it has been renamed)"""
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def _receive_into_file(self, conn, f, nbytes, hasher=None, throttle=None):
+        """Copy exactly nbytes from the socket into an open file, hashing inline. Returns the byte count received."""
+        span = self.instrumentation.span
+        buf = bytearray(CHUNK_SIZE)
+        view = memoryview(buf)
+        received = 0
+        while received < nbytes:
+            with span("net_recv"):
+                count = conn.recv_into(view, min(CHUNK_SIZE, nbytes - received))
+            if not count:
+                break
+            chunk = view[:count]
+            with span("disk_io"):
+                f.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            if throttle is not None:
+                throttle(count)
+            received += count
+        return received
+
+    def _drain(self, conn, nbytes, algorithm=None, trailer=False):
+        """Discard nbytes of incoming file data (and its trailer) so the stream stays in sync"""
+        buf = bytearray(CHUNK_SIZE)
+        remaining = nbytes
+        while remaining > 0:
+            count = conn.recv_into(buf, min(CHUNK_SIZE, remaining))
+            if not count:
+                raise ConnectionError("Connection closed while skipping file data")
+            remaining -= count
+        if algorithm or trailer:
+            recv_frame(conn)
+
+    def _handle_batch_upload(self, conn, addr):
+        """Handle a manifest of files streamed back to back, with per-file results at the end"""
+        try:
+            conn.send(self._ready_message().encode(FORMAT))
+            manifest = recv_json(conn)
+            entries = manifest["files"]
+            overwrite = str(manifest.get("overwrite", "no")).lower() == "yes"
+            # Every file is followed by a trailer frame: its digest (empty without an algorithm), or an
+            # ERROR message when the client could not send it whole
+            algorithm = manifest.get("algorithm")
+            if algorithm and algorithm not in supported_algorithms():
+                raise ValueError(f"Unsupported digest algorithm '{algorithm}'")
+
+            # One counter_lock acquisition for the whole batch
+            logical_filenames = self._generate_logical_filenames([entry["name"] for entry in entries])
+            results = []
+            staged = []  # (temp_path, filepath, result, digest, name) renamed into place together at the end
+
+            try:
+                self._receive_batch(conn, addr, entries, logical_filenames, overwrite, algorithm, results, staged)
+                self._commit_batch(addr, staged, algorithm)
+            finally:
+                for temp_path, *_ in staged:
+                    self._discard_temp(temp_path)
+
+            ok = sum(1 for result in results if result["status"] == "OK")
+            self._log(f"[{addr}] Batch upload: {ok}/{len(results)} files stored.")
+            send_json(conn, {"results": results})
+        except (ConnectionError, OSError) as e:
+            self._log(f"[{addr}] Batch upload aborted: {e}")
+            raise
+        except Exception as e:
+            self._log(f"[{addr}] Batch upload error: {e}")
+            send_json(conn, {"error": f"Batch upload failed - {e}", "results": []})
+
+    def _commit_batch(self, addr, staged, algorithm):
+        """Publish every received file of a batch in one commit group, then catalog them in one transaction"""
+        try:
+            self._commit_uploads([(temp_path, filepath) for temp_path, filepath, *_ in staged])
+        except OSError as e:
+            for _, _, result, _, _ in staged:
+                result.update(status="ERROR", message=f"Could not store file - {e}")
+            return
+        for _, filepath, _, digest, logical_filename in staged:
+            self.storage.stored(logical_filename)
+            if digest:
+                self.digest_cache.put(filepath, algorithm, digest)
+        if self.catalog:
+            self.catalog.record_many([
+                self._catalog_entry(addr, logical_filename, result["name"], result["size"], digest, algorithm)
+                for _, _, result, digest, logical_filename in staged])
+        for _, _, result, _, logical_filename in staged:
+            self._index_file(logical_filename, result["name"], result["size"])
+            self._log_change("put", logical_filename, original_name=result["name"], owner=self._username(addr))
+
+    def _receive_batch(self, conn, addr, entries, logical_filenames, overwrite, algorithm, results, staged):
+        """Receive every file of a batch into temp files, appending per-file results and staged renames"""
+        for entry, logical_filename in zip(entries, logical_filenames):
+            size = int(entry["size"])
+            filepath = self.storage.path(logical_filename)
+            result = {"name": entry["name"], "logical_name": logical_filename, "size": size}
+            results.append(result)
+
+            if self.storage.exists(logical_filename) and not overwrite:
+                self._drain(conn, size, algorithm, trailer=True)
+                result.update(status="SKIPPED", message="File exists on server.")
+                continue
+
+            temp_path = durability.temp_path_for(filepath)
+            try:
+                f = open(temp_path, "wb")
+            except OSError as e:
+                # Can't create this file: skip its bytes and carry on with the rest of the batch
+                self._drain(conn, size, algorithm, trailer=True)
+                result.update(status="ERROR", message=str(e))
+                continue
+            try:
+                with f, self._transfer_pacing(addr, size) as pace:
+                    digest = self._receive_upload(conn, f, size, algorithm, pace, trailer=True)
+            except IntegrityError as e:
+                self._discard_temp(temp_path)
+                result.update(status="ERROR", message=str(e))
+                continue
+            except BaseException:
+                self._discard_temp(temp_path)
+                raise
+
+            staged.append((temp_path, filepath, result, digest, logical_filename))
+            if digest:
+                result["digest"] = digest
+            result.update(status="OK", message=f"Uploaded as '{logical_filename}'.")
+
+    def _handle_batch_download(self, conn, addr):
+        """Stream many files back to back, each preceded by a header frame, then a summary frame"""
+        try:
+            conn.send("READY".encode(FORMAT))
+            request = recv_json(conn)
+            filenames = request["files"]
+            algorithm = choose_algorithm(request.get("algorithms", []))
+        except (ConnectionError, OSError):
+            raise
+        except Exception as e:
+            self._log(f"[{addr}] Batch download error: {e}")
+            send_json(conn, {"end": True, "error": f"Batch download failed - {e}"})
+            return
+
+        sent_ok = 0
+        for filename in filenames:
+            try:
+                self._client_name(filename)
+            except ValueError as e:
+                send_json(conn, {"name": filename, "status": "ERROR", "message": str(e)})
+                continue
+            with self.instrumentation.acquire(self.files_lock, "lock_wait:files_lock"):
+                busy = filename in self.files_in_use
+                if not busy:
+                    self.files_in_use.add(filename)
+            if busy:
+                send_json(conn, {"name": filename, "status": "ERROR", "message": "File is currently being processed."})
+                continue
+
+            try:
+                try:
+                    filepath = self.storage.fetch(filename)
+                    f = open(filepath, "rb")
+                except OSError:
+                    send_json(conn, {"name": filename, "status": "ERROR", "message": "File not found."})
+                    continue
+                with f:
+                    size = os.fstat(f.fileno()).st_size
+                    send_json(conn, {"name": filename, "status": "OK", "size": size, "algorithm": algorithm})
+                    with self._transfer_pacing(addr, size) as pace:
+                        self._send_file_with_digest(conn, f, filepath, size, algorithm, pace)
+                sent_ok += 1
+                self._record_hit(filename)
+                if self.catalog:
+                    self.catalog.record_access(filename)
+            finally:
+                with self.instrumentation.acquire(self.files_lock, "lock_wait:files_lock"):
+                    self.files_in_use.discard(filename)
+
+        send_json(conn, {"end": True, "sent": sent_ok, "requested": len(filenames)})
+        self._log(f"[{addr}] Batch download: {sent_ok}/{len(filenames)} files sent.")
+
+    def _send_file_with_digest(self, conn, f, filepath, size, algorithm, throttle=None):
+        """Send file data, then a digest trailer frame if an algorithm was negotiated.
+
+        A cached digest keeps the zero-copy sendfile() path; otherwise the data is
+        hashed inline while it is sent and the digest is cached for next time.
+        """
+        digest = self.digest_cache.get(filepath, algorithm) if algorithm else None
+        hasher = new_hasher(algorithm) if algorithm and digest is None else None
+        with self.instrumentation.span("net_send"):
+            send_from_file(conn, f, size, SHAPED_CHUNK if throttle else CHUNK_SIZE, hasher, throttle)
+        if hasher is not None:
+            digest = hasher.hexdigest()
+            self.digest_cache.put(filepath, algorithm, digest)
+        if algorithm:
+            send_frame(conn, digest.encode(FORMAT))
+
     def _handle_download(self, conn, addr):
         """Handle file download request"""
         filename = ""  # Initialize filename for finally block
         try:
-            conn.send("READY".encode(FORMAT))
+            conn.send(self._ready_message().encode(FORMAT))
             filename = conn.recv(SIZE).decode(FORMAT)
-            filepath = os.path.join(self.data_path, filename)
+            try:
+                self._client_name(filename)
+            except ValueError as e:
+                conn.send(f"ERROR: {e}".encode(FORMAT))
+                return
 
-            if not os.path.exists(filepath):
-                conn.send(f"ERROR: File '{filename}' not found.".encode(FORMAT))
+            if not self.storage.exists(filename):
+                conn.send(self._not_found_message(filename).encode(FORMAT))
                 return
 
-            with self.files_lock:
+            with self.instrumentation.acquire(self.files_lock, "lock_wait:files_lock"):
                 if filename in self.files_in_use:
                     conn.send(f"ERROR: File '{filename}' is currently being processed.".encode(FORMAT))
                     return
                 self.files_in_use.add(filename)
 
             try:
+                with self.instrumentation.span("disk_io"):
+                    filepath = self.storage.fetch(filename)  # Promotes cold files on tiered storage
                 filesize = os.path.getsize(filepath)
                 conn.send(str(filesize).encode(FORMAT))
-                conn.recv(SIZE)  # Wait for READY signal
-
-                with open(filepath, "rb") as f:
-                    while True:
-                        data = f.read(SIZE)
-                        if not data:
-                            break
-                        conn.send(data)
-
+                # Wait for READY signal; READY@algorithm (picked from our offer) asks for a digest trailer
+                ready = conn.recv(SIZE).decode(FORMAT)
+                algorithm = choose_algorithm(ready.split("@", 1)[1].split(",")) if "@" in ready else None
+
+                # sendfile() is zero-copy on plain sockets and on kTLS sockets; Python falls back
+                # to a read/send loop for user-space TLS
+                with open(filepath, "rb") as f, self._transfer_pacing(addr, filesize) as pace:
+                    self._send_file_with_digest(conn, f, filepath, filesize, algorithm, pace)
+
+                self._record_hit(filename)
+                if self.catalog:
+                    self.catalog.record_access(filename)
                 self._log(f"[{addr}] File '{filename}' downloaded.")
             finally:
-                with self.files_lock:
+                with self.instrumentation.acquire(self.files_lock, "lock_wait:files_lock"):
                     self.files_in_use.discard(filename)
         except Exception as e:
             self._log(f"[{addr}] Download error: {e}")
-            with self.files_lock:
+            with self.instrumentation.acquire(self.files_lock, "lock_wait:files_lock"):
                 self.files_in_use.discard(filename)
 
     def _handle_delete(self, conn, addr, filename):
         """Handle file deletion request"""
-        try:
-            filepath = os.path.join(self.data_path, filename)
+        with self.scheduler.interactive():
+            reply = self._delete_file(addr, filename)
+        conn.send(reply.encode(FORMAT))
 
-            if not os.path.exists(filepath):
-                conn.send(f"ERROR: File '{filename}' not found.".encode(FORMAT))
-                return
+    def _delete_file(self, addr, filename):
+        """Delete a stored file. Returns the reply for the client."""
+        try:
+            self._client_name(filename)
+        except ValueError as e:
+            return f"ERROR: {e}"
+        try:
+            if not self.storage.exists(filename):
+                return self._not_found_message(filename)
 
-            with self.files_lock:
+            with self.instrumentation.acquire(self.files_lock, "lock_wait:files_lock"):
                 if filename in self.files_in_use:
-                    conn.send(f"ERROR: File '{filename}' is currently being processed.".encode(FORMAT))
-                    return
+                    return f"ERROR: File '{filename}' is currently being processed."
 
-            os.remove(filepath)
+            self._forget_file(filename)
             self._log(f"[{addr}] File '{filename}' deleted.")
-            conn.send(f"File '{filename}' deleted successfully.".encode(FORMAT))
+            return f"File '{filename}' deleted successfully."
         except Exception as e:
             self._log(f"[{addr}] Delete error: {e}")
-            conn.send(f"ERROR: Could not delete file - {e}".encode(FORMAT))
+            return f"ERROR: Could not delete file - {e}"
+
+    def _not_found_message(self, filename):
+        """ERROR reply for a missing file; in a cluster, names owned by another node point the client there"""
+        if self.cluster and not self.cluster.owns(filename):
+            return f"ERROR: File '{filename}' is on another node. {MOVED_PREFIX}{self.cluster.owner(filename)}"
+        return f"ERROR: File '{filename}' not found."
+
+    def _forget_file(self, filename):
+        """Remove a stored file with its cached digest, catalog entry and search entry"""
+        with self.instrumentation.span("disk_io"):
+            self.storage.remove(filename)
+        self.digest_cache.invalidate(self.storage.path(filename))
+        if self.catalog:
+            self.catalog.remove(filename)
+        self.search_index.remove(filename)
+        self._log_change("delete", filename)
+
+    def _log_change(self, op, name, **info):
+        """Append a committed change to the replication log (no-op unless this server is a primary)"""
+        if self.changelog:
+            self.changelog.append(op, name, **info)
 
     def _handle_dir(self, conn, addr):
         """Handle directory listing request"""
         try:
-            items = []
-            # ... (DIR formatting logic is the same)
-            items.append(f"{'Filename':<20} {'Type':<10} {'Size (bytes)':<15}")
-            items.append("-" * 50)
+            # Listed from the storage backend so files on every tier show up
+            with self.scheduler.interactive():
+                response = tree.format_listing(self.storage.files(), self.storage.folders(), self.data_path)
 
-            type_map = {
-                'TS': 'Text', 'VS': 'Video', 'IS': 'Image', 'AS': 'Audio',
-                'PS': 'PDF', 'DS': 'Document', 'FS': 'File'
-            }
+            # Length-prefixed so listings larger than SIZE are not truncated
+            send_frame(conn, response.encode(FORMAT))
+            self._log(f"[{addr}] Directory listing sent.")
+        except Exception as e:
+            self._log(f"[{addr}] Dir error: {e}")
+            send_frame(conn, f"ERROR: Could not list directory - {e}".encode(FORMAT))
 
-            for root, dirs, files in os.walk(self.data_path):
-                level = root.replace(self.data_path, '').count(os.sep)
-                indent = ' ' * 2 * level
-                rel_path = os.path.relpath(root, self.data_path)
+    def _handle_list(self, conn, addr):
+        """DIR as data ({name: size} and folder names), for clients that merge listings from several nodes"""
+        try:
+            with self.scheduler.interactive():
+                listing = {"files": self.storage.files(), "folders": sorted(self.storage.folders())}
+        except Exception as e:
+            self._log(f"[{addr}] List error: {e}")
+            listing = {"error": f"Could not list directory - {e}"}
+        send_json(conn, listing)
+
+    def _resolve_tree_root(self, path):
+        """Map a client-supplied folder path to a directory inside data_path"""
+        path = (path or "").strip("/")
+        return tree.safe_join(self.data_path, self._client_name(path)) if path else self.data_path
+
+    def _client_name(self, name):
+        """Check a file or folder name sent by a client: no escaping data_path, no bookkeeping (.ft_) files.
+
+        The catalog and changelog databases live in data_path, so without this DOWNLOAD and DELETE would reach
+        them. Raises ValueError; returns name.
+        """
+        tree.safe_join(self.data_path, name)
+        if tree.has_internal_part(name):
+            raise ValueError(f"'{name}' is a reserved name.")
+        return name
+
+    def _handle_tree_upload(self, conn, addr):
+        """Receive a whole directory tree as one (optionally compressed) tar stream"""
+        try:
+            conn.send("READY".encode(FORMAT))
+            request = recv_json(conn)
+            compression = request.get("compression", "none")
+            if compression not in tree.COMPRESSIONS:
+                raise ValueError(f"Unsupported compression '{compression}'")
+            root = self._resolve_tree_root(request.get("path"))
+            os.makedirs(root, exist_ok=True)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            send_json(conn, {"status": "ERROR", "message": str(e)})
+            return
 
-                if rel_path == '.':
-                    items.append(f"\n[{self.data_path}]")
-                else:
-                    items.append(f"{indent}[{os.path.basename(root)}/]")
-
-                sub_indent = ' ' * 2 * (level + 1)
-                for file in sorted(files):
-                    file_type = file[:2] if len(file) >= 2 else "??"
-                    type_name = type_map.get(file_type, 'Unknown')
-                    filepath = os.path.join(root, file)
-                    size = os.path.getsize(filepath)
-                    items.append(f"{sub_indent}{file:<20} {type_name:<10} {size:<15}")
-
-            if len(items) <= 2:
-                response = "Directory is empty."
+        # Tell the client where an interrupted upload into this folder stopped
+        send_json(conn, {"status": "OK", "resume_after": tree.read_marker(root) if request.get("resume") else None})
+
+        reader = ChunkedReader(conn)
+        try:
+            prefix = f"{(request.get('path') or '').strip('/')}/".lstrip("/")
+
+            track = request.get("resume_marker", True)  # Partial uploads (syncs) must not leave resume markers
+
+            def on_file(rel_path):
+                if track:
+                    tree.write_marker(root, rel_path)
+                name = prefix + rel_path
+                self.digest_cache.invalidate(self.storage.path(name))
+                self.storage.stored(name)
+                size = self.storage.size(name)
+                if self.catalog:
+                    self.catalog.record(**self._catalog_entry(addr, name, rel_path.rpartition("/")[2], size))
+                self._index_file(name, rel_path.rpartition("/")[2], size)
+                self._log_change("put", name, original_name=rel_path.rpartition("/")[2], owner=self._username(addr))
+
+            with self.instrumentation.span("disk_io"), self._counted_stream(addr, reader):
+                files, total = tree.extract_tree(reader, root, compression, on_file=on_file)
+            reader.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # Bad archive or path: skip the rest of the stream so the session stays usable
+            reader.drain()
+            self._log(f"[{addr}] Tree upload error: {e}")
+            send_json(conn, {"status": "ERROR", "message": f"Tree upload failed - {e}"})
+            return
+
+        if track:
+            tree.clear_marker(root)
+        if self.cluster:
+            self._start_rebalance()  # Tree files keep their paths; hand the ones other nodes own to them
+        self._log(f"[{addr}] Tree upload into '{request.get('path') or '.'}': {files} files, {total} bytes.")
+        send_json(conn, {"status": "OK", "files": files, "bytes": total})
+
+    def _handle_tree_download(self, conn, addr):
+        """Stream a whole subtree back as one (optionally compressed) tar stream"""
+        try:
+            conn.send("READY".encode(FORMAT))
+            request = recv_json(conn)
+            compression = request.get("compression", "none")
+            if compression not in tree.COMPRESSIONS:
+                raise ValueError(f"Unsupported compression '{compression}'")
+            root = self._resolve_tree_root(request.get("path"))
+            rel_dir = (request.get("path") or "").strip("/")
+            if not self.storage.isdir(rel_dir):
+                raise FileNotFoundError(f"Folder '{request.get('path')}' not found.")
+            paths = request.get("paths")  # Only these files (relative to path), e.g. what a sync needs
+            if paths is not None:
+                for rel_path in paths:
+                    tree.safe_join(root, self._client_name(rel_path))
+            if request.get("resume_after"):
+                self._client_name(request["resume_after"])
+            # Tree archives are read from the local root, so bring back any demoted files first
+            with self.instrumentation.span("disk_io"):
+                self.storage.prepare_tree(rel_dir)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            send_json(conn, {"status": "ERROR", "message": str(e)})
+            return
+
+        send_json(conn, {"status": "OK"})
+        if paths is not None:
+            rel_paths = iter(paths)
+        else:
+            rel_paths = tree.skip_past(root, tree.iter_tree(root), request.get("resume_after"))
+        writer = ChunkedWriter(conn)
+        try:
+            with self.instrumentation.span("net_send"), self._counted_stream(addr, writer):
+                files, total = tree.write_tree(writer, root, rel_paths, compression)
+        finally:
+            self.storage.rebalance()
+        writer.close()
+        send_json(conn, {"status": "OK", "files": files, "bytes": total})
+        self._log(f"[{addr}] Tree download of '{request.get('path') or '.'}': {files} files, {total} bytes.")
+
+    def _handle_manifest(self, conn, addr):
+        """Send {name: [size, mtime_ns]} for a folder (zlib-compressed JSON) so sync clients can diff in one request.
+
+        A client that already holds the folder's manifest sends its token as "expect"; if nothing changed,
+        only the token is sent back. "paths" limits the listing to some files, and "digests" asks for the
+        digests (with "algorithm") of files the client can't match by size and mtime alone.
+        """
+        try:
+            conn.send("READY".encode(FORMAT))
+            request = recv_json(conn)
+            rel_dir = (request.get("path") or "").strip("/")
+            if rel_dir:
+                self._client_name(rel_dir)
+            with self.instrumentation.span("disk_io"):
+                manifest = self.storage.manifest(rel_dir) if not rel_dir or self.storage.isdir(rel_dir) else {}
+            token = tree.manifest_token(manifest)
+            unchanged = request.get("expect") == token
+            if unchanged:
+                files = {}
+            elif request.get("paths") is not None:
+                files = {name: manifest[name] for name in request["paths"] if name in manifest}
             else:
-                response = "\n".join(items)
+                files = manifest
+
+            digests = {}
+            algorithm = request.get("algorithm")
+            if request.get("digests"):
+                if algorithm not in supported_algorithms():
+                    raise ValueError(f"Unsupported digest algorithm '{algorithm}'")
+                prefix = f"{rel_dir}/" if rel_dir else ""
+                for name in request["digests"]:
+                    if name in manifest:
+                        digests[name] = self._file_digest(prefix + name, algorithm)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            send_json(conn, {"status": "ERROR", "message": str(e)})
+            return
 
-            conn.send(response.encode(FORMAT))
-            self._log(f"[{addr}] Directory listing sent.")
+        send_json(conn, {"status": "OK", "token": token, "count": len(manifest), "unchanged": unchanged})
+        send_frame(conn, zlib.compress(json.dumps({"files": files, "digests": digests},
+                                                  separators=(",", ":")).encode(FORMAT)))
+        self._log(f"[{addr}] Manifest of '{rel_dir or '.'}': {len(manifest)} files"
+                  f"{' (unchanged)' if unchanged else ''}, {len(digests)} digests.")
+
+    def _file_digest(self, name, algorithm):
+        """Digest of a stored file, from the digest cache when it is still valid"""
+        filepath = self.storage.fetch(name)
+        digest = self.digest_cache.get(filepath, algorithm)
+        if digest is None:
+            with self.instrumentation.span("disk_io"):
+                digest = hash_file(filepath, algorithm)
+            self.digest_cache.put(filepath, algorithm, digest)
+        return digest
+
+    def _handle_catalog(self, conn, addr):
+        """Answer a metadata query (owner, original name, time range) from the catalog without touching the files"""
+        try:
+            conn.send("READY".encode(FORMAT))
+            query = recv_json(conn)
+            if not self.catalog:
+                raise RuntimeError("The file catalog is disabled on this server.")
+            # The query is read before entering the interactive lane, so a client that stalls doesn't hold it
+            with self.scheduler.interactive():
+                files = self.catalog.find(owner=query.get("owner"), original_name=query.get("original_name"),
+                                          since=query.get("since"), until=query.get("until"),
+                                          limit=min(int(query.get("limit") or DEFAULT_QUERY_LIMIT),
+                                                    DEFAULT_QUERY_LIMIT))
+        except ConnectionError:
+            raise
         except Exception as e:
-            self._log(f"[{addr}] Dir error: {e}")
-            conn.send(f"ERROR: Could not list directory - {e}".encode(FORMAT))
+            self._log(f"[{addr}] Catalog query error: {e}")
+            send_json(conn, {"error": f"Catalog query failed - {e}"})
+            return
+        send_json(conn, {"files": files})
+        self._log(f"[{addr}] Catalog query returned {len(files)} entries.")
+
+    def _handle_search(self, conn, addr):
+        """Answer one ranked page of a SEARCH over file names (and text content if asked) from the index"""
+        try:
+            conn.send("READY".encode(FORMAT))
+            query = recv_json(conn)
+            with self.instrumentation.span("search"), self.scheduler.interactive():
+                page = self.search_index.search(str(query.get("query") or ""),
+                                                content=bool(query.get("content")) and self.index_content,
+                                                offset=query.get("offset") or 0,
+                                                limit=query.get("limit") or DEFAULT_PAGE_SIZE)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            self._log(f"[{addr}] Search error: {e}")
+            send_json(conn, {"error": f"Search failed - {e}"})
+            return
+        send_json(conn, page)
+        self._log(f"[{addr}] Search '{query.get('query')}': {page['total']} matches.")
+
+    # --- Cluster ---
+
+    def _handle_ring(self, conn, addr):
+        """Describe the hash ring so clients can route names to their owners"""
+        if not self.cluster:
+            send_json(conn, {"error": "This server is not part of a cluster."})
+            return
+        send_json(conn, self.cluster.describe())
+
+    def _handle_ring_set(self, conn, addr, username):
+        """Admin: adopt a new ring version and move files this node no longer owns to their new owners"""
+        conn.send("READY".encode(FORMAT))
+        request = recv_json(conn)
+        if username not in ADMIN_USERS:
+            send_json(conn, {"error": "RING_SET requires an admin user."})
+            return
+        if not self.cluster:
+            send_json(conn, {"error": "This server is not part of a cluster."})
+            return
+        if self.cluster.update(request["nodes"], int(request["version"])):
+            self._log(f"[CLUSTER] Ring v{self.cluster.version} adopted from {addr}: {', '.join(request['nodes'])}")
+            self._start_rebalance()
+        send_json(conn, self.cluster.describe())
+
+    def _handle_cluster_put(self, conn, addr, username):
+        """Admin: store a file handed over by another node under its existing logical name"""
+        conn.send(self._ready_message().encode(FORMAT))
+        header = recv_json(conn)
+        name, size, algorithm = header["name"], int(header["size"]), header.get("algorithm")
+        try:
+            if username not in ADMIN_USERS:
+                raise PermissionError("CLUSTER_PUT requires an admin user.")
+            if algorithm and algorithm not in supported_algorithms():
+                raise ValueError(f"Unsupported digest algorithm '{algorithm}'")
+            self._client_name(name)  # Rejects absolute, escaping and bookkeeping names
+        except Exception as e:
+            send_json(conn, {"status": "ERROR", "message": str(e)})
+            return
+        if self.storage.exists(name):
+            # Keep what is here; the sender keeps its copy and reports the conflict
+            send_json(conn, {"status": "EXISTS", "message": f"'{name}' already exists on this node."})
+            return
+        send_json(conn, {"status": "OK"})
+
+        try:
+            self._store_exact(conn, addr, name, size, algorithm, header.get("original_name"), header.get("owner"))
+        except IntegrityError as e:
+            send_json(conn, {"status": "ERROR", "message": str(e)})
+            return
+        send_json(conn, {"status": "OK"})
+
+    def _store_exact(self, conn, addr, name, size, algorithm, original_name=None, owner=None):
+        """Receive a file (and digest trailer) from conn and store it under an existing logical name.
+
+        Used for cluster hand-overs and replicated puts. Raises IntegrityError on a digest mismatch.
+        """
+        filepath = tree.safe_join(self.data_path, name)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        temp_path = durability.temp_path_for(filepath)
+        try:
+            with open(temp_path, "wb") as f, self._transfer_pacing(addr, size) as pace:
+                digest = self._receive_upload(conn, f, size, algorithm, pace)
+            self._commit_uploads([(temp_path, filepath)])
+            self.storage.stored(name)
+        finally:
+            self._discard_temp(temp_path)
+        if digest:
+            self.digest_cache.put(filepath, algorithm, digest)
+        with self.counter_lock:
+            self._note_logical_name_locked(name)
+        original_name = original_name or name.rpartition("/")[2]
+        if self.catalog:
+            entry = self._catalog_entry(addr, name, original_name, size, digest, algorithm)
+            entry["owner"] = owner
+            self.catalog.record(**entry)
+        self._index_file(name, original_name, size)
+        self._log_change("put", name, original_name=original_name, owner=owner)
+
+    def _start_rebalance(self):
+        """Run (or re-run) the background hand-over of files this node no longer owns"""
+        with self._rebalance_lock:
+            self._rebalance_pending = True
+            if self._rebalance_thread is None:
+                self._rebalance_thread = threading.Thread(target=self._rebalance_loop, name="ClusterRebalance",
+                                                          daemon=True)
+                self._rebalance_thread.start()
+
+    def _rebalance_loop(self):
+        while not self.shutdown_flag.is_set():
+            with self._rebalance_lock:
+                if not self._rebalance_pending:
+                    self._rebalance_thread = None
+                    return
+                self._rebalance_pending = False
+            try:
+                self._rebalance_cluster()
+            except Exception as e:
+                self._log(f"[CLUSTER] Rebalance error: {e}")
+        with self._rebalance_lock:
+            self._rebalance_thread = None
+
+    def _rebalance_cluster(self):
+        """Hand every file whose ring owner is another node to that node, then drop the local copy"""
+        by_owner = defaultdict(list)
+        for name in self.storage.files():
+            owner = self.cluster.owner(name)
+            if owner != self.cluster.self_node:
+                by_owner[owner].append(name)
+        moved = kept = 0
+        for owner, names in by_owner.items():
+            host, port = parse_node(owner)
+            peer = FileClient(host, port, log_callback=lambda message: None, stats_file=None)
+            if not peer.connect() or peer.authenticate(self.cluster.peer_username,
+                                                       self.cluster.peer_password or "") != "AUTH_SUCCESS":
+                self._log(f"[CLUSTER] Could not log in to {owner}; {len(names)} files stay here for now.")
+                kept += len(names)
+                peer.disconnect()
+                continue
+            try:
+                for name in names:
+                    if self.shutdown_flag.is_set():
+                        return
+                    if self._hand_over(peer, owner, name):
+                        moved += 1
+                    else:
+                        kept += 1
+            finally:
+                peer.disconnect()
+        if moved or kept:
+            self._log(f"[CLUSTER] Rebalance for ring v{self.cluster.version}: {moved} files moved, {kept} kept.")
+
+    def _hand_over(self, peer, owner, name):
+        with self.files_lock:
+            if name in self.files_in_use:
+                return False
+            self.files_in_use.add(name)
+        try:
+            entry = self.catalog.get(name) if self.catalog else None
+            result = peer.cluster_put(self.storage.fetch(name), name, entry and entry["original_name"],
+                                      entry and entry["owner"])
+            if result.startswith("EXISTS"):
+                # The owner holds a different file under this name; routing only reaches the owner's copy,
+                # so keep ours and report it rather than let it silently become unreachable
+                self.cluster.conflicts[name] = f"{owner} already has '{name}'"
+                self._log(f"[CLUSTER] CONFLICT: '{name}' exists on its new owner {owner}; keeping the local copy.")
+                return False
+            if result != "OK":
+                self._log(f"[CLUSTER] Keeping '{name}' (owner {owner}): {result}")
+                return False
+            self.cluster.conflicts.pop(name, None)
+            self._forget_file(name)
+            return True
+        finally:
+            with self.files_lock:
+                self.files_in_use.discard(name)
+
+    # --- Replication ---
+
+    def _handle_replicate(self, conn, addr, username):
+        """Admin: stream changes after the replica's last applied seq, then follow new changes as they commit"""
+        conn.send(self._ready_message().encode(FORMAT))
+        request = recv_json(conn)
+        algorithm = request.get("algorithm")
+        if username not in ADMIN_USERS:
+            send_json(conn, {"error": "REPLICATE requires an admin user."})
+            return
+        if not self.changelog:
+            send_json(conn, {"error": "This server does not keep a change log (changelog_file is not set)."})
+            return
+        if algorithm and algorithm not in supported_algorithms():
+            send_json(conn, {"error": f"Unsupported digest algorithm '{algorithm}'"})
+            return
+        since = int(request.get("since") or 0)
+        send_json(conn, {"head": self.changelog.head})
+        self._log(f"[REPLICATION] Replica {addr} connected at change {since} (head {self.changelog.head}).")
+
+        with self.clients_lock:
+            self._replicas[addr] = since
+        try:
+            # A new replica, or one further behind than the retained log, needs a full copy first
+            if since == 0 or since < self.changelog.oldest() - 1 or since > self.changelog.head:
+                since = self._stream_snapshot(conn, addr, algorithm)
+            while not self.shutdown_flag.is_set() and not self.draining.is_set():
+                changes = self.changelog.since(since)
+                if not changes:
+                    if not self.changelog.wait(since, HEARTBEAT_INTERVAL):
+                        send_json(conn, {"op": "heartbeat", "head": self.changelog.head, "time": time.time()})
+                    continue
+                for change in changes:
+                    change["head"] = self.changelog.head
+                    if change["op"] == "put":
+                        self._stream_put(conn, addr, change, algorithm)
+                    else:
+                        send_json(conn, change)
+                    since = change["seq"]
+                with self.clients_lock:
+                    self._replicas[addr] = since
+        except (ConnectionError, OSError) as e:
+            self._log(f"[REPLICATION] Replica {addr} disconnected at change {since}: {e}")
+        finally:
+            with self.clients_lock:
+                self._replicas.pop(addr, None)
+
+    def _stream_snapshot(self, conn, addr, algorithm):
+        """Send every stored file as of the current head. Returns that head."""
+        head = self.changelog.head
+        files = self.storage.files()
+        self._log(f"[REPLICATION] Sending a snapshot of {len(files)} files to {addr}.")
+        send_json(conn, {"op": "snapshot", "files": files, "folders": sorted(self.storage.folders()), "head": head})
+        for name in files:
+            entry = self.catalog.get(name) if self.catalog else None
+            self._stream_put(conn, addr, {"op": "put", "seq": None, "name": name, "time": time.time(), "head": head,
+                                          "original_name": entry and entry["original_name"],
+                                          "owner": entry and entry["owner"]}, algorithm)
+        send_json(conn, {"op": "snapshot_end", "seq": head, "head": head})
+        return head
+
+    def _stream_put(self, conn, addr, change, algorithm):
+        """Send a put change with the file's current data (a skip if it has been deleted since)"""
+        try:
+            filepath = self.storage.fetch(change["name"])
+            f = open(filepath, "rb")
+        except OSError:
+            send_json(conn, dict(change, op="skip"))  # A later delete in the log removes it on the replica
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            send_json(conn, dict(change, size=size))
+            with self._transfer_pacing(addr, size) as pace:
+                self._send_file_with_digest(conn, f, filepath, size, algorithm, pace)
+
+    def _apply_replicated_snapshot(self, files, folders=()):
+        """Replica: drop local files the primary no longer has before its snapshot puts arrive"""
+        for name in set(self.storage.files()) - set(files):
+            self._forget_file(name)
+        for folder in folders:
+            if not self.storage.isdir(folder):
+                self.storage.makedirs(folder)
+
+    def _apply_replicated_change(self, sock, change, algorithm):
+        """Replica: apply one change from the primary's stream (reading the file data for puts)"""
+        op, name = change["op"], change["name"]
+        if op == "put":
+            self._store_exact(sock, None, name, int(change["size"]), algorithm, change.get("original_name"),
+                              change.get("owner"))
+        elif op == "delete":
+            if self.storage.exists(name):
+                self._forget_file(name)
+        elif op == "mkdir":
+            if not self.storage.isdir(name):
+                self.storage.makedirs(name)
+                self._log_change("mkdir", name)
+        elif op == "rmdir":
+            if self.storage.isdir(name):
+                try:
+                    self.storage.rmdir(name)
+                    self._log_change("rmdir", name)
+                except OSError as e:
+                    self._log(f"[REPLICA] Could not remove folder '{name}': {e}")
+
+    def replication_status(self):
+        """Role and lag: a replica reports how far behind its primary it is, a primary what it sent each replica"""
+        if self.replica_of:
+            return self.replica_of.status()
+        if self.changelog:
+            head = self.changelog.head
+            with self.clients_lock:
+                replicas = {f"{ip}:{port}": {"sent_seq": seq, "lag_entries": head - seq}
+                            for (ip, port), seq in self._replicas.items()}
+            return {"role": "primary", "head_seq": head, "replicas": replicas}
+        return {"role": "standalone"}
+
+    def _replica_write_error(self):
+        return f"ERROR: This server is a read-only replica; send writes to the primary at {self.replica_of.primary}."
 
     def _handle_subfolder(self, conn, addr, action, path):
         """Handle subfolder creation/deletion"""
-        try:
-            full_path = os.path.join(self.data_path, path)
+        with self.scheduler.interactive():
+            reply = self._subfolder(addr, action, path)
+        if reply:
+            conn.send(reply.encode(FORMAT))
 
+    def _subfolder(self, addr, action, path):
+        """Create or delete a folder. Returns the reply for the client (None for an unknown action)."""
+        try:
+            self._client_name(path.strip("/"))
+        except ValueError as e:
+            return f"ERROR: {e}"
+        try:
             if action == "CREATE":
-                if os.path.exists(full_path):
-                    conn.send(f"ERROR: Folder '{path}' already exists.".encode(FORMAT))
-                else:
-                    os.makedirs(full_path)
-                    self._log(f"[{addr}] Folder '{path}' created.")
-                    conn.send(f"Folder '{path}' created successfully.".encode(FORMAT))
+                if self.storage.exists(path) or self.storage.isdir(path):
+                    return f"ERROR: Folder '{path}' already exists."
+                self.storage.makedirs(path)
+                self._log_change("mkdir", path)
+                self._log(f"[{addr}] Folder '{path}' created.")
+                return f"Folder '{path}' created successfully."
 
             elif action == "DELETE":
-                if not os.path.exists(full_path):
-                    conn.send(f"ERROR: Folder '{path}' not found.".encode(FORMAT))
-                elif not os.path.isdir(full_path):
-                    conn.send(f"ERROR: '{path}' is not a directory.".encode(FORMAT))
-                else:
-                    os.rmdir(full_path)
-                    self._log(f"[{addr}] Folder '{path}' deleted.")
-                    conn.send(f"Folder '{path}' deleted successfully.".encode(FORMAT))
+                if not self.storage.exists(path) and not self.storage.isdir(path):
+                    return f"ERROR: Folder '{path}' not found."
+                elif not self.storage.isdir(path):
+                    return f"ERROR: '{path}' is not a directory."
+                self.storage.rmdir(path)
+                self._log_change("rmdir", path)
+                self._log(f"[{addr}] Folder '{path}' deleted.")
+                return f"Folder '{path}' deleted successfully."
 
         except OSError as e:
             if action == "DELETE":
-                conn.send(f"ERROR: Cannot delete folder (may not be empty) - {e}".encode(FORMAT))
-            else:
-                conn.send(f"ERROR: Folder operation failed - {e}".encode(FORMAT))
+                return f"ERROR: Cannot delete folder (may not be empty) - {e}"
+            return f"ERROR: Folder operation failed - {e}"
         except Exception as e:
             self._log(f"[{addr}] Subfolder error: {e}")
-            conn.send(f"ERROR: Operation failed - {e}".encode(FORMAT))
+            return f"ERROR: Operation failed - {e}"
+        return None
+
+    def _handle_profile(self, conn, addr, username, action):
+        """Admin command controlling instrumentation and the sampling profiler"""
+        if username not in ADMIN_USERS:
+            send_frame(conn, "ERROR: PROFILE commands require an admin user.".encode(FORMAT))
+            return
+
+        action = action.upper()
+        if action == "START":
+            self.instrumentation.enabled = True
+            started = self.profiler.start()
+            response = "Profiling started." if started else "Profiler is already running."
+        elif action == "STOP":
+            path = self.profiler.stop()
+            response = f"Profiling stopped. Collapsed stacks written to '{path}'." if path \
+                else "Profiler is not running."
+        elif action == "SPANS_ON":
+            self.instrumentation.enabled = True
+            response = "Span instrumentation enabled."
+        elif action == "SPANS_OFF":
+            self.instrumentation.enabled = False
+            response = "Span instrumentation disabled."
+        elif action == "STATS":
+            response = self.instrumentation.format_report()
+        elif action == "RESET":
+            self.instrumentation.reset()
+            response = "Span statistics reset."
+        else:
+            response = f"ERROR: Unknown PROFILE action '{action}'."
+
+        self._log(f"[{addr}] PROFILE@{action} by {username}.")
+        send_frame(conn, response.encode(FORMAT))
+
+    def install_profile_signal(self, signum=None):
+        """Toggle the sampling profiler on a signal (SIGUSR2 by default). Must be called from the main thread."""
+        signum = signum or getattr(signal, "SIGUSR2", None)
+        if signum is None:
+            self._log("[PROFILE] Signal toggling is not supported on this platform.")
+            return False
+
+        def _toggle(_signum, _frame):
+            path = self.profiler.toggle()
+            if path:
+                self._log(f"[PROFILE] Sampling stopped. Collapsed stacks written to '{path}'.")
+            else:
+                self._log("[PROFILE] Sampling started.")
+
+        signal.signal(signum, _toggle)
+        self._log(f"[PROFILE] Send signal {int(signum)} to pid {os.getpid()} to toggle the sampling profiler.")
+        return True
 
     def _handle_client(self, conn, addr):
         """Handle client connection in a separate thread"""
@@ -401,10 +1663,19 @@ class FileServer:
         username = "N/A"  # Default username
 
         try:
+            # Small request/response messages must not wait for delayed ACKs (Nagle)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.ssl_context:
+                # Handshake here rather than in the accept loop so a slow client can't stall accepts
+                with self.instrumentation.span("tls_handshake"):
+                    conn = self.ssl_context.wrap_socket(conn, server_side=True)
+                self._log(f"[{addr}] TLS established: {describe_connection(conn)}")
+
             conn.send("OK@Welcome to the server".encode(FORMAT))
 
             start_time_auth = self.server_analyzer.start_record_time()
-            authenticated, username = self._authenticate_client(conn)
+            with self.instrumentation.span("auth"):
+                authenticated, username = self._authenticate_client(conn)
             self.server_analyzer.stop_record_time(start_time_auth, bytes_transferred=0, operation="SERVER_AUTH")
 
             if not authenticated:
@@ -413,7 +1684,7 @@ class FileServer:
                 return
 
             self._log(f"[{addr}] User '{username}' authenticated.")
-            self._add_client_to_pool(addr, username)
+            session = self._add_client_to_pool(addr, username, conn)
 
         except Exception as e:
             self._log(f"[{addr}] Connection error during auth: {e}")
@@ -421,8 +1692,9 @@ class FileServer:
             return
 
         try:
-            while not self.shutdown_flag.is_set():
-                data = conn.recv(SIZE).decode(FORMAT)
+            while not self.shutdown_flag.is_set() and not self.draining.is_set():
+                with self.instrumentation.span("recv_command"):
+                    data = conn.recv(SIZE).decode(FORMAT)
 
                 if not data:
                     break
@@ -431,25 +1703,102 @@ class FileServer:
                 start_time_op = self.server_analyzer.start_record_time()
                 operation_type = "UNKNOWN"
 
+                if self.replica_of and data.split("@", 1)[0] in REPLICA_REJECTED_COMMANDS:
+                    conn.send(self._replica_write_error().encode(FORMAT))
+                    if "@" in data:
+                        continue
+                    # Upload protocols would keep streaming data at us; end the session instead
+                    self._log(f"[{addr}] Rejected {data} on a read-only replica.")
+                    break
+
+                with self.clients_lock:
+                    if session['closing']:
+                        break  # drain() closed this session as the command arrived
+                    session['operation'] = data.split("@", 1)[0]
+                span = self.instrumentation.span
                 if data == "UPLOAD":
-                    self._handle_upload(conn, addr)
+                    with span("op:UPLOAD"):
+                        self._handle_upload(conn, addr)
                     operation_type = "SERVER_UPLOAD_RESP"
+                elif data == "STREAM_UPLOAD":
+                    with span("op:STREAM_UPLOAD"):
+                        self._handle_stream_upload(conn, addr)
+                    operation_type = "SERVER_STREAM_UPLOAD_RESP"
                 elif data == "DOWNLOAD":
-                    self._handle_download(conn, addr)
+                    with span("op:DOWNLOAD"):
+                        self._handle_download(conn, addr)
                     operation_type = "SERVER_DOWNLOAD_RESP"
+                elif data == "BATCH_UPLOAD":
+                    with span("op:BATCH_UPLOAD"):
+                        self._handle_batch_upload(conn, addr)
+                    operation_type = "SERVER_BATCH_UPLOAD_RESP"
+                elif data == "BATCH_DOWNLOAD":
+                    with span("op:BATCH_DOWNLOAD"):
+                        self._handle_batch_download(conn, addr)
+                    operation_type = "SERVER_BATCH_DOWNLOAD_RESP"
+                elif data == "TREE_UPLOAD":
+                    with span("op:TREE_UPLOAD"):
+                        self._handle_tree_upload(conn, addr)
+                    operation_type = "SERVER_TREE_UPLOAD_RESP"
+                elif data == "TREE_DOWNLOAD":
+                    with span("op:TREE_DOWNLOAD"):
+                        self._handle_tree_download(conn, addr)
+                    operation_type = "SERVER_TREE_DOWNLOAD_RESP"
                 elif data.startswith("DELETE@"):
                     _, filename = data.split("@", 1)
-                    self._handle_delete(conn, addr, filename)
+                    with span("op:DELETE"):
+                        self._handle_delete(conn, addr, filename)
                     operation_type = "SERVER_DELETE_RESP"
                 elif data == "DIR":
-                    self._handle_dir(conn, addr)
+                    with span("op:DIR"):
+                        self._handle_dir(conn, addr)
                     operation_type = "SERVER_DIR_RESP"
+                elif data == "MANIFEST":
+                    with span("op:MANIFEST"):
+                        self._handle_manifest(conn, addr)
+                    operation_type = "SERVER_MANIFEST_RESP"
+                elif data == "CATALOG":
+                    with span("op:CATALOG"):
+                        self._handle_catalog(conn, addr)
+                    operation_type = "SERVER_CATALOG_RESP"
+                elif data == "SEARCH":
+                    with span("op:SEARCH"):
+                        self._handle_search(conn, addr)
+                    operation_type = "SERVER_SEARCH_RESP"
+                elif data == "LIST":
+                    with span("op:LIST"):
+                        self._handle_list(conn, addr)
+                    operation_type = "SERVER_LIST_RESP"
+                elif data == "RING":
+                    self._handle_ring(conn, addr)
+                    operation_type = "SERVER_RING_RESP"
+                elif data == "RING_SET":
+                    self._handle_ring_set(conn, addr, username)
+                    operation_type = "SERVER_RING_SET_RESP"
+                elif data == "CLUSTER_PUT":
+                    with span("op:CLUSTER_PUT"):
+                        self._handle_cluster_put(conn, addr, username)
+                    operation_type = "SERVER_CLUSTER_PUT_RESP"
+                elif data == "REPLICATE":
+                    self._handle_replicate(conn, addr, username)
+                    operation_type = "SERVER_REPLICATE_RESP"
+                elif data == "REPL_STATUS":
+                    send_json(conn, self.replication_status())
+                    operation_type = "SERVER_REPL_STATUS_RESP"
                 elif data.startswith("SUBFOLDER@"):
                     parts = data.split("@")
                     if len(parts) == 3:
                         _, action, path = parts
-                        self._handle_subfolder(conn, addr, action, path)
+                        with span("op:SUBFOLDER"):
+                            self._handle_subfolder(conn, addr, action, path)
                         operation_type = "SERVER_SUBFOLDER_RESP"
+                elif data.startswith("PROFILE@"):
+                    _, action = data.split("@", 1)
+                    self._handle_profile(conn, addr, username, action)
+                    operation_type = "SERVER_PROFILE_RESP"
+                elif data == "PING":
+                    # Keepalive used by client connection pools; deliberately not logged or recorded
+                    conn.send("PONG".encode(FORMAT))
                 elif data == "LOGOUT":
                     self._log(f"[{addr}] Client logged out.")
                     break
@@ -457,6 +1806,7 @@ class FileServer:
                     self._log(f"[{addr}] Unknown command: {data}")
                     conn.send(f"ERROR: Unknown command '{data}'".encode(FORMAT))
 
+                session['operation'] = None
                 # Record the server-side processing time for the command
                 if operation_type != "UNKNOWN":
                     self.server_analyzer.stop_record_time(start_time_op, bytes_transferred=0, operation=operation_type)
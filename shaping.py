@@ -0,0 +1,106 @@
+import threading
+import time
+
+# --- CONSTANTS ---
+BURST_SECONDS = 0.25  # Default bucket depth, as seconds of traffic at the configured rate
+MIN_BURST = 256 * 1024  # Never smaller than a few chunks, or every chunk would sleep
+PRIORITY_BYTES = 1024 * 1024  # Transfers up to this size are never delayed (interactive traffic)
+SHAPED_CHUNK = 256 * 1024  # sendfile() slice when shaping or scheduling; one update per slice keeps CPU cost low
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_rate(text):
+    """Parse a rate such as '500K', '20M' or '1G' (bytes per second). None/'0'/'' mean unlimited."""
+    if text is None:
+        return None
+    text = str(text).strip().upper().removesuffix("/S").removesuffix("B")
+    if not text:
+        return None
+    unit = text[-1] if text[-1] in _UNITS else ""
+    value = float(text[:-1] if unit else text) * _UNITS[unit]
+    return value or None
+
+
+class TokenBucket:
+    """Thread-safe token bucket in bytes per second.
+
+    Callers reserve tokens and may drive the bucket into debt; the returned delay
+    is how long until that debt is repaid, so concurrent streams queue fairly
+    without a background refill thread.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate * BURST_SECONDS, MIN_BURST))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes):
+        """Take nbytes of tokens. Returns the seconds the caller should wait (0.0 if none)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= nbytes
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class Shaper:
+    """The buckets one connection's transfers are charged against (global, per user, per connection)."""
+
+    def __init__(self, buckets):
+        self.buckets = [bucket for bucket in buckets if bucket is not None]
+
+    def throttle(self, nbytes):
+        """Charge nbytes and sleep until every bucket allows them (bulk traffic)."""
+        delay = 0.0
+        for bucket in self.buckets:
+            delay = max(delay, bucket.reserve(nbytes))
+        if delay > 0:
+            time.sleep(delay)
+
+    def charge(self, nbytes):
+        """Charge nbytes without waiting (priority traffic); bulk streams absorb the debt."""
+        for bucket in self.buckets:
+            bucket.reserve(nbytes)
+
+    def for_transfer(self, size):
+        """Per-chunk callback for a transfer of size bytes: small transfers are charged, never delayed."""
+        return self.charge if size <= PRIORITY_BYTES else self.throttle
+
+
+class RateLimits:
+    """Bandwidth limits for FileServer(rate_limits=...), in bytes per second (None = unlimited).
+
+    user_rates overrides per_user for specific usernames.
+    """
+
+    def __init__(self, global_rate=None, per_user=None, per_connection=None, user_rates=None):
+        self.global_rate = global_rate
+        self.per_user = per_user
+        self.per_connection = per_connection
+        self.user_rates = dict(user_rates or {})
+        self._global_bucket = TokenBucket(global_rate) if global_rate else None
+        self._user_buckets = {}
+        self._lock = threading.Lock()
+
+    def _user_bucket(self, username):
+        rate = self.user_rates.get(username, self.per_user)
+        if not rate:
+            return None
+        with self._lock:
+            bucket = self._user_buckets.get(username)
+            if bucket is None:
+                # Shared by all of this user's connections
+                bucket = self._user_buckets[username] = TokenBucket(rate)
+            return bucket
+
+    def shaper_for(self, username):
+        """Shaper for a new connection of username, or None when nothing applies."""
+        buckets = [self._global_bucket, self._user_bucket(username),
+                   TokenBucket(self.per_connection) if self.per_connection else None]
+        shaper = Shaper(buckets)
+        return shaper if shaper.buckets else None
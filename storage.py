@@ -0,0 +1,334 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from tree import INTERNAL_PREFIX, is_internal
+
+# --- CONSTANTS ---
+LOW_WATER = 0.8  # After demoting, the hot tier is brought down to this fraction of its capacity
+MOVE_PREFIX = INTERNAL_PREFIX + "move_"  # Partial copies while a file changes tier
+
+
+def _partial_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, MOVE_PREFIX + name)
+
+
+def _walk_sizes(root):
+    """Yield (rel_name, size) for every non-internal file under root ('/'-separated names)."""
+    for rel_name, size, _ in _walk_stats(root):
+        yield rel_name, size
+
+
+def _walk_stats(root):
+    """Yield (rel_name, size, mtime_ns) for every non-internal file under root ('/'-separated names)."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in filenames:
+            if is_internal(name):
+                continue
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue  # Removed while walking
+            rel_name = name if rel_dir == "." else os.path.join(rel_dir, name).replace(os.sep, "/")
+            yield rel_name, st.st_size, st.st_mtime_ns
+
+
+def _manifest(root, rel_dir):
+    """{name relative to rel_dir: (size, mtime_ns)} for the files under root/rel_dir."""
+    top = os.path.join(root, *rel_dir.split("/")) if rel_dir else root
+    return {name: (size, mtime_ns) for name, size, mtime_ns in _walk_stats(top)}
+
+
+def _walk_folders(root):
+    """Yield the relative names ('/'-separated) of every folder under root."""
+    for dirpath, dirnames, _ in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in dirnames:
+            yield name if rel_dir == "." else os.path.join(rel_dir, name).replace(os.sep, "/")
+
+
+class LocalStorage:
+    """FileServer storage in one local directory (the default backend).
+
+    Names are paths relative to the root. path() is where new data is written;
+    fetch() is where existing data is read from, which other backends may have
+    to bring onto local disk first.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def setup(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, name):
+        """Local path that new data for name is written to."""
+        return os.path.join(self.root, name)
+
+    def fetch(self, name):
+        """Local path to read name from."""
+        return self.path(name)
+
+    def stored(self, name):
+        """Called after new data has been committed under name."""
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def isdir(self, name):
+        return os.path.isdir(self.path(name))
+
+    def size(self, name):
+        return os.path.getsize(self.path(name))
+
+    def remove(self, name):
+        os.remove(self.path(name))
+
+    def makedirs(self, name):
+        os.makedirs(self.path(name))
+
+    def rmdir(self, name):
+        os.rmdir(self.path(name))
+
+    def names(self):
+        """Top-level file names (used to seed the logical name counters)."""
+        return [name for name in os.listdir(self.root) if not is_internal(name)]
+
+    def files(self):
+        """{name: size} for every stored file, including subfolders."""
+        return dict(_walk_sizes(self.root))
+
+    def folders(self):
+        """Relative names of every folder, including empty ones."""
+        return set(_walk_folders(self.root))
+
+    def manifest(self, rel_dir=""):
+        """{name relative to rel_dir: (size, mtime_ns)} for every file under the folder rel_dir."""
+        return _manifest(self.root, rel_dir.strip("/"))
+
+    def prepare_tree(self, rel_dir):
+        """Make every file under rel_dir readable from the local root (for tree downloads)."""
+
+    def rebalance(self):
+        """Bring the tiers back within capacity (after prepare_tree)."""
+
+
+class DirectoryTier:
+    """Cold tier kept in a directory (a slower disk or mounted share).
+
+    An object store such as a local S3-compatible service fits by implementing
+    the same put/get/delete/exists/size/files/manifest methods.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def put(self, local_path, name):
+        target = self._path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = _partial_path(target)
+        shutil.copy2(local_path, partial)
+        os.replace(partial, target)
+
+    def get(self, name, local_path):
+        shutil.copy2(self._path(name), local_path)
+
+    def delete(self, name):
+        os.remove(self._path(name))
+
+    def exists(self, name):
+        return os.path.isfile(self._path(name))
+
+    def isdir(self, name):
+        return os.path.isdir(self._path(name))
+
+    def size(self, name):
+        return os.path.getsize(self._path(name))
+
+    def rmdir(self, name):
+        os.rmdir(self._path(name))
+
+    def files(self):
+        return dict(_walk_sizes(self.root))
+
+    def manifest(self, rel_dir=""):
+        return _manifest(self.root, rel_dir.strip("/"))
+
+    def folders(self):
+        return set(_walk_folders(self.root))
+
+
+class TieredStorage(LocalStorage):
+    """Hot files on fast local disk, cold files on a bulk tier, promoted again on access.
+
+    Writes always land in the hot root. When the hot tier grows past
+    hot_capacity bytes, the least recently used files are demoted to the cold
+    tier until usage is back under LOW_WATER of capacity. A read of a cold file
+    copies it back to the hot root first.
+    """
+
+    def __init__(self, hot_root, cold_tier, hot_capacity):
+        super().__init__(hot_root)
+        self.cold = cold_tier if not isinstance(cold_tier, str) else DirectoryTier(cold_tier)
+        self.hot_capacity = hot_capacity
+        self._lru = OrderedDict()  # hot name -> size, least recently used first
+        self._hot_bytes = 0
+        self._lock = threading.RLock()
+        self.promotions = 0
+        self.demotions = 0
+
+    def setup(self):
+        super().setup()
+        hot = sorted(_walk_sizes(self.root), key=lambda item: self._mtime(item[0]))
+        with self._lock:
+            self._lru = OrderedDict(hot)
+            self._hot_bytes = sum(self._lru.values())
+        self.rebalance()
+
+    def _mtime(self, name):
+        try:
+            return os.path.getmtime(self.path(name))
+        except OSError:
+            return 0
+
+    def fetch(self, name):
+        with self._lock:
+            if name in self._lru:
+                self._lru.move_to_end(name)
+                return self.path(name)
+            if not self.cold.exists(name):
+                return self.path(name)
+            self._promote(name)
+        self.rebalance(keep=name)
+        return self.path(name)
+
+    def stored(self, name):
+        try:
+            size = os.path.getsize(self.path(name))
+        except OSError:
+            return
+        with self._lock:
+            self._hot_bytes += size - self._lru.pop(name, 0)
+            self._lru[name] = size
+            if self.cold.exists(name):
+                self.cold.delete(name)  # Overwritten: the cold copy is stale
+        self.rebalance(keep=name)
+
+    def exists(self, name):
+        return super().exists(name) or self.cold.exists(name)
+
+    def isdir(self, name):
+        return super().isdir(name) or self.cold.isdir(name)
+
+    def size(self, name):
+        try:
+            return super().size(name)
+        except FileNotFoundError:
+            return self.cold.size(name)
+
+    def remove(self, name):
+        removed = False
+        with self._lock:
+            try:
+                super().remove(name)
+                removed = True
+            except FileNotFoundError:
+                pass
+            self._hot_bytes -= self._lru.pop(name, 0)
+            if self.cold.exists(name):
+                self.cold.delete(name)
+                removed = True
+        if not removed:
+            raise FileNotFoundError(f"'{name}' not found")
+
+    def rmdir(self, name):
+        hot = super().isdir(name)
+        if hot:
+            super().rmdir(name)
+        if self.cold.isdir(name):
+            try:
+                self.cold.rmdir(name)
+            except OSError:
+                if hot:
+                    super().makedirs(name)  # Still has cold files; keep both tiers consistent
+                raise
+
+    def names(self):
+        names = set(super().names())
+        names.update(name for name in self.cold.files() if "/" not in name)
+        return sorted(names)
+
+    def files(self):
+        files = self.cold.files()
+        files.update(super().files())
+        return files
+
+    def manifest(self, rel_dir=""):
+        # Tier moves use copy2(), so a file keeps its mtime wherever it lives
+        manifest = self.cold.manifest(rel_dir)
+        manifest.update(super().manifest(rel_dir))
+        return manifest
+
+    def folders(self):
+        return super().folders() | self.cold.folders()
+
+    def prepare_tree(self, rel_dir):
+        # Promote without demoting anything until rebalance(), so a large tree isn't demoted while it is read
+        prefix = f"{rel_dir.strip('/')}/" if rel_dir.strip("/") else ""
+        with self._lock:
+            for name in self.cold.files():
+                if name.startswith(prefix) and name not in self._lru:
+                    self._promote(name)
+
+    def _promote(self, name):
+        """Copy a cold file into the hot root and drop the cold copy (caller holds the lock)."""
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = _partial_path(target)
+        self.cold.get(name, partial)
+        os.replace(partial, target)
+        self.cold.delete(name)
+        size = os.path.getsize(target)
+        self._lru[name] = size
+        self._hot_bytes += size
+        self.promotions += 1
+
+    def rebalance(self, keep=None):
+        """Demote least recently used hot files while the hot tier is over capacity."""
+        with self._lock:
+            if self._hot_bytes <= self.hot_capacity:
+                return
+            target = self.hot_capacity * LOW_WATER
+            for name in list(self._lru):
+                if self._hot_bytes <= target:
+                    break
+                if name == keep:
+                    continue
+                self._demote(name)
+
+    def _demote(self, name):
+        source = self.path(name)
+        try:
+            before = os.stat(source)
+            self.cold.put(source, name)
+            after = os.stat(source)
+            if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+                self.cold.delete(name)  # Rewritten while copying; keep the new hot copy
+                return
+            os.remove(source)  # Open readers keep their file handle
+        except OSError:
+            return
+        self._hot_bytes -= self._lru.pop(name, 0)
+        self.demotions += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hot_files": len(self._lru), "hot_bytes": self._hot_bytes, "hot_capacity": self.hot_capacity,
+                    "promotions": self.promotions, "demotions": self.demotions}
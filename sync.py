@@ -0,0 +1,337 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import tree
+from integrity import hash_file
+
+# --- CONSTANTS ---
+MANIFEST_FILE = tree.INTERNAL_PREFIX + "sync_manifest.json"  # In the local directory; skipped by tree scans
+MANIFEST_VERSION = 1
+SYNC_ALGORITHM = "blake2b"  # Always available on both sides (xxhash is optional)
+DEFAULT_WORKERS = 4
+BATCH_FILES = 256  # Files per partial tree transfer...
+BATCH_BYTES = 64 * 1024 * 1024  # ...or fewer, once a batch holds this many bytes
+DIRECTIONS = ("both", "up", "down")
+CONFLICT_POLICIES = ("newer", "local", "remote")
+
+
+def batches(items, max_files=BATCH_FILES, max_bytes=BATCH_BYTES):
+    """Split (item, size) pairs into lists of items, cut at max_files items or max_bytes bytes."""
+    batch, batch_bytes = [], 0
+    for item, size in items:
+        if batch and (len(batch) >= max_files or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def scan_local(root):
+    """{rel_path: (size, mtime_ns)} for the files under root."""
+    files = {}
+    for rel_path in tree.iter_tree(root):
+        try:
+            st = os.stat(os.path.join(root, *rel_path.split("/")))
+        except OSError:
+            continue  # Removed while walking
+        files[rel_path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+class SyncPlan:
+    """What a sync will do: relative paths per action, plus conflicts and the unchanged count."""
+
+    def __init__(self):
+        self.upload = []
+        self.download = []
+        self.delete_remote = []
+        self.delete_local = []
+        self.conflicts = []  # {"path", "winner": "local" | "remote"}
+        self.unchanged = 0
+
+    def __bool__(self):
+        return bool(self.upload or self.download or self.delete_remote or self.delete_local)
+
+    def summary(self):
+        return {"upload": len(self.upload), "download": len(self.download),
+                "delete_remote": len(self.delete_remote), "delete_local": len(self.delete_local),
+                "conflicts": self.conflicts, "unchanged": self.unchanged}
+
+
+class SyncEngine:
+    """Synchronizes a local directory with a server folder, transferring only what changed.
+
+    The state of the last sync is kept in a local manifest (MANIFEST_FILE):
+    for every path the local (size, mtime_ns) and digest, and the server's
+    (size, mtime_ns). A run compares the current local scan and the server's
+    manifest (one MANIFEST request; just a token when the server side hasn't
+    changed) against it. Only files whose signature changed are hashed, and
+    only new or changed files are sent, as partial tree transfers on `workers`
+    pooled connections. Tree transfers keep mtimes, so both sides' signatures
+    stay comparable.
+
+    direction is "both", "up" (the local directory wins) or "down" (the server
+    wins). Deletions are mirrored only with delete=True; otherwise a file
+    deleted on one side is restored from the other. When both sides changed a
+    file, conflict picks the copy to keep: "newer" (mtime), "local" or "remote".
+    """
+
+    def __init__(self, pool, local_dir, remote_dir="", direction="both", delete=False, conflict="newer",
+                 workers=DEFAULT_WORKERS, batch_files=BATCH_FILES, on_result=None):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        if conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"conflict must be one of {', '.join(CONFLICT_POLICIES)}")
+        self.pool = pool
+        self.local_dir = local_dir
+        self.remote_dir = remote_dir.strip("/")
+        self.direction = direction
+        self.delete = delete
+        self.conflict = conflict
+        self.workers = workers
+        self.batch_files = batch_files
+        self.on_result = on_result  # Called with each batch of per-file results (progress reporting)
+        self.manifest_path = os.path.join(local_dir, MANIFEST_FILE)
+        self.server_id = f"{pool.ip}:{pool.port}"
+        self._digests = {}  # Local digests computed while planning
+
+    # --- Manifests ---
+
+    def _load_base(self):
+        """(server token, {path: [local_size, local_mtime_ns, digest, server_size, server_mtime_ns]}) of the
+        last sync, or (None, {}) if there was none for this server folder."""
+        try:
+            with open(self.manifest_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None, {}
+        if (data.get("version") != MANIFEST_VERSION or data.get("server") != self.server_id
+                or data.get("remote") != self.remote_dir):
+            return None, {}
+        return data.get("token"), data["files"]
+
+    def _save_base(self, token, base):
+        partial = self.manifest_path + ".tmp"
+        with open(partial, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "server": self.server_id, "remote": self.remote_dir,
+                       "token": token, "files": base}, f, separators=(",", ":"))
+        os.replace(partial, self.manifest_path)
+
+    def _server_manifest(self, **request):
+        reply = self.pool.call("get_manifest", self.remote_dir, **request)
+        if isinstance(reply, str):
+            raise ConnectionError(reply)
+        return reply
+
+    @staticmethod
+    def _server_view(base):
+        return {path: (entry[3], entry[4]) for path, entry in base.items() if entry[3] is not None}
+
+    def _local_digest(self, path):
+        if path not in self._digests:
+            try:
+                self._digests[path] = hash_file(os.path.join(self.local_dir, *path.split("/")), SYNC_ALGORITHM)
+            except OSError:
+                self._digests[path] = None
+        return self._digests[path]
+
+    # --- Planning ---
+
+    def plan(self):
+        """Compare both sides with the last sync. Returns (plan, context) for run()."""
+        os.makedirs(self.local_dir, exist_ok=True)
+        token, base = self._load_base()
+        local = scan_local(self.local_dir)
+        reply = self._server_manifest(expect=token)
+        server = self._server_view(base) if reply["unchanged"] else reply["files"]
+
+        plan = SyncPlan()
+        new_base = {}
+        undecided = []  # Present on both sides with no way to tell them apart but digests
+        for path in local.keys() | server.keys() | base.keys():
+            entry = base.get(path)
+            local_sig, server_sig = local.get(path), server.get(path)
+            base_local = tuple(entry[:2]) if entry and entry[0] is not None else None
+            base_server = tuple(entry[3:]) if entry and entry[3] is not None else None
+            digest = entry[2] if entry else None
+
+            local_changed = local_sig != base_local
+            if local_changed and local_sig and base_local and digest and local_sig[0] == base_local[0]:
+                # Same size, new mtime: only a changed digest counts (e.g. touched or rewritten unchanged)
+                if self._local_digest(path) == digest:
+                    local_changed = False
+            server_changed = server_sig != base_server
+
+            if not local_changed and not server_changed:
+                if local_sig or server_sig:
+                    new_base[path] = [*(local_sig or (None, None)), digest, *(server_sig or (None, None))]
+                    plan.unchanged += 1
+                continue
+            if local_sig and server_sig and local_changed and server_changed:
+                undecided.append(path)
+                continue
+            if not self._decide(plan, path, local_sig, server_sig, local_changed, server_changed):
+                # Left alone (one-way sync, deletes not mirrored): remember the server side for the token
+                new_base[path] = [*(local_sig or (None, None)), None, *(server_sig or (None, None))]
+
+        if undecided:
+            self._compare_digests(plan, undecided, local, server, new_base)
+        return plan, {"base": base, "new_base": new_base, "local": local, "server": server,
+                      "token": reply["token"]}
+
+    def _decide(self, plan, path, local_sig, server_sig, local_changed, server_changed):
+        """Queue the action for a path that changed on one side (or exists on one side only).
+
+        Returns False if the path is left alone.
+        """
+        if self.direction == "up":
+            action = plan.upload if local_sig else plan.delete_remote if self.delete and server_sig else None
+        elif self.direction == "down":
+            action = plan.download if server_sig else plan.delete_local if self.delete and local_sig else None
+        elif local_changed:
+            if local_sig:
+                action = plan.upload
+            elif self.delete and not server_changed:
+                action = plan.delete_remote  # Deleted here since the last sync
+            else:
+                action = plan.download
+        elif server_sig:
+            action = plan.download
+        else:
+            action = plan.delete_local if self.delete else plan.upload  # Deleted on the server since the last sync
+        if action is None:
+            return False
+        action.append(path)
+        return True
+
+    def _compare_digests(self, plan, paths, local, server, new_base):
+        """Paths changed on both sides (or never synced): equal content is recorded, otherwise a conflict."""
+        same_size = [path for path in paths if local[path][0] == server[path][0]]
+        remote_digests = self._server_manifest(paths=[], digests=same_size, algorithm=SYNC_ALGORITHM)["digests"] \
+            if same_size else {}
+        for path in paths:
+            if path in remote_digests:
+                digest = self._local_digest(path)
+                if digest is not None and digest == remote_digests[path]:
+                    new_base[path] = [*local[path], digest, *server[path]]
+                    plan.unchanged += 1
+                    continue
+            if self.direction != "both":
+                winner = "local" if self.direction == "up" else "remote"
+            elif self.conflict == "newer":
+                winner = "local" if local[path][1] >= server[path][1] else "remote"
+            else:
+                winner = self.conflict
+            plan.conflicts.append({"path": path, "winner": winner})
+            (plan.upload if winner == "local" else plan.download).append(path)
+
+    # --- Execution ---
+
+    def run(self, dry_run=False):
+        """Plan and carry out a sync. Returns a summary dict with per-file results."""
+        plan, context = self.plan()
+        summary = plan.summary()
+        if dry_run:
+            return dict(summary, dry_run=True, results=[])
+
+        local, server, new_base = context["local"], context["server"], context["new_base"]
+        base = context["base"]
+        prefix = f"{self.remote_dir}/" if self.remote_dir else ""
+        tasks = [(self._upload, (batch, local))
+                 for batch in batches(((path, local[path][0]) for path in plan.upload), self.batch_files)]
+        tasks += [(self._download, (batch, server))
+                  for batch in batches(((path, server[path][0]) for path in plan.download), self.batch_files)]
+        tasks += [(self._delete_remote, (path, prefix + path)) for path in plan.delete_remote]
+        results = self._run(tasks)
+        for path in plan.delete_local:
+            results.append(self._delete_local(path))
+            if self.on_result:
+                self.on_result(results[-1:])
+
+        failed = {result["path"] for result in results if result["status"] != "OK"}
+        for path in failed:
+            if path in base:
+                new_base[path] = base[path]  # Keep the old state so the next run tries again
+
+        uploaded = [path for path in plan.upload if path not in failed]
+        token = context["token"]
+        if uploaded or plan.delete_remote:
+            # The server's (size, mtime_ns) of what we sent, and the token of the folder as it is now
+            reply = self._server_manifest(paths=uploaded)
+            token = reply["token"]
+            for path in uploaded:
+                signature = reply["files"].get(path)
+                if signature is None:
+                    failed.add(path)
+                    results.append({"path": path, "action": "upload", "status": "ERROR",
+                                    "message": "File was not stored on the server."})
+                    continue
+                new_base[path] = [*local[path], self._digests.get(path), *signature]
+        for path in plan.download:
+            if path in failed:
+                continue
+            try:
+                st = os.stat(os.path.join(self.local_dir, *path.split("/")))
+            except OSError:
+                continue
+            new_base[path] = [st.st_size, st.st_mtime_ns, None, *server[path]]
+        for path in plan.delete_remote + plan.delete_local:
+            if path not in failed:
+                new_base.pop(path, None)
+
+        # Only trust the token if it describes exactly what the manifest now records for the server; if
+        # someone else changed the folder meanwhile, the next run fetches the full listing
+        if tree.manifest_token(self._server_view(new_base)) != token:
+            token = None
+        self._save_base(token, new_base)
+
+        return dict(summary, failed=len({result["path"] for result in results if result["status"] != "OK"}),
+                    bytes=sum(result.get("size", 0) for result in results if result["status"] == "OK"),
+                    results=results)
+
+    def _run(self, tasks):
+        results = []
+        if not tasks:
+            return results
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(function, *args) for function, args in tasks]
+            for future in as_completed(futures):
+                batch = future.result()
+                if self.on_result:
+                    self.on_result(batch)
+                results.extend(batch)
+        return results
+
+    @staticmethod
+    def _batch_results(paths, action, reply, signatures):
+        status = "ERROR" if reply.startswith(("ERROR", "CANCELLED")) else "OK"
+        message = reply.removeprefix("SUCCESS: ")
+        return [{"path": path, "action": action, "status": status, "size": signatures[path][0], "message": message}
+                for path in paths]
+
+    def _upload(self, paths, local):
+        reply = self.pool.call("upload_tree", self.local_dir, self.remote_dir, "none", False, None, paths)
+        return self._batch_results(paths, "upload", reply, local)
+
+    def _download(self, paths, server):
+        reply = self.pool.call("download_tree", self.remote_dir, self.local_dir, "none", False, None, paths)
+        return self._batch_results(paths, "download", reply, server)
+
+    def _delete_remote(self, path, name):
+        reply = self.pool.call("handle_delete", name)
+        if reply.startswith("ERROR") and "not found" in reply:
+            reply = "Already deleted."
+        return [{"path": path, "action": "delete_remote",
+                 "status": "ERROR" if reply.startswith("ERROR") else "OK", "message": reply}]
+
+    def _delete_local(self, path):
+        try:
+            os.remove(os.path.join(self.local_dir, *path.split("/")))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            return {"path": path, "action": "delete_local", "status": "ERROR", "message": str(e)}
+        return {"path": path, "action": "delete_local", "status": "OK", "message": "Deleted."}
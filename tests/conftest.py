@@ -0,0 +1,95 @@
+import os
+import socket
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import FileClient  # noqa: E402
+from server import FileServer  # noqa: E402
+
+USERNAME = "user1"
+PASSWORD = "password123"
+WAIT = 10  # Seconds a test waits for something that should take well under one
+
+
+def quiet(_message):
+    pass
+
+
+def wait_for(condition, timeout=WAIT):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def stored_name(status):
+    """Logical name out of "SUCCESS: File uploaded successfully as 'TS001.txt'."."""
+    assert status.startswith("SUCCESS"), status
+    return status.split("'")[1]
+
+
+@pytest.fixture
+def make_server(tmp_path):
+    """Start FileServers on ephemeral loopback ports; every one is stopped after the test."""
+    servers = []
+
+    def make(name="server", port=0, **kwargs):
+        server = FileServer("127.0.0.1", port, str(tmp_path / name), quiet, stats_file=None, **kwargs)
+        assert server.start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        if server.server:
+            server.stop()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+@pytest.fixture
+def connect():
+    """Logged-in FileClients; every one is disconnected after the test."""
+    clients = []
+
+    def make(server, username=USERNAME, password=PASSWORD):
+        client = FileClient("127.0.0.1", server.port, quiet, stats_file=None)
+        assert client.connect()
+        assert client.authenticate(username, password) == "AUTH_SUCCESS"
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.disconnect()
+
+
+@pytest.fixture
+def client(server, connect):
+    return connect(server)
+
+
+@pytest.fixture
+def make_file(tmp_path):
+    def make(name, data):
+        path = tmp_path / "local" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return str(path)
+
+    return make
@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+import pytest
+
+import async_client
+from async_client import AsyncFileClient, AuthenticationError, FileClientError, RemoteFileNotFoundError
+from catalog import CATALOG_FILE
+
+from conftest import PASSWORD, USERNAME, WAIT, wait_for
+
+
+async def logged_in(server):
+    client = AsyncFileClient("127.0.0.1", server.port)
+    await client.connect()
+    await client.authenticate(USERNAME, PASSWORD)
+    return client
+
+
+def test_upload_download_and_listing(server, make_file, tmp_path):
+    data = os.urandom(2 * 1024 * 1024)
+    path = make_file("data.bin", data)
+
+    async def scenario():
+        async with await logged_in(server) as client:
+            names = []
+            for verify in (True, False):
+                uploaded = await client.upload(path, verify=verify)
+                downloaded = await client.download(uploaded.logical_name, str(tmp_path), verify=verify)
+                assert downloaded.size == uploaded.size == len(data)
+                assert downloaded.digest == uploaded.digest
+                with open(downloaded.path, "rb") as f:
+                    assert f.read() == data
+                names.append(uploaded.logical_name)
+            listing = await client.list_files()
+            assert set(names) <= set(listing.files)
+
+    asyncio.run(asyncio.wait_for(scenario(), WAIT))
+
+
+def test_wrong_password_raises(server):
+    async def scenario():
+        client = AsyncFileClient("127.0.0.1", server.port)
+        await client.connect()
+        with pytest.raises(AuthenticationError):
+            await client.authenticate(USERNAME, "wrong")
+        assert not client.is_connected
+
+    asyncio.run(asyncio.wait_for(scenario(), WAIT))
+
+
+def test_failed_download_keeps_the_local_file(server, tmp_path):
+    save_dir = tmp_path / "downloads"
+    save_dir.mkdir()
+    local = save_dir / "TS999.txt"
+    local.write_bytes(b"keep me")
+
+    async def scenario():
+        async with await logged_in(server) as client:
+            with pytest.raises(RemoteFileNotFoundError):
+                await client.download("TS999.txt", str(save_dir))
+            assert await client.ping()  # The session is still usable
+
+    asyncio.run(asyncio.wait_for(scenario(), WAIT))
+    assert local.read_bytes() == b"keep me"
+    assert os.listdir(save_dir) == ["TS999.txt"]
+
+
+def test_upload_of_a_file_that_shrinks_is_aborted(server, make_file, monkeypatch):
+    path = make_file("shrinks.txt", b"z" * 5000)
+    real_getsize = os.path.getsize
+    monkeypatch.setattr(async_client.os.path, "getsize", lambda p: real_getsize(p) + (100 if p == path else 0))
+
+    async def scenario(verify):
+        client = await logged_in(server)
+        with pytest.raises(FileClientError, match="changed while uploading"):
+            await client.upload(path, verify=verify)
+        assert not client.is_connected
+
+    for verify in (True, False):
+        asyncio.run(asyncio.wait_for(scenario(verify), WAIT))
+    assert wait_for(lambda: not server.list_active_clients())
+    assert [name for name in os.listdir(server.data_path) if not name.startswith(CATALOG_FILE)] == []
@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from auth import Authenticator, MemoryUserStore, SessionManager
+from client import FileClient
+
+from conftest import PASSWORD, USERNAME, quiet
+
+NEW_PASSWORD = "correct horse"
+
+
+def digest(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def resume(server, token):
+    client = FileClient("127.0.0.1", server.port, quiet, stats_file=None)
+    client.username = USERNAME
+    try:
+        return client.resume_session(token)
+    finally:
+        client.disconnect()
+
+
+def login(server, password):
+    client = FileClient("127.0.0.1", server.port, quiet, stats_file=None)
+    assert client.connect()
+    try:
+        return client.authenticate(USERNAME, password)
+    finally:
+        client.disconnect()
+
+
+def test_cached_verification_follows_password_changes():
+    store = MemoryUserStore(iterations=1000)
+    store.add_user("alice", digest("old"))
+    authenticator = Authenticator(store)
+    assert authenticator.verify("alice", digest("old"))
+    assert authenticator.verify("alice", digest("old"))  # From the cache
+    store.add_user("alice", digest("new"))
+    assert not authenticator.verify("alice", digest("old"))
+    assert authenticator.verify("alice", digest("new"))
+    assert not authenticator.verify("bob", digest("old"))
+
+
+def test_session_tokens_expire_and_can_be_revoked():
+    sessions = SessionManager(ttl=0.2)
+    token = sessions.issue("alice")
+    assert sessions.resume(token) == "alice"
+    other = sessions.issue("alice")
+    assert sessions.revoke_user("alice") == 2
+    assert sessions.resume(token) is None and sessions.resume(other) is None
+    token = sessions.issue("alice")
+    time.sleep(0.3)
+    assert sessions.resume(token) is None
+
+
+def test_token_resumes_a_session(server, client):
+    assert client.session_token
+    assert resume(server, client.session_token) == "AUTH_SUCCESS"
+    assert resume(server, "not-a-token") == "AUTH_FAILED"
+
+
+def test_password_change_revokes_session_tokens(server, client):
+    token = client.session_token
+    server.user_store.add_user(USERNAME, digest(NEW_PASSWORD))
+    assert resume(server, token) == "AUTH_FAILED"
+    assert login(server, PASSWORD) == "AUTH_FAILED"
+    assert login(server, NEW_PASSWORD) == "AUTH_SUCCESS"
+
+
+def test_removed_user_cannot_log_in_or_resume(server, client):
+    token = client.session_token
+    server.user_store.remove_user(USERNAME)
+    assert resume(server, token) == "AUTH_FAILED"
+    assert login(server, PASSWORD) == "AUTH_FAILED"
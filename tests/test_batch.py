@@ -0,0 +1,41 @@
+import os
+
+import client as client_module
+
+
+def test_batch_round_trip(client, make_file, tmp_path):
+    paths = [make_file(f"f{n}.txt", f"file {n} ".encode() * 500) for n in range(5)]
+    results = client.send_files(paths)
+    assert [result["status"] for result in results] == ["OK"] * 5
+    names = [result["logical_name"] for result in results]
+
+    save_dir = tmp_path / "batch"
+    save_dir.mkdir()
+    results = client.receive_files(names, str(save_dir))
+    assert [result["status"] for result in results] == ["OK"] * 5
+    for path, name in zip(paths, names):
+        assert (save_dir / name).read_bytes() == open(path, "rb").read()
+
+
+def test_batch_reports_one_result_for_a_file_that_shrinks(client, make_file, server, monkeypatch):
+    paths = [make_file(f"{name}.txt", name.encode() * 1000) for name in ("a", "b", "c")]
+    real_getsize = os.path.getsize
+    # The manifest promises more bytes than b.txt holds when it is read, as if it shrank in between
+    monkeypatch.setattr(client_module.os.path, "getsize",
+                        lambda path: real_getsize(path) + (500 if path == paths[1] else 0))
+
+    for verify in (True, False):
+        results = client.send_files(paths, verify=verify)
+        assert [(result["name"], result["status"]) for result in results] == [
+            ("a.txt", "OK"), ("b.txt", "ERROR"), ("c.txt", "OK")]
+    stored = os.listdir(server.data_path)
+    assert not any(name.startswith(".ft_upload_") for name in stored)
+    assert len([name for name in stored if name.endswith(".txt")]) == 4
+
+
+def test_batch_download_reports_a_missing_file(client, make_file, tmp_path):
+    name = client.send_files([make_file("here.txt", b"here")])[0]["logical_name"]
+    results = client.receive_files([name, "missing.txt"], str(tmp_path))
+    assert [result["status"] for result in results] == ["OK", "ERROR"]
+    assert (tmp_path / name).read_bytes() == b"here"
+    assert not (tmp_path / "missing.txt").exists()
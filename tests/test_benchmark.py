@@ -0,0 +1,24 @@
+import benchmark
+from benchmark import Benchmark, percentile
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile(values, 0) == 1
+    assert percentile(list(range(1, 1001)), 99.9) == 999
+    assert percentile([], 99) == 0.0
+
+
+def test_quick_run_reports_every_scenario(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "BATCH_FILES", 10)
+    bench = Benchmark(clients=2, profile="quick", iterations=1, tree_files=20, tree_dirs=2, storm_connections=3,
+                      workdir=str(tmp_path))
+    report = bench.run(["upload", "download", "batch", "dir", "storm"])
+    assert report["meta"]["profile"] == "quick"
+    for label, stats in report["scenarios"].items():
+        assert stats["errors"] == 0, (label, stats["error_samples"])
+        assert stats["ops"] > 0
+        assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["p99"] <= stats["latency_ms"]["max"]
@@ -0,0 +1,42 @@
+import os
+
+from catalog import CATALOG_FILE
+
+from conftest import USERNAME, stored_name
+
+
+def test_catalog_records_uploads(client, make_file):
+    name = stored_name(client.send_file(make_file("report_q3.pdf", b"%PDF" + b"x" * 100)))
+    stored_name(client.send_file(make_file("notes.txt", b"notes")))
+
+    entries = client.query_catalog(original_name="report*.pdf")
+    assert [(entry["logical_name"], entry["original_name"], entry["owner"], entry["size"]) for entry in entries] == [
+        (name, "report_q3.pdf", USERNAME, 104)]
+    assert len(client.query_catalog(owner=USERNAME)) == 2
+
+
+def test_reserved_names_are_refused(server, client, tmp_path):
+    assert client.receive_file(CATALOG_FILE, str(tmp_path)).startswith("ERROR")
+    assert not (tmp_path / CATALOG_FILE).exists()
+    assert "reserved" in client.handle_delete(CATALOG_FILE)
+    assert os.path.exists(os.path.join(server.data_path, CATALOG_FILE))
+
+
+def test_tree_download_refuses_reserved_paths(server, client, tmp_path):
+    out = tmp_path / "out"
+    assert client.download_tree("", str(out), rel_paths=[CATALOG_FILE]).startswith("ERROR")
+    assert not (out / CATALOG_FILE).exists()
+
+
+def test_tree_upload_refuses_reserved_members(server, client, tmp_path):
+    catalog_path = os.path.join(server.data_path, CATALOG_FILE)
+    with open(catalog_path, "rb") as f:
+        before = f.read()
+    local = tmp_path / "evil"
+    local.mkdir()
+    (local / CATALOG_FILE).write_bytes(b"not a database")
+
+    assert client.upload_tree(str(local), "", rel_paths=[CATALOG_FILE]).startswith("ERROR")
+    with open(catalog_path, "rb") as f:
+        assert f.read() == before
+    assert isinstance(client.query_catalog(), list)  # The session and the catalog still work
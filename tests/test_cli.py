@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import cli
+
+from conftest import PASSWORD, USERNAME
+
+
+def run_cli(capsys, port, *argv):
+    """Run the CLI with --json; returns (exit code, parsed report)."""
+    code = cli.main(["--host", "127.0.0.1", "--port", str(port), "--user", USERNAME, "--password", PASSWORD,
+                     "--json", "-q", *argv])
+    out = capsys.readouterr().out
+    return code, json.loads(out) if out else None
+
+
+def test_put_ls_get_and_rm(server, capsys, tmp_path):
+    local = tmp_path / "local"
+    (local / "tree" / "sub").mkdir(parents=True)
+    for n in range(3):
+        (local / f"data_{n}.csv").write_text(f"row {n}\n" * 100)
+    (local / "tree" / "sub" / "deep.txt").write_text("deep")
+
+    code, report = run_cli(capsys, server.port, "put", str(local / "*.csv"))
+    assert (code, report["ok"], report["failed"]) == (0, 3, 0)
+    code, report = run_cli(capsys, server.port, "put", "-r", str(local / "tree"))
+    assert (code, report["failed"]) == (0, 0)
+
+    code, listing = run_cli(capsys, server.port, "ls", "*.csv")
+    names = sorted(entry["name"] for entry in listing["files"])
+    assert code == 0 and len(names) == 3
+
+    out = tmp_path / "out"
+    code, report = run_cli(capsys, server.port, "get", "-d", str(out), "*.csv")
+    assert (code, report["ok"]) == (0, 3)
+    assert sorted(path.name for path in out.iterdir()) == names
+    code, report = run_cli(capsys, server.port, "get", "-r", "-d", str(out), "tree")
+    assert code == 0 and (out / "tree" / "sub" / "deep.txt").read_text() == "deep"
+
+    code, report = run_cli(capsys, server.port, "rm", "*.csv")
+    assert (code, report["ok"]) == (0, 3)
+    assert run_cli(capsys, server.port, "ls", "*.csv")[1]["files"] == []
+
+
+def test_failures_set_the_exit_code(server, capsys, tmp_path):
+    code, report = run_cli(capsys, server.port, "get", "-d", str(tmp_path), "missing.bin")
+    assert (code, report["failed"]) == (cli.EXIT_FAILED, 1)
+    assert report["results"][0]["status"] == "ERROR"
+
+
+def test_missing_user_is_refused(monkeypatch):
+    monkeypatch.delenv(cli.USER_ENV, raising=False)
+    with pytest.raises(SystemExit, match=cli.USER_ENV):
+        cli.main(["ls"])
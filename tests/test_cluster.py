@@ -0,0 +1,57 @@
+import os
+
+import client as client_module
+from catalog import CATALOG_FILE
+from cluster import ClusterClient, ClusterMembership
+
+from conftest import PASSWORD, free_port, wait_for
+
+
+def start_cluster(make_server, count, ring_size):
+    nodes = [f"127.0.0.1:{free_port()}" for _ in range(count)]
+    servers = [make_server(f"node{index}", port=int(node.rpartition(":")[2]),
+                           cluster=ClusterMembership(node, nodes[:ring_size], peer_password=PASSWORD))
+               for index, node in enumerate(nodes)]
+    return nodes, servers
+
+
+def test_files_move_to_their_new_owner_when_the_ring_grows(make_server, make_file, tmp_path):
+    nodes, servers = start_cluster(make_server, 3, ring_size=2)
+    cluster = ClusterClient([nodes[0]], "admin", PASSWORD, log_callback=lambda message: None)
+    try:
+        names = [cluster.send_file(make_file(f"f{n}.txt", f"file {n}".encode())).split("'")[1] for n in range(12)]
+        assert not servers[2].storage.files()
+
+        cluster.set_nodes(nodes)
+
+        def settled():
+            # Every node has the new ring and holds only the files it owns, with none lost or duplicated
+            held = [(server, name) for server in servers for name in server.storage.files()]
+            return (len(held) == len(names)
+                    and all(len(server.cluster.ring.nodes) == 3 for server in servers)
+                    and all(server.cluster.owner(name) == server.cluster.self_node for server, name in held))
+
+        assert wait_for(settled)
+        assert servers[2].storage.files()
+
+        save_dir = tmp_path / "downloads"
+        save_dir.mkdir()
+        for n, name in enumerate(names):
+            assert cluster.receive_file(name, str(save_dir)).startswith("SUCCESS")
+            assert (save_dir / name).read_bytes() == f"file {n}".encode()
+        assert cluster.conflicts() == {}
+    finally:
+        cluster.close()
+
+
+def test_cluster_put_of_a_file_that_shrinks_is_aborted(server, connect, make_file, monkeypatch):
+    path = make_file("handed.txt", b"y" * 4000)
+    real_getsize = os.path.getsize
+    monkeypatch.setattr(client_module.os.path, "getsize", lambda p: real_getsize(p) + (100 if p == path else 0))
+
+    peer = connect(server, username="admin")
+    result = peer.cluster_put(path, "TS001-abcdef.txt")
+    assert result.startswith("ERROR") and "changed" in result
+    assert not peer.is_connected
+    assert wait_for(lambda: not server.list_active_clients())
+    assert [name for name in os.listdir(server.data_path) if not name.startswith(CATALOG_FILE)] == []
@@ -0,0 +1,35 @@
+import os
+
+from dashboard import SPARK_CHARS, DashboardSampler, sparkline
+
+from conftest import USERNAME, stored_name, wait_for
+
+
+def test_sparkline_scales_to_the_peak():
+    assert sparkline([0, 0]) == SPARK_CHARS[0] * 2
+    line = sparkline([0, 50, 100])
+    assert (line[0], line[-1]) == (SPARK_CHARS[0], SPARK_CHARS[-1])
+    assert sparkline([]) == ""
+
+
+def test_samples_show_clients_throughput_and_hot_files(server, connect, make_file, tmp_path):
+    sampler = DashboardSampler(server)
+    client = connect(server)
+    data = os.urandom(1024 * 1024)
+    name = stored_name(client.send_file(make_file("popular.bin", data)))
+    for _ in range(2):
+        assert client.receive_file(name, str(tmp_path)).startswith("SUCCESS")
+
+    snapshot = sampler.sample()
+    assert [(entry["user"], entry["operation"]) for entry in snapshot["clients"]] == [(USERNAME, "idle")]
+    assert snapshot["throughput"] > 0 and snapshot["ops_per_sec"] > 0
+    assert snapshot["hot_files"] == [(name, 2)]
+    assert len(snapshot["throughput_history"]) == 1
+
+    # Bytes a session moves after the last sample still count once it has closed
+    assert client.receive_file(name, str(tmp_path)).startswith("SUCCESS")
+    client.disconnect()
+    assert wait_for(lambda: not server.list_active_clients())
+    snapshot = sampler.sample()
+    assert snapshot["clients"] == [] and snapshot["throughput"] > 0
+    assert snapshot["hot_files"] == [(name, 3)]
@@ -0,0 +1,90 @@
+import os
+import threading
+
+import pytest
+
+import durability
+import tree
+from durability import GroupCommitter
+
+from conftest import wait_for
+
+
+def make_temp(directory, name, data=b"data"):
+    final_path = os.path.join(directory, name)
+    temp_path = durability.temp_path_for(final_path)
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    return temp_path, final_path
+
+
+@pytest.mark.parametrize("policy", durability.FSYNC_POLICIES)
+def test_commit_publishes_under_every_policy(tmp_path, policy):
+    committer = GroupCommitter(policy)
+    try:
+        pairs = [make_temp(str(tmp_path), f"f{n}.txt", f"file {n}".encode()) for n in range(3)]
+        committer.commit(pairs)
+    finally:
+        committer.close()
+    assert sorted(os.listdir(tmp_path)) == ["f0.txt", "f1.txt", "f2.txt"]
+    assert (tmp_path / "f1.txt").read_bytes() == b"file 1"
+    assert committer.committed == 3
+
+
+def test_commits_queued_during_a_flush_share_the_next_round(tmp_path, monkeypatch):
+    first_sync = threading.Event()
+    release = threading.Event()
+    real_fsync_file = durability.fsync_file
+
+    def slow_first_fsync(path):
+        if not first_sync.is_set():
+            first_sync.set()
+            release.wait()
+        real_fsync_file(path)
+
+    monkeypatch.setattr(durability, "fsync_file", slow_first_fsync)
+    committer = GroupCommitter("file+dir")
+    pairs = [make_temp(str(tmp_path), f"f{n}.txt") for n in range(10)]
+    threads = [threading.Thread(target=committer.commit, args=([pair],)) for pair in pairs]
+    threads[0].start()
+    first_sync.wait()
+    for thread in threads[1:]:
+        thread.start()
+    assert wait_for(lambda: len(committer._pending) == 9)
+    release.set()
+    for thread in threads:
+        thread.join()
+    committer.close()
+    assert (committer.groups, committer.committed) == (2, 10)
+    assert len(os.listdir(tmp_path)) == 10
+
+
+def test_failed_commit_raises_and_leaves_the_others(tmp_path):
+    committer = GroupCommitter("file")
+    try:
+        good = make_temp(str(tmp_path), "good.txt")
+        with pytest.raises(OSError):
+            committer.commit([(str(tmp_path / "gone.tmp"), str(tmp_path / "gone.txt"))])
+        committer.commit([good])
+    finally:
+        committer.close()
+    assert os.listdir(tmp_path) == ["good.txt"]
+    with pytest.raises(RuntimeError):
+        committer.commit([make_temp(str(tmp_path), "late.txt")])
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        GroupCommitter("sometimes")
+
+
+def test_stale_temp_files_are_removed_at_start(make_server, tmp_path):
+    data_path = tmp_path / "server"
+    (data_path / "docs").mkdir(parents=True)
+    make_temp(str(data_path), "upload.txt")
+    (data_path / "docs" / (tree.PART_PREFIX + "guide.txt")).write_bytes(b"half")
+    (data_path / "docs" / "kept.txt").write_bytes(b"kept")
+
+    make_server("server")
+    assert os.listdir(data_path / "docs") == ["kept.txt"]
+    assert not any(name.startswith(durability.TEMP_PREFIX) for name in os.listdir(data_path))
@@ -0,0 +1,62 @@
+import queue
+import threading
+
+import pytest
+
+tk = pytest.importorskip("tkinter")
+
+from userInterface import MAX_LOG_LINES, FileTransferGUI  # noqa: E402
+
+
+def headless_gui():
+    """The logging state of a FileTransferGUI before a role is chosen, without building any widgets."""
+    gui = FileTransferGUI.__new__(FileTransferGUI)
+    gui.role = None
+    gui.server_log_text = gui.client_log_text = None
+    gui._log_queue = queue.SimpleQueue()
+    return gui
+
+
+def test_lines_logged_from_threads_render_in_one_batch(capsys):
+    gui = headless_gui()
+    threads = [threading.Thread(target=lambda n=n: [gui._log_message(f"t{n} line {i}") for i in range(100)])
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    gui._drain_log_queue()
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 400
+    assert [line for line in lines if line.startswith("t2 ")] == [f"t2 line {i}" for i in range(100)]
+    gui._drain_log_queue()
+    assert capsys.readouterr().out == ""
+
+
+def test_a_backlog_larger_than_the_view_is_cut_before_rendering(capsys):
+    gui = headless_gui()
+    for i in range(MAX_LOG_LINES + 10):
+        gui._log_message(f"line {i}")
+
+    gui._drain_log_queue()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "... 11 log lines skipped ..."
+    assert lines[1] == "line 11" and lines[-1] == f"line {MAX_LOG_LINES + 9}"
+
+
+def test_log_view_keeps_the_newest_lines():
+    try:
+        window = tk.Tk()
+    except tk.TclError:
+        pytest.skip("needs a display")
+    try:
+        gui = headless_gui()
+        gui.role = "CLIENT"
+        gui.client_log_text = tk.Text(window)
+        gui._append_to_log([f"first {i}" for i in range(MAX_LOG_LINES - 1)])
+        gui._append_to_log(["second 0", "second 1"])
+        text = gui.client_log_text.get("1.0", "end-1c").splitlines()
+        assert len(text) <= MAX_LOG_LINES and text[-1] == "second 1"
+    finally:
+        window.destroy()
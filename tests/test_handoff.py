@@ -0,0 +1,70 @@
+import threading
+import time
+
+from client import FileClient
+from handoff import HandoffListener, receive_handoff
+from pool import ConnectionPool
+from server import FileServer
+
+from conftest import PASSWORD, USERNAME, WAIT, quiet, stored_name, wait_for
+
+
+def slow_source():
+    for _ in range(20):
+        time.sleep(0.05)
+        yield b"x" * 65536
+
+
+def test_drain_lets_an_in_flight_upload_finish(server, connect):
+    uploader = connect(server)
+    idle = connect(server)
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(uploader.send_stream(slow_source(), "slow.bin")))
+    thread.start()
+    assert wait_for(lambda: any(session["operation"] for _, session in server.list_active_clients()))
+
+    assert server.drain(timeout=WAIT) == 0
+    thread.join(WAIT)
+    assert result and result[0].startswith("SUCCESS")
+    assert server.server is None
+    assert idle.server_closed()
+
+
+def test_successor_takes_over_without_dropping_transfers(make_server, connect, tmp_path):
+    old = make_server("data")
+    listener = HandoffListener(old, path=str(tmp_path / "handoff.sock"), drain_timeout=WAIT)
+    listener.start()
+    pool = ConnectionPool("127.0.0.1", old.port, USERNAME, PASSWORD, size=2, log_callback=quiet, stats_file=None)
+    new = None
+    try:
+        pool.warm()
+        uploader = connect(old)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(uploader.send_stream(slow_source(), "slow.bin")))
+        thread.start()
+        assert wait_for(lambda: any(session["operation"] for _, session in old.list_active_clients()))
+
+        new = FileServer("127.0.0.1", old.port, old.data_path, quiet, stats_file=None)
+        assert receive_handoff(new, path=listener.path)
+        thread.join(WAIT)
+        name = stored_name(result[0]) if result else None
+        assert listener.finished.wait(WAIT) and old.server is None
+
+        # Pooled connections were closed by the old server and reconnect to the new one
+        assert wait_for(lambda: name in pool.call("handle_dir"))
+        resumed = FileClient("127.0.0.1", new.port, quiet, stats_file=None)
+        resumed.username = USERNAME
+        assert resumed.resume_session(pool.session_token).startswith("AUTH_SUCCESS")
+        resumed.disconnect()
+    finally:
+        pool.close()
+        listener.close()
+        if new is not None and new.server:
+            new.stop()
+
+
+def test_receive_handoff_without_a_running_server(tmp_path):
+    server = FileServer("127.0.0.1", 0, str(tmp_path / "data"), quiet, stats_file=None)
+    assert receive_handoff(server, path=str(tmp_path / "nobody.sock")) is False
+    assert server.server is None
@@ -0,0 +1,33 @@
+import os
+
+import client as client_module
+from catalog import CATALOG_FILE
+from integrity import hash_file
+
+from conftest import stored_name, wait_for
+
+
+def test_verified_upload_records_the_digest(client, make_file):
+    path = make_file("data.bin", os.urandom(300_000))
+    name = stored_name(client.send_file(path))
+    entry = client.query_catalog(original_name="data.bin")[0]
+    assert entry["logical_name"] == name
+    assert entry["digest"] == hash_file(path, entry["algorithm"])
+
+
+def test_upload_of_a_file_that_shrinks_is_aborted(server, connect, make_file, monkeypatch):
+    path = make_file("shrinks.txt", b"x" * 5000)
+    real_getsize = os.path.getsize
+    # The announced size is larger than what is read, as if the file shrank after it was measured
+    monkeypatch.setattr(client_module.os.path, "getsize",
+                        lambda p: real_getsize(p) + (100 if p == path else 0))
+
+    for verify in (True, False):
+        client = connect(server)
+        result = client.send_file(path, verify=verify)
+        assert result.startswith("ERROR") and "changed while uploading" in result
+        assert not client.is_connected
+
+    # The server discards both short uploads instead of storing zero padding
+    assert wait_for(lambda: not server.list_active_clients())
+    assert [name for name in os.listdir(server.data_path) if not name.startswith(CATALOG_FILE)] == []
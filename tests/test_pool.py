@@ -0,0 +1,57 @@
+import pytest
+
+from pool import ConnectionPool, PoolClosedError
+
+from conftest import PASSWORD, USERNAME, quiet, wait_for
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(server, password=PASSWORD, **kwargs):
+        pool = ConnectionPool("127.0.0.1", server.port, USERNAME, password, log_callback=quiet, stats_file=None,
+                              **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_calls_reuse_warm_connections(server, make_pool):
+    pool = make_pool(server, size=2)
+    pool.warm()
+    assert wait_for(lambda: len(server.list_active_clients()) == 2)
+    for _ in range(10):
+        assert "Filename" in pool.call("handle_dir")
+    assert len(server.list_active_clients()) == 2
+
+
+def test_closed_connections_are_replaced(server, make_pool):
+    pool = make_pool(server, size=2)
+    pool.warm()
+    assert wait_for(lambda: len(server.list_active_clients()) == 2)
+    server.close_idle_sessions()  # As a draining server does
+    assert "Filename" in pool.call("handle_dir")
+    assert pool.session_token  # Replacements resume with the session token
+
+
+def test_bulk_transfers_leave_an_interactive_connection(server, make_pool):
+    pool = make_pool(server, size=2)
+    bulk = pool.acquire(bulk=True)
+    with pytest.raises(TimeoutError):
+        pool.acquire(bulk=True, timeout=0.2)
+    interactive = pool.acquire(timeout=1)
+    pool.release(interactive)
+    pool.release(bulk, bulk=True)
+
+
+def test_wrong_password_and_closed_pool(server, make_pool):
+    with pytest.raises(ConnectionError):
+        make_pool(server, password="wrong").acquire()
+    pool = make_pool(server)
+    pool.close()
+    with pytest.raises(PoolClosedError):
+        pool.acquire()
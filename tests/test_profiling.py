@@ -0,0 +1,42 @@
+import os
+
+from profiling import Instrumentation
+
+from conftest import stored_name
+
+
+def test_spans_are_recorded_only_when_enabled():
+    instrumentation = Instrumentation(enabled=False)
+    with instrumentation.span("disk_io"):
+        pass
+    assert instrumentation.snapshot() == {}
+
+    instrumentation.enabled = True
+    for _ in range(3):
+        with instrumentation.span("disk_io"):
+            pass
+    stats = instrumentation.snapshot()["disk_io"]
+    assert stats["count"] == 3 and stats["max_ms"] >= stats["avg_ms"] >= 0
+    assert "disk_io" in instrumentation.format_report()
+
+
+def test_server_records_protocol_phases(make_server, connect, make_file):
+    server = make_server(instrumentation=Instrumentation(enabled=True))
+    client = connect(server)
+    stored_name(client.send_file(make_file("spans.txt", b"span data")))
+    assert {"auth", "recv_command"} <= set(server.instrumentation.snapshot())
+
+
+def test_admin_profiles_a_running_server(make_server, connect, tmp_path):
+    server = make_server(profile_dir=str(tmp_path / "profiles"))
+    assert connect(server).handle_profile("START").startswith("ERROR")  # Not an admin
+
+    admin = connect(server, username="admin")
+    assert admin.handle_profile("START") == "Profiling started."
+    admin.handle_dir()
+    stopped = admin.handle_profile("STOP")
+    path = stopped.split("'")[1]
+    assert os.path.dirname(path) == str(tmp_path / "profiles")
+    with open(path) as f:
+        assert all(line.rsplit(" ", 1)[1].strip().isdigit() for line in f)
+    assert "Phase" in admin.handle_profile("STATS")
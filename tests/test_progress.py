@@ -0,0 +1,67 @@
+import os
+import threading
+
+import pytest
+
+import durability
+from progress import ProgressMeter, TransferCancelled, format_bytes, format_eta
+
+from conftest import stored_name, wait_for
+
+
+def test_events_are_throttled_to_the_interval():
+    events = []
+    meter = ProgressMeter("f.bin", "upload", 1000, events.append, interval=3600)
+    for _ in range(10):
+        meter(100)
+    assert events == []  # Nothing until the interval passes...
+    meter.finish()
+    assert len(events) == 1 and events[0].finished and events[0].done == 1000  # ...but finish always reports
+
+
+def test_events_carry_rate_and_eta():
+    events = []
+    meter = ProgressMeter("f.bin", "download", 1000, events.append, interval=0)
+    meter(250)
+    meter(250)
+    event = events[-1]
+    assert (event.done, event.fraction) == (500, 0.5)
+    assert event.avg_rate > 0 and event.eta == pytest.approx(500 / event.avg_rate)
+    assert "ETA" in event.describe()
+
+
+def test_cancel_event_stops_the_transfer_loop():
+    cancel = threading.Event()
+    meter = ProgressMeter("f.bin", "upload", 1000, cancel_event=cancel)
+    meter(100)
+    cancel.set()
+    with pytest.raises(TransferCancelled):
+        meter(100)
+
+
+@pytest.mark.parametrize("value, text", [(512, "512 B"), (1536, "1.5 KB"), (5 * 1024 ** 3, "5.0 GB")])
+def test_format_bytes(value, text):
+    assert format_bytes(value) == text
+
+
+def test_format_eta():
+    assert (format_eta(None), format_eta(75), format_eta(3725)) == ("--:--", "01:15", "1:02:05")
+
+
+def test_upload_and_download_report_progress(client, make_file, tmp_path):
+    data = os.urandom(3 * 1024 * 1024)
+    uploads, downloads = [], []
+    name = stored_name(client.send_file(make_file("big.bin", data), progress=uploads.append))
+    assert client.receive_file(name, str(tmp_path), progress=downloads.append).startswith("SUCCESS")
+    for events in (uploads, downloads):
+        assert events[-1].finished and events[-1].done == len(data)
+        assert [event.done for event in events] == sorted(event.done for event in events)
+
+
+def test_cancelled_upload_is_discarded(server, client, make_file):
+    cancel = threading.Event()
+    cancel.set()  # Stops the upload after its first chunk
+    result = client.send_file(make_file("big.bin", os.urandom(8 * 1024 * 1024)), cancel_event=cancel)
+    assert result.startswith("CANCELLED")
+    assert wait_for(lambda: not any(name.endswith("big.bin") or name.startswith(durability.TEMP_PREFIX)
+                                    for name in os.listdir(server.data_path)))
@@ -0,0 +1,29 @@
+import os
+import socket
+import threading
+
+from protocol import ChunkedReader, ChunkedWriter, recv_frame, recv_json, send_frame, send_json
+
+
+def test_frames_and_json_round_trip():
+    a, b = socket.socketpair()
+    with a, b:
+        send_frame(a, b"payload")
+        send_frame(a, b"")
+        send_json(a, {"files": [1, 2], "name": "é"})
+        assert recv_frame(b) == b"payload"
+        assert recv_frame(b) == b""
+        assert recv_json(b) == {"files": [1, 2], "name": "é"}
+
+
+def test_chunked_stream_round_trip():
+    a, b = socket.socketpair()
+    data = os.urandom(200 * 1024)
+    with a, b:
+        writer = ChunkedWriter(a, chunk_size=64 * 1024)
+        thread = threading.Thread(target=lambda: (writer.write(data[:1000]), writer.write(data[1000:]), writer.close()))
+        thread.start()
+        reader = ChunkedReader(b)
+        assert reader.read() == data
+        thread.join()
+        assert reader.finished and reader.bytes_read == writer.bytes_written == len(data)
@@ -0,0 +1,54 @@
+import os
+
+import replication
+from replication import ChangeLog, ReplicatedClient
+
+from conftest import PASSWORD, USERNAME, quiet, stored_name, wait_for
+
+
+def test_change_log_resumes_from_a_seq(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.sqlite3"))
+    try:
+        first = log.append("put", "a.txt", size=1)
+        log.append("delete", "a.txt")
+        assert [(change["op"], change["name"]) for change in log.since(first)] == [("delete", "a.txt")]
+        assert log.since(first)[0]["seq"] == log.head
+        assert not log.wait(log.head, timeout=0.05)
+
+        log.trim(keep=1)
+        assert log.oldest() == log.head
+        assert ChangeLog(str(tmp_path / "changes.sqlite3")).head == log.head  # Survives a restart
+    finally:
+        log.close()
+
+
+def test_replica_follows_primary(make_server, connect, make_file):
+    primary = make_server("primary", changelog_file=replication.CHANGELOG_FILE)
+    writer = connect(primary)
+    first = stored_name(writer.send_file(make_file("first.txt", b"one")))
+
+    replica = make_server("replica", replica_of=replication.Follower(f"127.0.0.1:{primary.port}", password=PASSWORD))
+    assert wait_for(lambda: replica.storage.exists(first))
+
+    second = stored_name(writer.send_file(make_file("second.txt", b"two")))
+    assert "deleted" in writer.handle_delete(first)
+    assert wait_for(lambda: replica.storage.exists(second) and not replica.storage.exists(first))
+    with open(os.path.join(replica.data_path, second), "rb") as f:
+        assert f.read() == b"two"
+
+    reader = connect(replica)
+    assert reader.handle_delete(second).startswith("ERROR")  # Replicas are read-only
+
+
+def test_reads_fall_back_to_the_primary(make_server, make_file, tmp_path):
+    primary = make_server("primary", changelog_file=replication.CHANGELOG_FILE)
+    lagging = make_server("lagging")  # Stands in for a replica that has not caught up yet
+    client = ReplicatedClient(f"127.0.0.1:{primary.port}", [f"127.0.0.1:{lagging.port}"], USERNAME, PASSWORD,
+                              log_callback=quiet)
+    try:
+        name = stored_name(client.send_file(make_file("fresh.txt", b"fresh")))
+        assert primary.storage.exists(name) and not lagging.storage.exists(name)
+        assert client.receive_file(name, str(tmp_path)).startswith("SUCCESS")
+        assert (tmp_path / name).read_bytes() == b"fresh"
+    finally:
+        client.close()
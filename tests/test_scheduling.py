@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+import pytest
+
+from scheduling import ACQUIRE_POLL, IoScheduler, TransferAborted
+
+from conftest import WAIT, stored_name, wait_for
+
+
+def start_chunk(scheduler, session, nbytes, order):
+    """Queue one bulk chunk in a thread; order records when it is granted, or the error it failed with."""
+    stream = scheduler.stream(session)
+
+    def run():
+        try:
+            stream(nbytes)
+            order.append(session)
+        except TransferAborted as e:
+            order.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return stream, thread
+
+
+def test_contended_slots_are_granted_in_fair_order():
+    scheduler = IoScheduler(slots=1)
+    holder = scheduler.stream("holder")
+    holder(1)
+    order = []
+    # "big" queues first, but its chunk finishes later in virtual time than "small"'s
+    big, big_thread = start_chunk(scheduler, "big", 1_000_000, order)
+    assert wait_for(lambda: len(scheduler._waiters) == 1)
+    small, small_thread = start_chunk(scheduler, "small", 1_000, order)
+    assert wait_for(lambda: len(scheduler._waiters) == 2)
+
+    holder.close()
+    small_thread.join(WAIT)
+    small.close()
+    big_thread.join(WAIT)
+    big.close()
+    assert order == ["small", "big"]
+
+
+def test_interactive_operations_hold_back_new_bulk_chunks():
+    scheduler = IoScheduler(slots=2)
+    order = []
+    with scheduler.interactive():
+        stream, thread = start_chunk(scheduler, "bulk", 1_000, order)
+        time.sleep(0.1)
+        assert order == []
+    thread.join(WAIT)
+    stream.close()
+    assert order == ["bulk"]
+
+
+def test_abort_wakes_a_queued_chunk_at_once():
+    scheduler = IoScheduler(slots=1)
+    holder = scheduler.stream("holder")
+    holder(1)
+    order = []
+    _, thread = start_chunk(scheduler, "stuck", 1_000, order)
+    assert wait_for(lambda: scheduler._waiters)
+
+    start = time.monotonic()
+    scheduler.abort("stuck")
+    thread.join(WAIT)
+    assert time.monotonic() - start < ACQUIRE_POLL
+    assert len(order) == 1 and isinstance(order[0], TransferAborted)
+    holder.close()
+
+
+def test_slots_must_be_positive():
+    with pytest.raises(ValueError):
+        IoScheduler(slots=0)
+
+
+def test_stalled_interactive_command_does_not_block_bulk_transfers(server, connect, make_file, tmp_path):
+    uploader = connect(server)
+    name = stored_name(uploader.send_file(make_file("big.bin", os.urandom(4 * 1024 * 1024))))
+
+    # Sends SEARCH and never the query that should follow, so its handler waits on the socket
+    stalled = connect(server)
+    stalled.client_socket.send(b"SEARCH")
+    assert stalled.client_socket.recv(1024).startswith(b"READY")
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(uploader.receive_file(name, str(tmp_path))), daemon=True)
+    thread.start()
+    thread.join(WAIT)
+    assert result and result[0].startswith("SUCCESS")
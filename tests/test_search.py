@@ -0,0 +1,36 @@
+from search import tokenize
+
+from conftest import stored_name
+
+
+def test_search_names_and_content(client, make_file):
+    stored_name(client.send_file(make_file("quarterly_report.txt", b"revenue grew in the northern region")))
+    stored_name(client.send_file(make_file("notes.txt", b"nothing to see")))
+
+    by_name = client.search("quarterly")
+    assert [hit["original_name"] for hit in by_name["results"]] == ["quarterly_report.txt"]
+    by_content = client.search("northern", content=True)
+    assert by_content["total"] == 1
+
+
+def test_results_are_paged(client, make_file):
+    for n in range(5):
+        stored_name(client.send_file(make_file(f"invoice_{n}.txt", b"x")))
+
+    first = client.search("invoice", limit=3)
+    assert (first["total"], len(first["results"]), first["next_offset"]) == (5, 3, 3)
+    rest = client.search("invoice", offset=first["next_offset"], limit=3)
+    assert len(rest["results"]) == 2 and rest["next_offset"] is None
+    names = {hit["original_name"] for hit in first["results"] + rest["results"]}
+    assert names == {f"invoice_{n}.txt" for n in range(5)}
+
+
+def test_deleted_files_leave_the_index(client, make_file):
+    name = stored_name(client.send_file(make_file("budget.txt", b"spreadsheet totals")))
+    assert "deleted" in client.handle_delete(name)
+    assert client.search("budget")["total"] == 0
+    assert client.search("spreadsheet", content=True)["total"] == 0
+
+
+def test_tokenize_splits_names_case_insensitively():
+    assert tokenize("Quarterly_Report-2024.PDF") == ["quarterly", "report", "2024", "pdf"]
@@ -0,0 +1,10 @@
+import os
+
+from conftest import stored_name
+
+
+def test_upload_and_download(client, make_file, tmp_path):
+    data = os.urandom(3 * 1024 * 1024)  # Above PRIORITY_BYTES, so it goes through the bulk lane
+    name = stored_name(client.send_file(make_file("big.bin", data)))
+    assert client.receive_file(name, str(tmp_path)).startswith("SUCCESS")
+    assert (tmp_path / name).read_bytes() == data
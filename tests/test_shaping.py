@@ -0,0 +1,43 @@
+import os
+import time
+
+import pytest
+
+from shaping import PRIORITY_BYTES, RateLimits, TokenBucket, parse_rate
+
+from conftest import stored_name
+
+
+@pytest.mark.parametrize("text, rate", [("500K", 500 * 1024), ("20M/s", 20 * 1024 ** 2), ("1GB", 1024 ** 3),
+                                        ("1.5k", 1536), ("0", None), ("", None), (None, None)])
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+def test_bucket_allows_a_burst_then_charges_debt():
+    bucket = TokenBucket(1024 * 1024, burst=512 * 1024)
+    assert bucket.reserve(512 * 1024) == 0.0
+    # The bucket is empty, so the next half second of traffic must wait about half a second
+    assert bucket.reserve(512 * 1024) == pytest.approx(0.5, abs=0.05)
+
+
+def test_user_buckets_are_shared_between_connections():
+    limits = RateLimits(per_user=1024 * 1024, user_rates={"fast": 8 * 1024 * 1024})
+    first, second = limits.shaper_for("user1"), limits.shaper_for("user1")
+    assert first.buckets[0] is second.buckets[0]
+    assert limits.shaper_for("fast").buckets[0].rate == 8 * 1024 * 1024
+    assert RateLimits().shaper_for("user1") is None
+
+
+def test_bulk_download_is_held_to_the_global_rate(make_server, connect, make_file, tmp_path):
+    rate = 4 * 1024 * 1024
+    server = make_server(rate_limits=RateLimits(global_rate=rate))
+    client = connect(server)
+    size = 3 * 1024 * 1024
+    assert size > PRIORITY_BYTES
+    name = stored_name(client.send_file(make_file("big.bin", os.urandom(size))))
+
+    start = time.monotonic()
+    assert client.receive_file(name, str(tmp_path)).startswith("SUCCESS")
+    # The upload already drained the bucket, so the whole download is paced at the rate
+    assert time.monotonic() - start >= 0.8 * size / rate
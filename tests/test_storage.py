@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from storage import TieredStorage
+
+from conftest import stored_name
+
+
+@pytest.fixture
+def tiered(tmp_path):
+    storage = TieredStorage(str(tmp_path / "hot"), str(tmp_path / "cold"), hot_capacity=250)
+    storage.setup()
+    return storage
+
+
+def store(storage, name, data):
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    storage.stored(name)
+
+
+def test_least_recently_used_files_are_demoted_and_promoted_on_access(tiered):
+    store(tiered, "a.txt", b"a" * 100)
+    store(tiered, "b.txt", b"b" * 100)
+    tiered.fetch("a.txt")  # b.txt is now the least recently used
+    store(tiered, "c.txt", b"c" * 100)
+
+    assert not os.path.exists(tiered.path("b.txt")) and tiered.cold.exists("b.txt")
+    assert tiered.names() == ["a.txt", "b.txt", "c.txt"]
+    assert tiered.size("b.txt") == 100
+
+    with open(tiered.fetch("b.txt"), "rb") as f:
+        assert f.read() == b"b" * 100
+    assert not tiered.cold.exists("b.txt")
+    assert tiered.stats()["promotions"] == 1
+    assert tiered.stats()["hot_bytes"] <= 250
+
+
+def test_remove_and_overwrite_reach_the_cold_tier(tiered):
+    for name in ("docs/a.txt", "b.txt", "c.txt"):
+        store(tiered, name, name.encode() * 20)
+    assert tiered.cold.exists("docs/a.txt")
+    assert "docs" in tiered.folders()
+
+    store(tiered, "docs/a.txt", b"new")  # The stale cold copy is dropped
+    assert not tiered.cold.exists("docs/a.txt")
+    tiered.remove("b.txt")
+    assert not tiered.exists("b.txt")
+    with pytest.raises(FileNotFoundError):
+        tiered.remove("b.txt")
+
+
+def test_download_of_a_demoted_file(make_server, connect, make_file, tmp_path):
+    storage = TieredStorage(str(tmp_path / "hot"), str(tmp_path / "cold"), hot_capacity=250_000)
+    server = make_server(storage=storage)
+    client = connect(server)
+    names = [stored_name(client.send_file(make_file(f"f{n}.bin", bytes([n]) * 100_000))) for n in range(3)]
+    assert storage.cold.exists(names[0])
+    assert names[0] in client.handle_dir()
+
+    out = tmp_path / "out"
+    out.mkdir()
+    assert client.receive_file(names[0], str(out)).startswith("SUCCESS")
+    assert (out / names[0]).read_bytes() == bytes([0]) * 100_000
+    assert storage.stats()["promotions"] == 1
@@ -0,0 +1,46 @@
+import io
+import os
+
+import pytest
+
+import durability
+
+from conftest import stored_name, wait_for
+
+
+def test_stream_upload_and_remote_read(client):
+    data = os.urandom(3 * 1024 * 1024)
+    chunks = (data[offset:offset + 100_000] for offset in range(0, len(data), 100_000))
+    name = stored_name(client.send_stream(chunks, "generated.bin"))
+
+    with client.open_remote(name) as remote:
+        assert remote.size == len(data)
+        assert b"".join(bytes(chunk) for chunk in remote.iter_chunks()) == data
+        assert remote.digest is not None
+    assert stored_name(client.send_stream(io.BytesIO(b"from a file object"), "small.txt"))
+
+
+def test_closing_a_remote_file_early_keeps_the_session_usable(client):
+    name = stored_name(client.send_stream(os.urandom(2 * 1024 * 1024), "big.bin"))
+    with client.open_remote(name) as remote:
+        assert len(remote.read(1000)) == 1000
+    assert name in client.handle_dir()
+
+
+def test_missing_remote_file_raises(client):
+    with pytest.raises(FileNotFoundError):
+        client.open_remote("missing.bin")
+    assert "Filename" in client.handle_dir()
+
+
+def test_failing_source_leaves_nothing_stored(server, client):
+    def broken_source():
+        yield b"x" * 100_000
+        raise OSError("pipe broke")
+
+    result = client.send_stream(broken_source(), "broken.bin")
+    assert result.startswith("ERROR") and "pipe broke" in result
+    assert not client.is_connected
+    # The server notices the dropped connection on its own thread
+    assert wait_for(lambda: not any(name.endswith("broken.bin") or name.startswith(durability.TEMP_PREFIX)
+                                    for name in os.listdir(server.data_path)))
@@ -0,0 +1,96 @@
+import pytest
+
+from pool import ConnectionPool
+from sync import SyncEngine, batches
+
+from conftest import PASSWORD, USERNAME, quiet
+
+
+@pytest.fixture
+def pool(server):
+    pool = ConnectionPool("127.0.0.1", server.port, USERNAME, PASSWORD, log_callback=quiet, stats_file=None)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def sync(pool, tmp_path):
+    """sync(name, **options) syncs tmp_path/name with the server folder "shared"; returns the summary."""
+    def run(name, dry_run=False, **options):
+        local = tmp_path / name
+        local.mkdir(exist_ok=True)
+        return SyncEngine(pool, str(local), "shared", **options).run(dry_run)
+
+    return run
+
+
+def summary_counts(summary):
+    return {key: summary[key] for key in ("upload", "download", "delete_remote", "delete_local") if summary[key]}
+
+
+def test_two_way_sync_transfers_only_changes(sync, tmp_path):
+    laptop, desktop = tmp_path / "laptop", tmp_path / "desktop"
+    (laptop / "docs").mkdir(parents=True)
+    (laptop / "a.txt").write_text("alpha")
+    (laptop / "docs" / "b.txt").write_text("bravo")
+
+    assert summary_counts(sync("laptop")) == {"upload": 2}
+    again = sync("laptop")
+    assert (summary_counts(again), again["unchanged"]) == ({}, 2)
+
+    assert summary_counts(sync("desktop")) == {"download": 2}
+    assert (desktop / "docs" / "b.txt").read_text() == "bravo"
+
+    (desktop / "a.txt").write_text("alpha, edited on the desktop")
+    (desktop / "c.txt").write_text("charlie")
+    assert summary_counts(sync("desktop")) == {"upload": 2}
+    assert summary_counts(sync("laptop")) == {"download": 2}
+    assert (laptop / "a.txt").read_text() == "alpha, edited on the desktop"
+    assert (laptop / "c.txt").read_text() == "charlie"
+
+
+def test_deletions_are_mirrored_only_when_asked(sync, tmp_path):
+    laptop, desktop = tmp_path / "laptop", tmp_path / "desktop"
+    laptop.mkdir()
+    (laptop / "a.txt").write_text("alpha")
+    (laptop / "b.txt").write_text("bravo")
+    sync("laptop")
+    sync("desktop")
+
+    (laptop / "b.txt").unlink()
+    assert summary_counts(sync("laptop")) == {"download": 1}  # Restored from the server
+    (laptop / "b.txt").unlink()
+    assert summary_counts(sync("laptop", delete=True)) == {"delete_remote": 1}
+    assert summary_counts(sync("desktop", delete=True)) == {"delete_local": 1}
+    assert sorted(path.name for path in desktop.iterdir() if not path.name.startswith(".")) == ["a.txt"]
+
+
+@pytest.mark.parametrize("policy, winner", [("local", "laptop"), ("remote", "desktop")])
+def test_conflicts_follow_the_policy(sync, tmp_path, policy, winner):
+    laptop, desktop = tmp_path / "laptop", tmp_path / "desktop"
+    laptop.mkdir()
+    (laptop / "a.txt").write_text("original")
+    sync("laptop")
+    sync("desktop")
+
+    (desktop / "a.txt").write_text("desktop edit")
+    sync("desktop")
+    (laptop / "a.txt").write_text("laptop edit, longer")
+    summary = sync("laptop", conflict=policy)
+    assert [conflict["path"] for conflict in summary["conflicts"]] == ["a.txt"]
+    assert (laptop / "a.txt").read_text() == f"{winner} edit" + (", longer" if winner == "laptop" else "")
+
+
+def test_dry_run_changes_nothing(sync, tmp_path):
+    (tmp_path / "laptop").mkdir()
+    (tmp_path / "laptop" / "a.txt").write_text("alpha")
+    summary = sync("laptop", dry_run=True)
+    assert (summary["dry_run"], summary_counts(summary)) == (True, {"upload": 1})
+    assert summary_counts(sync("desktop")) == {}
+    assert summary_counts(sync("laptop")) == {"upload": 1}
+
+
+def test_batches_cut_on_files_and_bytes():
+    items = [(n, 10) for n in range(7)]
+    assert list(batches(items, max_files=3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batches(items, max_bytes=25)) == [[0, 1], [2, 3], [4, 5], [6]]
@@ -0,0 +1,62 @@
+import os
+import shutil
+import ssl
+
+import pytest
+
+import tls
+from client import FileClient
+
+from conftest import PASSWORD, USERNAME, quiet, stored_name
+
+pytestmark = pytest.mark.skipif(shutil.which("openssl") is None, reason="needs the openssl CLI")
+
+
+@pytest.fixture
+def cert(tmp_path):
+    return tls.generate_self_signed(str(tmp_path / "tls" / "cert.pem"), str(tmp_path / "tls" / "key.pem"))
+
+
+@pytest.fixture
+def tls_server(make_server, cert):
+    return make_server(ssl_context=tls.create_server_context(*cert))
+
+
+def tls_client(server, context, tls_session=None):
+    client = FileClient("127.0.0.1", server.port, quiet, stats_file=None, ssl_context=context,
+                        server_hostname="localhost", tls_session=tls_session)
+    assert client.connect()
+    assert client.authenticate(USERNAME, PASSWORD) == "AUTH_SUCCESS"
+    return client
+
+
+def test_transfer_over_tls(tls_server, cert, make_file, tmp_path):
+    client = tls_client(tls_server, tls.create_client_context(cafile=cert[0]))
+    try:
+        assert isinstance(client.client_socket, ssl.SSLSocket)
+        data = os.urandom(2 * 1024 * 1024)
+        name = stored_name(client.send_file(make_file("secret.bin", data)))
+        assert client.receive_file(name, str(tmp_path)).startswith("SUCCESS")
+        assert (tmp_path / name).read_bytes() == data
+    finally:
+        client.disconnect()
+
+
+def test_reconnect_resumes_the_tls_session(tls_server, cert):
+    context = tls.create_client_context(cafile=cert[0])
+    first = tls_client(tls_server, context)
+    first.handle_dir()  # Lets the server's session tickets arrive before the session is saved
+    first.disconnect()
+    assert first.tls_session is not None
+
+    second = tls_client(tls_server, context, tls_session=first.tls_session)
+    try:
+        assert second.client_socket.session_reused
+    finally:
+        second.disconnect()
+
+
+def test_untrusted_certificate_is_rejected(tls_server):
+    client = FileClient("127.0.0.1", tls_server.port, quiet, stats_file=None,
+                        ssl_context=tls.create_client_context(), server_hostname="localhost")
+    assert not client.connect()
@@ -0,0 +1,89 @@
+import os
+import threading
+
+import pytest
+
+from pool import ConnectionPool
+from transfer_queue import CANCELLED, DONE, FAILED, FINISHED_STATES, PAUSED, QUEUED, RUNNING, TransferQueue
+
+from conftest import PASSWORD, USERNAME, quiet, wait_for
+
+
+@pytest.fixture
+def make_queue(server):
+    pool = ConnectionPool("127.0.0.1", server.port, USERNAME, PASSWORD, size=4, log_callback=quiet,
+                          stats_file=None)
+    queues = []
+
+    def make(**kwargs):
+        transfers = TransferQueue(pool, log_callback=quiet, **kwargs)
+        queues.append(transfers)
+        return transfers
+
+    yield make
+    for transfers in queues:
+        transfers.close()
+    pool.close()
+
+
+def all_finished(transfers):
+    return wait_for(lambda: all(job.state in FINISHED_STATES for job in transfers.jobs()))
+
+
+def test_jobs_run_with_bounded_concurrency(make_queue, make_file, tmp_path):
+    running, peak, lock = set(), [0], threading.Lock()
+
+    def on_change(job):
+        if job is None:
+            return
+        with lock:
+            (running.add if job.state == RUNNING else running.discard)(job.id)
+            peak[0] = max(peak[0], len(running))
+
+    transfers = make_queue(concurrency=2, on_change=on_change)
+    paths = [make_file(f"f{n}.bin", os.urandom(500_000)) for n in range(6)]
+    uploads = transfers.add_uploads(paths)
+    assert all_finished(transfers)
+    assert [job.state for job in uploads] == [DONE] * 6
+    assert 1 <= peak[0] <= 2
+
+    names = [job.result.split("'")[1] for job in uploads]
+    (tmp_path / "out").mkdir()
+    transfers.add_downloads(names, str(tmp_path / "out"))
+    assert all_finished(transfers)
+    assert transfers.stats()[DONE] == 12
+    for path, name in zip(paths, names):
+        assert (tmp_path / "out" / name).read_bytes() == open(path, "rb").read()
+
+
+def test_pause_cancel_and_resume(make_queue, make_file):
+    transfers = make_queue()
+    transfers.pause_all()
+    first, second, third = transfers.add_uploads([make_file(f"{n}.txt", b"x" * 1000) for n in "abc"])
+    assert [job.state for job in transfers.jobs()] == [QUEUED] * 3
+
+    assert transfers.pause(first.id) and transfers.cancel(second.id)
+    assert transfers.move_to_front(third.id) == 0
+    assert [job.id for job in transfers.jobs()] == [third.id, first.id, second.id]
+    transfers.resume_all()
+    assert wait_for(lambda: third.state == DONE)
+    assert (first.state, second.state) == (PAUSED, CANCELLED)
+
+    assert transfers.resume(first.id) and transfers.retry(second.id)
+    assert all_finished(transfers)
+    assert [job.state for job in transfers.jobs()] == [DONE] * 3
+
+
+def test_failed_upload_is_retried_with_the_current_size(make_queue, tmp_path):
+    transfers = make_queue()
+    path = tmp_path / "late.txt"
+    job = transfers.add_upload(str(path))  # Not written yet
+    assert all_finished(transfers)
+    assert job.state == FAILED and job.size is None
+
+    path.write_bytes(b"y" * 2000)
+    assert transfers.retry_failed() == [job.id]
+    assert all_finished(transfers)
+    assert (job.state, job.size, job.attempts) == (DONE, 2000, 2)
+    transfers.clear_finished()
+    assert transfers.jobs() == []
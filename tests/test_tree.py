@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import tree
+
+
+@pytest.fixture
+def project(tmp_path):
+    local = tmp_path / "project"
+    (local / "docs" / "deep").mkdir(parents=True)
+    (local / "readme.txt").write_bytes(b"top")
+    (local / "docs" / "guide.txt").write_bytes(b"guide " * 1000)
+    (local / "docs" / "deep" / "data.bin").write_bytes(os.urandom(100_000))
+    return local
+
+
+@pytest.mark.parametrize("compression", tree.COMPRESSIONS)
+def test_tree_round_trip(client, project, tmp_path, compression):
+    assert client.upload_tree(str(project), "project", compression=compression).startswith("SUCCESS")
+    out = tmp_path / "copy"
+    assert client.download_tree("project", str(out), compression=compression).startswith("SUCCESS")
+    for rel in ("readme.txt", "docs/guide.txt", "docs/deep/data.bin"):
+        assert (out / rel).read_bytes() == (project / rel).read_bytes()
+    assert not (out / tree.RESUME_MARKER).exists()
+
+
+def test_download_resumes_after_the_marker(client, project, tmp_path):
+    assert client.upload_tree(str(project), "project").startswith("SUCCESS")
+    out = tmp_path / "copy"
+    out.mkdir()
+    tree.write_marker(str(out), "docs/guide.txt")  # As left by a download interrupted after that file
+
+    assert client.download_tree("project", str(out)).startswith("SUCCESS")
+    assert sorted(tree.iter_tree(str(out))) == ["docs/deep/data.bin"]
+    assert not (out / tree.RESUME_MARKER).exists()
+
+
+def test_partial_download_fetches_only_the_listed_files(client, project, tmp_path):
+    assert client.upload_tree(str(project), "project").startswith("SUCCESS")
+    out = tmp_path / "copy"
+    assert client.download_tree("project", str(out), rel_paths=["docs/guide.txt"]).startswith("SUCCESS")
+    assert list(tree.iter_tree(str(out))) == ["docs/guide.txt"]
+
+
+@pytest.mark.parametrize("rel_path", ["../escape.txt", "/etc/passwd", "docs/../../x", "docs//x"])
+def test_safe_join_refuses_escapes(tmp_path, rel_path):
+    with pytest.raises(ValueError):
+        tree.safe_join(str(tmp_path), rel_path)
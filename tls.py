@@ -0,0 +1,67 @@
+import os
+import ssl
+import subprocess
+import sys
+
+# --- CONSTANTS ---
+# TLS 1.2 suites limited to AEAD ciphers with hardware-friendly AES-GCM first; TLS 1.3 suites are
+# already AEAD-only and use OpenSSL's defaults (AES-256-GCM, CHACHA20-POLY1305, AES-128-GCM).
+THROUGHPUT_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20:!aNULL:!eNULL:!MD5:!RC4:!DSS"
+SESSION_TICKETS = 4  # TLS 1.3 tickets issued per handshake so pooled reconnects can resume
+
+
+def ktls_supported():
+    """True if this Python/OpenSSL can request kernel TLS (Linux, Python 3.12+)."""
+    return sys.platform.startswith("linux") and hasattr(ssl, "OP_ENABLE_KTLS")
+
+
+def _apply_common_options(context, ciphers, enable_ktls):
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_ciphers(ciphers)
+    # Keep TLS compression off; it costs CPU and leaks plaintext lengths
+    context.options |= ssl.OP_NO_COMPRESSION
+    if enable_ktls and ktls_supported():
+        # With kTLS the kernel does record encryption, so socket.sendfile() stays zero-copy
+        context.options |= ssl.OP_ENABLE_KTLS
+
+
+def create_server_context(certfile, keyfile=None, ciphers=THROUGHPUT_CIPHERS, enable_ktls=True):
+    """SSLContext for FileServer(ssl_context=...) with session tickets enabled."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    _apply_common_options(context, ciphers, enable_ktls)
+    context.options &= ~ssl.OP_NO_TICKET
+    if hasattr(context, "num_tickets"):
+        context.num_tickets = SESSION_TICKETS
+    return context
+
+
+def create_client_context(cafile=None, verify=True, ciphers=THROUGHPUT_CIPHERS, enable_ktls=True):
+    """SSLContext for FileClient(ssl_context=...). cafile pins a private CA or self-signed cert."""
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    _apply_common_options(context, ciphers, enable_ktls)
+    return context
+
+
+def describe_connection(tls_socket):
+    """Short description of the negotiated protocol, cipher and resumption state for logs."""
+    cipher = tls_socket.cipher()
+    name = cipher[0] if cipher else "?"
+    resumed = "resumed" if tls_socket.session_reused else "full handshake"
+    return f"{tls_socket.version()} {name} ({resumed})"
+
+
+def generate_self_signed(certfile, keyfile, hostname="localhost", days=365):
+    """Create a self-signed certificate with the openssl CLI (for tests and benchmarks)."""
+    os.makedirs(os.path.dirname(os.path.abspath(certfile)), exist_ok=True)
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-sha256",
+         "-keyout", keyfile, "-out", certfile, "-days", str(days),
+         "-subj", f"/CN={hostname}",
+         "-addext", f"subjectAltName=DNS:{hostname},DNS:localhost,IP:127.0.0.1"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return certfile, keyfile
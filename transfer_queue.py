@@ -0,0 +1,279 @@
+import itertools
+import os
+import threading
+import time
+
+# --- CONSTANTS ---
+DEFAULT_CONCURRENCY = 3  # Transfers running at once, each on its own pooled connection
+MAX_CONCURRENCY = 8
+QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED = "queued", "running", "paused", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class TransferJob:
+    """One queued upload (source is a local path) or download (source is a server name)."""
+
+    def __init__(self, job_id, kind, source, overwrite="no", save_dir=None):
+        self.id = job_id
+        self.kind = kind  # "upload" or "download"
+        self.source = source
+        self.overwrite = overwrite
+        self.save_dir = save_dir
+        self.state = QUEUED
+        self.result = None  # Last status message from FileClient
+        self.progress = None  # Latest progress.ProgressEvent of the current attempt
+        self.attempts = 0
+        self.size = None
+        self.measure()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._pause_requested = False
+
+    def measure(self):
+        """Re-read an upload's local file size (it may have changed since the job was queued)."""
+        if self.kind == "upload":
+            self.size = os.path.getsize(self.source) if os.path.isfile(self.source) else None
+
+    @property
+    def name(self):
+        return os.path.basename(self.source) if self.kind == "upload" else self.source
+
+    @property
+    def bytes_done(self):
+        if self.state == DONE:
+            return self.progress.done if self.progress else self.size or 0
+        return self.progress.done if self.progress else 0
+
+
+class TransferQueue:
+    """Runs queued uploads and downloads on a ConnectionPool, at most `concurrency` at a time.
+
+    Jobs start in queue order; move() reorders the ones still waiting. Pausing a
+    running job cancels its current attempt (single-file transfers can't resume
+    mid-file) and resume() queues it again. Failed or cancelled jobs can be
+    retried. on_change(job) is called from worker threads whenever a job's state
+    or progress changes, and with None when the queue order changes.
+    """
+
+    def __init__(self, pool, concurrency=DEFAULT_CONCURRENCY, on_change=None, log_callback=None):
+        self.pool = pool
+        self.concurrency = concurrency
+        self.on_change = on_change
+        self.log_callback = log_callback
+        self.paused = False  # While set, no new jobs start (running ones finish)
+        self._jobs = {}
+        self._order = []  # Job ids, in queue order
+        self._ids = itertools.count(1)
+        self._running = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _log(self, message):
+        timestamp = time.strftime("[%Y-%m-%d %H:%M:%S] [QUEUE]")
+        full_message = f"{timestamp} {message}"
+        if self.log_callback:
+            self.log_callback(full_message)
+        else:
+            print(full_message)
+
+    def _notify(self, job):
+        if self.on_change is not None:
+            self.on_change(job)
+
+    # --- Adding jobs ---
+
+    def add_uploads(self, filepaths, overwrite="no"):
+        return self._add([("upload", path, overwrite, None) for path in filepaths])
+
+    def add_downloads(self, filenames, save_dir=None):
+        return self._add([("download", name, "no", save_dir) for name in filenames])
+
+    def add_upload(self, filepath, overwrite="no"):
+        return self.add_uploads([filepath], overwrite)[0]
+
+    def add_download(self, filename, save_dir=None):
+        return self.add_downloads([filename], save_dir)[0]
+
+    def _add(self, specs):
+        with self._lock:
+            jobs = [TransferJob(next(self._ids), *spec) for spec in specs]
+            for job in jobs:
+                self._jobs[job.id] = job
+                self._order.append(job.id)
+        for job in jobs:
+            self._notify(job)
+        self._dispatch()
+        return jobs
+
+    # --- Queries ---
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """Every job, in queue order."""
+        with self._lock:
+            return [self._jobs[job_id] for job_id in self._order]
+
+    def stats(self):
+        """Job counts per state, bytes done and the combined rate of the running jobs."""
+        counts = dict.fromkeys((QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED), 0)
+        bytes_done = total = rate = 0
+        with self._lock:
+            jobs = [self._jobs[job_id] for job_id in self._order]
+        for job in jobs:
+            counts[job.state] += 1
+            bytes_done += job.bytes_done
+            total += job.size or (job.progress.total if job.progress else 0)
+            if job.state == RUNNING and job.progress and not job.progress.finished:
+                rate += job.progress.avg_rate
+        return dict(counts, bytes_done=bytes_done, bytes_total=total, rate=rate)
+
+    # --- Control ---
+
+    def set_concurrency(self, concurrency):
+        self.concurrency = max(1, min(MAX_CONCURRENCY, concurrency))
+        self._dispatch()
+
+    def pause_all(self):
+        self.paused = True
+
+    def resume_all(self):
+        self.paused = False
+        self._dispatch()
+
+    def pause(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in (QUEUED, RUNNING):
+                return False
+            if job.state == RUNNING:
+                job._pause_requested = True
+                job._cancel.set()  # The worker marks it paused when the attempt stops
+            else:
+                job.state = PAUSED
+        self._notify(job)
+        return True
+
+    def resume(self, job_id):
+        return self._requeue(job_id, (PAUSED,))
+
+    def retry(self, job_id):
+        return self._requeue(job_id, (FAILED, CANCELLED))
+
+    def retry_failed(self):
+        return [job.id for job in self.jobs() if job.state == FAILED and self.retry(job.id)]
+
+    def _requeue(self, job_id, states):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in states:
+                return False
+            job.state = QUEUED
+            job.progress = None
+        self._notify(job)
+        self._dispatch()
+        return True
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return False
+            job._pause_requested = False
+            if job.state == RUNNING:
+                job._cancel.set()
+            else:
+                job.state = CANCELLED
+        self._notify(job)
+        return True
+
+    def move(self, job_id, offset):
+        """Move a job up (negative offset) or down in the queue. Returns its new index."""
+        with self._lock:
+            index = self._order.index(job_id)
+            new_index = max(0, min(len(self._order) - 1, index + offset))
+            self._order.insert(new_index, self._order.pop(index))
+        self._notify(None)
+        return new_index
+
+    def move_to_front(self, job_id):
+        with self._lock:
+            offset = -len(self._order)
+        return self.move(job_id, offset)
+
+    def clear_finished(self):
+        """Forget done, failed and cancelled jobs."""
+        with self._lock:
+            self._order = [job_id for job_id in self._order if self._jobs[job_id].state not in FINISHED_STATES]
+            self._jobs = {job_id: self._jobs[job_id] for job_id in self._order}
+        self._notify(None)
+
+    def close(self):
+        """Cancel every unfinished job (running attempts stop at their next chunk)."""
+        with self._lock:
+            self._closed = True
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self.cancel(job.id)
+
+    # --- Workers ---
+
+    def _dispatch(self):
+        """Start queued jobs, in queue order, while fewer than `concurrency` are running."""
+        started = []
+        with self._lock:
+            if self._closed or self.paused:
+                return
+            for job_id in self._order:
+                if self._running >= self.concurrency:
+                    break
+                job = self._jobs[job_id]
+                if job.state == QUEUED:
+                    job.state = RUNNING
+                    job._cancel = threading.Event()
+                    job._pause_requested = False
+                    self._running += 1
+                    started.append(job)
+        for job in started:
+            threading.Thread(target=self._run, args=(job,), name=f"Transfer-{job.id}", daemon=True).start()
+
+    def _run(self, job):
+        job.attempts += 1
+        job.started = time.monotonic()
+        job.progress = None
+        job.measure()
+        self._notify(job)
+
+        def progress(event):
+            job.progress = event
+            self._notify(job)
+
+        hooks = {"progress": progress, "cancel_event": job._cancel}
+        try:
+            if job.kind == "upload":
+                result = self.pool.call("send_file", job.source, overwrite=job.overwrite, **hooks)
+            else:
+                result = self.pool.call("receive_file", job.source, job.save_dir, **hooks)
+            result = str(result)  # Status strings; anything else counts as a failure below
+        except Exception as e:
+            result = f"ERROR: {job.kind.capitalize()} failed - {e}"
+
+        with self._lock:
+            self._running -= 1
+            job.result = result
+            job.finished = time.monotonic()
+            if result.startswith("SUCCESS"):
+                job.state = DONE
+            elif result.startswith("CANCELLED") and job._pause_requested:
+                job.state = PAUSED
+            elif result.startswith("CANCELLED") and job._cancel.is_set():
+                job.state = CANCELLED
+            else:
+                job.state = FAILED  # Includes an upload refused because the file exists and overwrite is "no"
+        if job.state == FAILED:
+            self._log(f"{job.kind.capitalize()} of '{job.name}' failed: {result}")
+        self._notify(job)
+        self._dispatch()
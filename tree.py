@@ -0,0 +1,193 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tarfile
+from collections import defaultdict
+
+# --- CONSTANTS ---
+COMPRESSIONS = ("none", "gz")
+GZIP_LEVEL = 1  # Favour throughput; level 1 already removes most redundancy in source trees
+RESUME_MARKER = ".ft_resume"  # Last completed relative path of an interrupted tree transfer
+PART_PREFIX = ".ft_part_"  # Files being written; renamed into place when complete
+INTERNAL_PREFIX = ".ft_"  # Bookkeeping files hidden from DIR listings and tree transfers
+COPY_BUFFER = 1024 * 1024
+TYPE_NAMES = {'TS': 'Text', 'VS': 'Video', 'IS': 'Image', 'AS': 'Audio', 'PS': 'PDF', 'DS': 'Document', 'FS': 'File'}
+
+
+def is_internal(name):
+    """True for bookkeeping files (resume markers, partial files)."""
+    return name.startswith(INTERNAL_PREFIX)
+
+
+def has_internal_part(rel_path):
+    """True if any component of a '/'-separated path is a bookkeeping name."""
+    return any(is_internal(part) for part in rel_path.replace("\\", "/").split("/"))
+
+
+def iter_tree(root):
+    """Yield relative paths ('/'-separated) of the files under root in a deterministic order.
+
+    Directories are walked lazily and sorted, so memory stays proportional to one
+    directory listing and both sides of a transfer agree on the order (needed for resume).
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not is_internal(name))
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in sorted(filenames):
+            if is_internal(name):
+                continue
+            rel_path = name if rel_dir == "." else os.path.join(rel_dir, name)
+            yield rel_path.replace(os.sep, "/")
+
+
+def skip_past(root, rel_paths, marker):
+    """Drop paths up to and including marker (the last completed file of a previous attempt).
+
+    If the marker file no longer exists the tree changed, and everything is sent again.
+    """
+    if not marker or not os.path.isfile(os.path.join(root, *marker.split("/"))):
+        yield from rel_paths
+        return
+    found = False
+    for rel_path in rel_paths:
+        if found:
+            yield rel_path
+        elif rel_path == marker:
+            found = True
+
+
+def safe_join(root, rel_path):
+    """Join a '/'-separated relative path onto root, refusing absolute paths and '..' escapes."""
+    if not rel_path or rel_path.startswith("/") or os.path.isabs(rel_path):
+        raise ValueError(f"Unsafe path '{rel_path}'")
+    parts = rel_path.replace("\\", "/").split("/")
+    if any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"Unsafe path '{rel_path}'")
+    full_path = os.path.join(root, *parts)
+    root_real = os.path.realpath(root)
+    if os.path.commonpath([root_real, os.path.realpath(full_path)]) != root_real:
+        raise ValueError(f"Path '{rel_path}' escapes the target directory")
+    return full_path
+
+
+def read_marker(root):
+    try:
+        with open(os.path.join(root, RESUME_MARKER)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_marker(root, rel_path):
+    with open(os.path.join(root, RESUME_MARKER), "w") as f:
+        f.write(rel_path)
+
+
+def clear_marker(root):
+    try:
+        os.remove(os.path.join(root, RESUME_MARKER))
+    except OSError:
+        pass
+
+
+def _wrap_compression(fileobj, compression, mode):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}'")
+    if compression == "gz":
+        return gzip.GzipFile(fileobj=fileobj, mode=mode, compresslevel=GZIP_LEVEL)
+    return fileobj
+
+
+def write_tree(fileobj, root, rel_paths, compression="none"):
+    """Stream the given files under root into fileobj as a tar archive. Returns (files, bytes)."""
+    stream = _wrap_compression(fileobj, compression, "wb")
+    files = total = 0
+    with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        for rel_path in rel_paths:
+            full_path = os.path.join(root, *rel_path.split("/"))
+            try:
+                info = tar.gettarinfo(full_path, arcname=rel_path)
+                with open(full_path, "rb") as f:
+                    tar.addfile(info, f)
+            except FileNotFoundError:
+                continue  # Deleted while walking
+            files += 1
+            total += info.size
+    if stream is not fileobj:
+        stream.close()
+    return files, total
+
+
+def extract_tree(fileobj, root, compression="none", on_file=None):
+    """Extract a tar stream written by write_tree into root, one member at a time.
+
+    Each file is written to a partial name and renamed when complete, then
+    on_file(rel_path) is called so callers can record resume progress.
+    Members with a bookkeeping path part raise ValueError. Returns (files, bytes).
+    """
+    stream = _wrap_compression(fileobj, compression, "rb")
+    files = total = 0
+    with tarfile.open(fileobj=stream, mode="r|") as tar:
+        for member in tar:
+            if has_internal_part(member.name):
+                raise ValueError(f"'{member.name}' is a reserved name.")
+            if member.isdir():
+                os.makedirs(safe_join(root, member.name), exist_ok=True)
+                continue
+            if not member.isfile():
+                continue  # Links and devices are never sent
+            target = safe_join(root, member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            part_path = os.path.join(os.path.dirname(target), PART_PREFIX + os.path.basename(target))
+            source = tar.extractfile(member)
+            with open(part_path, "wb") as out:
+                shutil.copyfileobj(source, out, COPY_BUFFER)
+            # Keep the sender's mtime so both sides of a sync can compare (size, mtime) signatures
+            os.utime(part_path, ns=(int(member.mtime * 1e9),) * 2)
+            os.replace(part_path, target)
+            files += 1
+            total += member.size
+            if on_file:
+                on_file(member.name)
+    if stream is not fileobj:
+        stream.close()
+    return files, total
+
+
+def manifest_token(manifest):
+    """Fingerprint of a {name: (size, mtime_ns)} manifest; equal tokens mean nothing changed."""
+    digest = hashlib.sha256()
+    for name in sorted(manifest):
+        size, mtime_ns = manifest[name]
+        digest.update(f"{name}\0{size}\0{mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def format_listing(files, folders, root_label):
+    """DIR text for {rel_name: size} and the set of folder names, indented by folder."""
+    items = [f"{'Filename':<20} {'Type':<10} {'Size (bytes)':<15}", "-" * 50]
+
+    by_folder = defaultdict(list)
+    for name, size in files.items():
+        rel_dir, _, file = name.rpartition("/")
+        by_folder[rel_dir].append((file, size))
+    for rel_dir in set(folders) | {""}:
+        by_folder.setdefault(rel_dir, [])
+
+    for rel_dir in sorted(by_folder, key=lambda rel_dir: rel_dir.split("/")):
+        level = rel_dir.count("/") + 1 if rel_dir else 0
+        indent = ' ' * 2 * level
+
+        if not rel_dir:
+            items.append(f"\n[{root_label}]")
+        else:
+            items.append(f"{indent}[{rel_dir.rpartition('/')[2]}/]")
+
+        sub_indent = ' ' * 2 * (level + 1)
+        for file, size in sorted(by_folder[rel_dir]):
+            file_type = file[:2] if len(file) >= 2 else "??"
+            type_name = TYPE_NAMES.get(file_type, 'Unknown')
+            items.append(f"{sub_indent}{file:<20} {type_name:<10} {size:<15}")
+
+    return "\n".join(items) if len(items) > 2 else "Directory is empty."
@@ -1,5 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, simpledialog, messagebox
+import collections
+import os
+import queue
 import threading
 import time
 
@@ -7,7 +10,23 @@ import time
 # We import the real FileClient, the default IP/PORT constants, and the FileServer (FS).
 from client import FileClient, IP, PORT
 from server import FileServer as FS 
-
+from pool import INTERACTIVE_RESERVE, ConnectionPool
+from transfer_queue import (DEFAULT_CONCURRENCY, MAX_CONCURRENCY, DONE, FAILED, CANCELLED, RUNNING,
+                            TransferQueue)
+from progress import format_bytes, format_eta
+from dashboard import SAMPLE_INTERVAL, DashboardSampler, sparkline
+
+try:
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+except ImportError:  # Optional, enables dropping files onto the transfer queue
+    DND_FILES = TkinterDnD = None
+
+# --- CONSTANTS ---
+LOG_TICK_MS = 50  # The log queue is drained and rendered once per tick
+MAX_LOG_LINES = 5000  # Lines kept in a log view; older lines are trimmed from the top
+MAX_EVENTS_PER_TICK = 50_000  # Bounds one tick's work when producers outpace the GUI
+DASHBOARD_REFRESH_MS = int(SAMPLE_INTERVAL * 1000)  # The server dashboard samples its counters at this fixed rate
+MAX_DASHBOARD_CLIENTS = 200  # Rows in the connected clients table (busiest first)
 
 # NOTE: The stub FileClient class has been removed and replaced by the actual FileClient imported from client.py.
 
@@ -21,17 +40,41 @@ class FileTransferGUI:
         self.role = None  # "SERVER" or "CLIENT"
         self.handler = None # Will hold either FileServer or FileClient instance
         self.server_thread = None
+        self.pool = None  # ConnectionPool used by client operations so they don't share one socket
 
         # UI Component references for logging
         self.server_log_text = None
         self.client_log_text = None
 
+        # Log events from any thread; drained on the GUI thread every LOG_TICK_MS
+        self._log_queue = queue.SimpleQueue()
+        self._log_tick = None
+
+        # Upload/download queue (created at login) and the jobs changed since the last tick, posted by its workers
+        self.transfers = None
+        self.queue_tree = None
+        self.queue_bar = None
+        self._changed_jobs = set()
+        self._queue_reordered = False
+        self._queue_lock = threading.Lock()
+
+        # Server dashboard (created when the server starts), refreshed every DASHBOARD_REFRESH_MS
+        self.dashboard = None
+        self._dashboard_tick = None
+        self.clients_tree = None
+        self.hot_files_tree = None
+
         # Tkinter Variables
         self.file_name_var = tk.StringVar(value="No file selected...")
         self.status_var = tk.StringVar(value="Select a role to begin.")
+        self.concurrency_var = tk.IntVar(value=DEFAULT_CONCURRENCY)
+        self.throughput_var = tk.StringVar(value="Queue is empty.")
+        self.server_throughput_var = tk.StringVar()
+        self.server_latency_var = tk.StringVar()
 
         self._setup_ui()
         self.window.protocol("WM_DELETE_WINDOW", self._on_closing)
+        self._log_tick = self.window.after(LOG_TICK_MS, self._on_ui_tick)
 
     def _setup_ui(self):
         # Configure grid for the main window
@@ -74,16 +117,17 @@ class FileTransferGUI:
                                                                                                sticky="ew")
 
     def _create_server_info_frame(self):
-        """UI after starting as Server, now including the log."""
+        """UI after starting as Server: dashboard and log."""
         self._clear_frame()
-        self.window.geometry("600x400")  # Increase size for log
+        self.window.geometry("900x700")  # Increase size for the dashboard and log
         self.window.title(f"File Server - Running on {self.handler.ip}:{self.handler.port}")
         self.status_var.set(f"SERVER RUNNING: {self.handler.ip}:{self.handler.port}")
 
         # Configure the frame grid to accommodate the log
         self.main_frame.grid_rowconfigure(0, weight=0)  # Info row
-        self.main_frame.grid_rowconfigure(1, weight=1)  # Log row
-        self.main_frame.grid_rowconfigure(2, weight=0)  # Stop button row
+        self.main_frame.grid_rowconfigure(1, weight=1)  # Dashboard row
+        self.main_frame.grid_rowconfigure(2, weight=1)  # Log row
+        self.main_frame.grid_rowconfigure(3, weight=0)  # Stop button row
 
         # 1. Info Label Frame (Top)
         info_frame = ttk.Frame(self.main_frame)
@@ -94,9 +138,12 @@ class FileTransferGUI:
             side=tk.LEFT, padx=10)
         ttk.Label(info_frame, text=f"Listening on: {self.handler.ip}:{self.handler.port}").pack(side=tk.LEFT, padx=20)
 
-        # 2. Server Log Frame (Center, takes up most space)
+        # 2. Dashboard Frame
+        self._create_dashboard_frame()
+
+        # 3. Server Log Frame (Center)
         log_frame = ttk.LabelFrame(self.main_frame, text="Server Activity Log")
-        log_frame.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        log_frame.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
         log_frame.grid_columnconfigure(0, weight=1)
         log_frame.grid_rowconfigure(0, weight=1)
 
@@ -110,20 +157,73 @@ class FileTransferGUI:
         log_scrollbar.grid(row=0, column=1, sticky='ns')
         self.server_log_text['yscrollcommand'] = log_scrollbar.set
 
-        # 3. Stop Button (Bottom)
-        ttk.Button(self.main_frame, text="Stop Server", command=self._stop_handler).grid(row=2, column=0, pady=10)
+        # 4. Stop Button (Bottom)
+        ttk.Button(self.main_frame, text="Stop Server", command=self._stop_handler).grid(row=3, column=0, pady=10)
+
+    def _create_dashboard_frame(self):
+        """Connected clients, throughput/latency sparklines and the most downloaded files."""
+        dashboard_frame = ttk.LabelFrame(self.main_frame, text="Dashboard")
+        dashboard_frame.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        dashboard_frame.grid_columnconfigure(0, weight=3)
+        dashboard_frame.grid_columnconfigure(1, weight=1)
+        dashboard_frame.grid_rowconfigure(0, weight=1)
+
+        columns = (("user", "User", 90), ("address", "Address", 140), ("connected", "Connected", 80),
+                   ("operation", "Operation", 120), ("rate", "Rate", 100))
+        self.clients_tree = ttk.Treeview(dashboard_frame, columns=[c[0] for c in columns], show="headings", height=6)
+        for column, heading, width in columns:
+            self.clients_tree.heading(column, text=heading)
+            self.clients_tree.column(column, width=width)
+        self.clients_tree.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+
+        self.hot_files_tree = ttk.Treeview(dashboard_frame, columns=("name", "hits"), show="headings", height=6)
+        self.hot_files_tree.heading("name", text="Hottest Files")
+        self.hot_files_tree.heading("hits", text="Downloads")
+        self.hot_files_tree.column("name", width=150)
+        self.hot_files_tree.column("hits", width=70, anchor="e")
+        self.hot_files_tree.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
+
+        charts = ttk.Frame(dashboard_frame)
+        charts.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5)
+        for row, (title, variable) in enumerate((("Throughput", self.server_throughput_var),
+                                                 ("Latency", self.server_latency_var))):
+            ttk.Label(charts, text=title, width=12).grid(row=row, column=0, sticky="w")
+            ttk.Label(charts, textvariable=variable, font=("Consolas", 10)).grid(row=row, column=1, sticky="w")
+
+    def _refresh_dashboard(self):
+        """Samples the server's counters and redraws the dashboard, then re-arms itself."""
+        if self.role != "SERVER" or self.dashboard is None or self.clients_tree is None:
+            self._dashboard_tick = None
+            return
+        snapshot = self.dashboard.sample()
+
+        self.clients_tree.delete(*self.clients_tree.get_children())
+        for client in snapshot["clients"][:MAX_DASHBOARD_CLIENTS]:
+            self.clients_tree.insert("", tk.END, values=(client["user"], client["address"],
+                                                         format_eta(client["connected_for"]), client["operation"],
+                                                         f"{format_bytes(client['rate'])}/s"))
+        self.hot_files_tree.delete(*self.hot_files_tree.get_children())
+        for name, hits in snapshot["hot_files"]:
+            self.hot_files_tree.insert("", tk.END, values=(name, hits))
+
+        self.server_throughput_var.set(f"{sparkline(snapshot['throughput_history'])}  "
+                                       f"{format_bytes(snapshot['throughput'])}/s")
+        self.server_latency_var.set(f"{sparkline(snapshot['latency_history'])}  {snapshot['latency_ms']:.1f} ms "
+                                    f"({snapshot['ops_per_sec']:.0f} ops/s)")
+        self._dashboard_tick = self.window.after(DASHBOARD_REFRESH_MS, self._refresh_dashboard)
 
     def _create_client_operations_frame(self):
         """UI after starting as Client, now including the log."""
         self._clear_frame()
-        self.window.geometry("750x450") # Adjusted size for more buttons
+        self.window.geometry("800x640") # Adjusted size for more buttons and the transfer queue
         self.window.title(f"File Client Operations - Connected to {self.handler.ip}:{self.handler.port}")
         self.status_var.set("CLIENT CONNECTED: Ready for file operations.")
 
         # Main grid setup for the client view
         self.main_frame.grid_rowconfigure(0, weight=0)  # File Name Frame
         self.main_frame.grid_rowconfigure(1, weight=0)  # Buttons Frame
-        self.main_frame.grid_rowconfigure(2, weight=1)  # Log Frame
+        self.main_frame.grid_rowconfigure(2, weight=1)  # Transfer Queue Frame
+        self.main_frame.grid_rowconfigure(3, weight=1)  # Log Frame
 
         # 1. File Name Frame (Row 0)
         file_name_frame = ttk.LabelFrame(self.main_frame, text="Selected File Path")
@@ -155,9 +255,12 @@ class FileTransferGUI:
         ttk.Button(buttons_frame, text="Delete Folder", command=lambda: self._subfolder_op("DELETE")).grid(row=1, column=2, padx=5, pady=5, sticky="ew")
         ttk.Button(buttons_frame, text="Disconnect/Logout", command=self._stop_handler).grid(row=1, column=3, padx=5, pady=5, sticky="ew")
 
-        # 3. Client Log Frame (Row 2, takes up most space)
+        # 3. Transfer Queue Frame (Row 2)
+        self._create_transfer_queue_frame()
+
+        # 4. Client Log Frame (Row 3, takes up most space)
         log_frame = ttk.LabelFrame(self.main_frame, text="Client Activity Log")
-        log_frame.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
+        log_frame.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
         log_frame.grid_columnconfigure(0, weight=1)
         log_frame.grid_rowconfigure(0, weight=1)
 
@@ -170,6 +273,48 @@ class FileTransferGUI:
         log_scrollbar.grid(row=0, column=1, sticky='ns')
         self.client_log_text['yscrollcommand'] = log_scrollbar.set
 
+    def _create_transfer_queue_frame(self):
+        """Queue view: toolbar, one row per job, and the aggregate progress/throughput."""
+        queue_frame = ttk.LabelFrame(self.main_frame, text="Transfer Queue")
+        queue_frame.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
+        queue_frame.grid_columnconfigure(0, weight=1)
+        queue_frame.grid_rowconfigure(1, weight=1)
+
+        toolbar = ttk.Frame(queue_frame)
+        toolbar.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        actions = (("Add Files...", self._add_files), ("Pause", lambda: self._queue_action("pause")),
+                   ("Resume", lambda: self._queue_action("resume")), ("Cancel", lambda: self._queue_action("cancel")),
+                   ("Retry", lambda: self._queue_action("retry")), ("Up", lambda: self._move_selected(-1)),
+                   ("Down", lambda: self._move_selected(1)), ("Clear Finished", self._clear_finished))
+        for text, command in actions:
+            ttk.Button(toolbar, text=text, command=command, width=len(text) + 2).pack(side=tk.LEFT, padx=1)
+        ttk.Spinbox(toolbar, from_=1, to=MAX_CONCURRENCY, width=3, textvariable=self.concurrency_var,
+                    state="readonly", command=self._set_concurrency).pack(side=tk.RIGHT)
+        ttk.Label(toolbar, text="Parallel:").pack(side=tk.RIGHT, padx=2)
+
+        columns = (("type", "Type", 70), ("name", "Name", 200), ("status", "Status", 70), ("progress", "%", 45),
+                   ("detail", "Details", 300))
+        self.queue_tree = ttk.Treeview(queue_frame, columns=[c[0] for c in columns], show="headings", height=6)
+        for column, heading, width in columns:
+            self.queue_tree.heading(column, text=heading)
+            self.queue_tree.column(column, width=width, stretch=column in ("name", "detail"))
+        self.queue_tree.grid(row=1, column=0, sticky="nsew", padx=(5, 0))
+        queue_scrollbar = ttk.Scrollbar(queue_frame, command=self.queue_tree.yview)
+        queue_scrollbar.grid(row=1, column=1, sticky="ns")
+        self.queue_tree['yscrollcommand'] = queue_scrollbar.set
+
+        # Dropping files anywhere on the queue adds them (needs the optional tkinterdnd2 package)
+        if DND_FILES and hasattr(self.queue_tree, "drop_target_register"):
+            self.queue_tree.drop_target_register(DND_FILES)
+            self.queue_tree.dnd_bind("<<Drop>>", self._on_drop)
+
+        summary = ttk.Frame(queue_frame)
+        summary.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        summary.grid_columnconfigure(0, weight=1)
+        self.queue_bar = ttk.Progressbar(summary, maximum=1000, mode="determinate")
+        self.queue_bar.grid(row=0, column=0, sticky="ew")
+        ttk.Label(summary, textvariable=self.throughput_var, width=48, anchor="w").grid(row=0, column=1, padx=5)
+
     # --- Role Handler Methods ---
 
     def _start_server(self):
@@ -180,6 +325,8 @@ class FileTransferGUI:
 
             self.role = "SERVER"
             self._create_server_info_frame()  # Set up UI before starting thread
+            self.dashboard = DashboardSampler(self.handler)
+            self._dashboard_tick = self.window.after(DASHBOARD_REFRESH_MS, self._refresh_dashboard)
 
             # Start the server in a new thread
             self.server_thread = threading.Thread(target=self.handler.start, name="ServerThread", daemon=True)
@@ -224,6 +371,13 @@ class FileTransferGUI:
                 auth_result = self.handler.authenticate(username, password)
                 
                 if auth_result == "AUTH_SUCCESS":
+                    # Each operation borrows its own pooled connection, resumed with the session token
+                    self.pool = ConnectionPool(ip, port, username, password=password,
+                                               session_token=self.handler.session_token,
+                                               size=MAX_CONCURRENCY + INTERACTIVE_RESERVE,
+                                               log_callback=self._log_message)
+                    self.transfers = TransferQueue(self.pool, self.concurrency_var.get(),
+                                                   on_change=self._on_job_change, log_callback=self._log_message)
                     self.status_var.set(f"CLIENT CONNECTED & AUTHENTICATED: User {username}")
                     messagebox.showinfo("Authentication", "Authentication successful!")
                 else:
@@ -243,11 +397,21 @@ class FileTransferGUI:
         """Stops the currently active handler (Server or Client)."""
         if self.handler:
             if self.role == "SERVER":
+                if self._dashboard_tick:
+                    self.window.after_cancel(self._dashboard_tick)
+                    self._dashboard_tick = None
+                self.dashboard = None
                 self.handler.stop()
                 if self.server_thread and self.server_thread.is_alive():
                     self.server_thread.join(1)
                 messagebox.showinfo("Server Stopped", "The File Server has been stopped.")
             elif self.role == "CLIENT":
+                if self.transfers:
+                    self.transfers.close()
+                    self.transfers = None
+                if self.pool:
+                    self.pool.close()
+                    self.pool = None
                 self.handler.disconnect()
                 messagebox.showinfo("Client Disconnected", "Disconnected from the server.")
 
@@ -255,6 +419,10 @@ class FileTransferGUI:
         self.handler = None
         self.server_log_text = None  # Clear references
         self.client_log_text = None  # Clear references
+        self.queue_tree = None
+        self.queue_bar = None
+        self.clients_tree = None
+        self.hot_files_tree = None
         self._create_role_selection_frame()
 
     def _select_file(self):
@@ -286,17 +454,37 @@ class FileTransferGUI:
                 overwrite = "yes"
             # -------------------------------
             
-            # Run file transfer in a thread to keep GUI responsive
-            threading.Thread(target=self._run_upload_in_thread, args=(filepath, overwrite)).start()
+            # Queued transfers run on their own pooled connections, so the GUI stays responsive
+            self.transfers.add_upload(filepath, overwrite)
         else:
             messagebox.showwarning("Upload Error", "Please select a file first.")
 
-    def _run_upload_in_thread(self, filepath, overwrite):
-        """Helper to run the upload process and update the GUI afterwards."""
-        # The real FileClient.send_file expects the overwrite argument
-        result = self.handler.send_file(filepath, overwrite=overwrite)
-        # Safely update GUI after operation finishes
-        self.window.after(0, lambda: self._handle_operation_result(result, "Upload"))
+    def _add_files(self):
+        """Queue uploads of several files picked in a dialog."""
+        if self.transfers is None:
+            messagebox.showwarning("Error", "Must be connected and authenticated as a Client to upload.")
+            return
+        filepaths = filedialog.askopenfilenames(title="Select Files to Upload")
+        if filepaths:
+            self._queue_uploads(filepaths)
+
+    def _on_drop(self, event):
+        """Queue uploads of files dropped onto the queue (folders are skipped)."""
+        if self.transfers is None:
+            return event.action
+        paths = self.window.tk.splitlist(event.data)
+        filepaths = [path for path in paths if os.path.isfile(path)]
+        if len(filepaths) < len(paths):
+            self._log_message(f"Skipped {len(paths) - len(filepaths)} dropped item(s) that are not files.")
+        if filepaths:
+            self._queue_uploads(filepaths)
+        return event.action
+
+    def _queue_uploads(self, filepaths):
+        overwrite = "yes" if messagebox.askyesno("Overwrite Policy",
+                                                 "Allow file overwrite on the server if it exists?") else "no"
+        self.transfers.add_uploads(filepaths, overwrite)
+        self._log_message(f"Queued {len(filepaths)} upload(s).")
 
     def _download_file(self):
         """Call the handler's receive_file method."""
@@ -307,16 +495,9 @@ class FileTransferGUI:
         download_filename = simpledialog.askstring("Download File", "Enter filename to download from server:")
 
         if download_filename:
-            # Run file transfer in a thread to keep GUI responsive
-            threading.Thread(target=self._run_download_in_thread, args=(download_filename,)).start()
+            self.transfers.add_download(download_filename)
         else:
             messagebox.showwarning("Download Cancelled", "Download was cancelled.")
-
-    def _run_download_in_thread(self, filename):
-        """Helper to run the download process and update the GUI afterwards."""
-        result = self.handler.receive_file(filename)
-        # Safely update GUI after operation finishes
-        self.window.after(0, lambda: self._handle_operation_result(result, "Download"))
         
     def _delete_file(self):
         """Prompt for filename and call the handler's delete method."""
@@ -367,11 +548,11 @@ class FileTransferGUI:
         # Execute the function based on its signature
         try:
             if func.__name__ == 'handle_delete':
-                 result = func(args[0]) # filename
+                 result = self._pooled_call(func.__name__, args[0]) # filename
             elif func.__name__ == 'handle_dir':
-                result = func()
+                result = self._pooled_call(func.__name__)
             elif func.__name__ == 'handle_subfolder':
-                result = func(args[0], args[1]) # action, path
+                result = self._pooled_call(func.__name__, args[0], args[1]) # action, path
             else:
                 result = "ERROR: Invalid utility operation function."
         except Exception as e:
@@ -381,6 +562,98 @@ class FileTransferGUI:
         # Safely update GUI after operation finishes
         self.window.after(0, lambda: self._handle_operation_result(result, operation_name))
 
+    def _pooled_call(self, operation, *args, **kwargs):
+        """Runs a FileClient operation on a pooled connection (falls back to the login connection)."""
+        pool = self.pool
+        if pool is None:
+            return getattr(self.handler, operation)(*args, **kwargs)
+        try:
+            return pool.call(operation, *args, **kwargs)
+        except Exception as e:
+            return f"ERROR: {e}"
+
+    # --- Transfer Queue ---
+
+    def _selected_jobs(self):
+        """Ids of the jobs selected in the queue view, top to bottom."""
+        return [int(iid) for iid in self.queue_tree.selection()] if self.queue_tree else []
+
+    def _queue_action(self, action):
+        """Pause, resume, cancel or retry every selected job."""
+        if self.transfers is None:
+            return
+        for job_id in self._selected_jobs():
+            getattr(self.transfers, action)(job_id)
+
+    def _move_selected(self, offset):
+        if self.transfers is None:
+            return
+        job_ids = self._selected_jobs()
+        # Move the job nearest the destination first so the selection keeps its order
+        for job_id in (job_ids if offset < 0 else reversed(job_ids)):
+            self.transfers.move(job_id, offset)
+
+    def _clear_finished(self):
+        if self.transfers is not None:
+            self.transfers.clear_finished()
+
+    def _set_concurrency(self):
+        if self.transfers is not None:
+            self.transfers.set_concurrency(self.concurrency_var.get())
+
+    def _on_job_change(self, job):
+        """TransferQueue callback (worker threads): remember what changed for the next tick."""
+        with self._queue_lock:
+            if job is None:
+                self._queue_reordered = True
+            else:
+                self._changed_jobs.add(job.id)
+
+    def _render_queue(self):
+        """Redraws the queue rows that changed since the last tick, and the totals (GUI thread)."""
+        with self._queue_lock:
+            changed, self._changed_jobs = self._changed_jobs, set()
+            reordered, self._queue_reordered = self._queue_reordered, False
+        if self.transfers is None or self.queue_tree is None or not (changed or reordered):
+            return
+
+        if reordered:
+            jobs = self.transfers.jobs()
+            live = {str(job.id) for job in jobs}
+            removed = [iid for iid in self.queue_tree.get_children() if iid not in live]
+            if removed:
+                self.queue_tree.delete(*removed)
+            for index, job in enumerate(jobs):
+                self._render_job(job)
+                self.queue_tree.move(str(job.id), "", index)
+        else:
+            for job_id in sorted(changed):
+                job = self.transfers.get(job_id)
+                if job is not None:
+                    self._render_job(job)
+
+        stats = self.transfers.stats()
+        self.queue_bar["value"] = stats["bytes_done"] / stats["bytes_total"] * 1000 if stats["bytes_total"] else 0
+        waiting = stats["queued"] + stats["paused"]
+        self.throughput_var.set(f"{stats['running']} running, {waiting} waiting, {stats['done']} done, "
+                                f"{stats['failed']} failed - {format_bytes(stats['rate'])}/s")
+
+    def _render_job(self, job):
+        event = job.progress
+        percent = f"{event.fraction:.0%}" if event else ("100%" if job.state == DONE else "")
+        if job.state in (RUNNING, DONE) and event:
+            detail = event.describe()
+        elif job.state in (FAILED, CANCELLED) and job.result:
+            detail = job.result
+        else:
+            detail = ""
+        values = (job.kind.capitalize(), job.name, job.state, percent, detail)
+        iid = str(job.id)
+        if self.queue_tree.exists(iid):
+            self.queue_tree.item(iid, values=values)
+        else:
+            self.queue_tree.insert("", tk.END, iid=iid, values=values)
+
     def _handle_operation_result(self, result, operation):
         """Shows the final messagebox based on the operation result."""
         # For DIR command, result is the listing string
@@ -395,12 +668,30 @@ class FileTransferGUI:
             messagebox.showerror(f"{operation} Failed", result)
 
     def _log_message(self, message):
-        """Internal logger that routes the message to the correct log window."""
-        # Use window.after to safely schedule the update on the main GUI thread
-        self.window.after(0, lambda: self._append_to_log(message))
-
-    def _append_to_log(self, message):
-        """Appends the message to the active log Text widget."""
+        """Internal logger; safe to call from any thread (the GUI thread renders queued lines in batches)."""
+        self._log_queue.put(message)
+
+    def _on_ui_tick(self):
+        """Renders queued log lines and transfer queue changes, then re-arms the tick."""
+        self._drain_log_queue()
+        self._render_queue()
+        self._log_tick = self.window.after(LOG_TICK_MS, self._on_ui_tick)
+
+    def _drain_log_queue(self):
+        """Renders everything logged since the last tick in one insert."""
+        lines = collections.deque(maxlen=MAX_LOG_LINES - 1)  # Older lines would be trimmed anyway
+        received = 0
+        try:
+            while received < MAX_EVENTS_PER_TICK:
+                lines.append(self._log_queue.get_nowait())
+                received += 1
+        except queue.Empty:
+            pass
+        if lines:
+            self._append_to_log(lines, received - len(lines))
+
+    def _append_to_log(self, lines, skipped=0):
+        """Appends a batch of lines to the active log Text widget, keeping at most MAX_LOG_LINES."""
         log_widget = None
 
         if self.role == "SERVER" and self.server_log_text:
@@ -408,14 +699,24 @@ class FileTransferGUI:
         elif self.role == "CLIENT" and self.client_log_text:
             log_widget = self.client_log_text
 
+        text = "\n".join(lines) + "\n"
+        if skipped:
+            text = f"... {skipped} log lines skipped ...\n" + text
+
         if log_widget:
+            # Only follow the tail if the user hasn't scrolled up to read older lines
+            at_bottom = log_widget.yview()[1] >= 1.0
             log_widget.config(state=tk.NORMAL)
-            log_widget.insert(tk.END, message + "\n")
-            log_widget.see(tk.END)
+            log_widget.insert(tk.END, text)
+            line_count = int(log_widget.index("end-1c").split(".")[0])
+            if line_count > MAX_LOG_LINES:
+                log_widget.delete("1.0", f"{line_count - MAX_LOG_LINES}.0")
             log_widget.config(state=tk.DISABLED)
+            if at_bottom:
+                log_widget.see(tk.END)
         else:
             # Fallback for messages before a role is selected
-            print(message)
+            print(text, end="")
 
     def _on_closing(self):
         """Handles closing the window, ensuring the server is stopped."""
@@ -424,11 +725,13 @@ class FileTransferGUI:
         elif self.role == "CLIENT":
             self._stop_handler()
 
+        if self._log_tick:
+            self.window.after_cancel(self._log_tick)
         self.window.destroy()
 
 
 # --- Main execution block for testing the GUI ---
 if __name__ == "__main__":
-    root = tk.Tk()
+    root = TkinterDnD.Tk() if TkinterDnD else tk.Tk()
     app = FileTransferGUI(root)
     root.mainloop()